@@ -1,8 +1,164 @@
-from streamlit import cache_resource
+import functools
+import json
+import logging
+import os
+import random
+import time
+import httpx
+import openai
 from openai import OpenAI
 from config import API_KEY, BASE_URL
+from config import LLM_RATE_PER_MINUTE, LLM_BURST, LLM_RATE_STATE, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+from config import LLM_MAX_CONNECTIONS, LLM_TIMEOUT
+from config.logger import log_event, increment, observe
 
-# Initialize and cache the OpenAI client
-@cache_resource
+try:
+    import fcntl
+except ImportError:  # Windows: the rate limit applies per process
+    fcntl = None
+
+# Errors worth another attempt; other 4xx responses would fail the same way again
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+@functools.cache
 def get_openai_client():
-    return OpenAI(api_key=API_KEY, base_url=BASE_URL)
+    """The process's client, keeping connections to the provider alive between requests"""
+    http_client = openai.DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            keepalive_expiry=60
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=10)
+    )
+    # Retries are done by create_chat_completion, within the rate limit
+    return OpenAI(api_key=API_KEY, base_url=BASE_URL, http_client=http_client, max_retries=0)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every process through a small locked state file.
+
+    The UI and the render job workers all draw from it, so concurrent users
+    stay under the provider's rate limit instead of all being rejected at once.
+
+    Args:
+        rate (float): Requests per second.
+        burst (int): Requests allowed at once after a quiet period.
+        path (str): State file.
+    """
+
+    def __init__(self, rate, burst, path):
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+
+    def _update(self, change):
+        # Read, change and write the bucket while holding the file lock
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a+", encoding="utf-8") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read())
+            except ValueError:
+                state = {}
+            now = time.time()
+            state.setdefault("blocked_until", 0)
+            # Refill since the last request, but not while paused
+            refill_from = max(state.get("updated", now), state["blocked_until"])
+            tokens = state.get("tokens", self.burst) + max(now - refill_from, 0) * self.rate
+            state["tokens"] = min(self.burst, tokens)
+            state["updated"] = now
+            result = change(state, now)
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+            return result
+
+    def _take(self, state, now):
+        # Seconds to wait before a token is available; 0 means one was taken
+        if state["blocked_until"] > now:
+            return state["blocked_until"] - now
+        if state["tokens"] >= 1:
+            state["tokens"] -= 1
+            return 0
+        return (1 - state["tokens"]) / self.rate
+
+    def acquire(self):
+        """
+        Wait until a request may be sent.
+
+        Returns:
+            float: Seconds waited.
+        """
+        waited = 0.0
+        while True:
+            wait = self._update(self._take)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """Hold back every process for a while, e.g. after the provider answered 429"""
+        def block(state, now):
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            state["tokens"] = 0  # then resume at the steady rate, not with a burst
+        self._update(block)
+
+
+def get_rate_limiter():
+    """The shared rate limiter, or None when LLM_RATE_PER_MINUTE is 0"""
+    if LLM_RATE_PER_MINUTE <= 0:
+        return None
+    return RateLimiter(LLM_RATE_PER_MINUTE / 60, LLM_BURST, LLM_RATE_STATE)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def create_chat_completion(client, rate_limiter=None, **kwargs):
+    """
+    client.chat.completions.create(**kwargs) within the rate limit, with retries.
+
+    429s, 5xx responses and connection errors are retried with exponential
+    backoff and full jitter; a 429 holds back every process.
+
+    Args:
+        client (OpenAI): Client to send the request with.
+        rate_limiter (RateLimiter): Wait for it before every attempt; None sends straight away.
+    Returns:
+        The completion, or the stream for stream=True. Errors while streaming are not retried.
+    Raises:
+        openai.APIError: When the last attempt fails, the error is not worth retrying,
+            or the provider asks to wait longer than LLM_BACKOFF_MAX (e.g. a daily quota).
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if rate_limiter:
+            waited = rate_limiter.acquire()
+            if waited:
+                observe("fyp_llm_rate_limit_wait_seconds", waited)
+        try:
+            return client.chat.completions.create(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            retry_after = _retry_after(e)
+            if attempt == LLM_MAX_RETRIES or (retry_after or 0) > LLM_BACKOFF_MAX:
+                raise
+            # Full jitter spreads out the retries of requests that failed together
+            delay = max(random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)), retry_after or 0)
+            increment("fyp_llm_retries_total", error=type(e).__name__)
+            log_event("llm_retry", level=logging.WARNING, attempt=attempt + 1, delay=round(delay, 2),
+                      error=str(e)[:200])
+            if rate_limiter and isinstance(e, openai.RateLimitError):
+                rate_limiter.pause(delay)  # the next acquire() waits it out, in every process
+            else:
+                time.sleep(delay)
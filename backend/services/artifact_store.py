@@ -0,0 +1,184 @@
+import glob
+import os
+import time
+import uuid
+from backend.utils import link_or_copy
+from backend.services import scene_store
+from backend.services.stitch_cache import file_digest
+from config.logger import log_event
+from config import ARTIFACT_BLOB_DIR, ARTIFACT_MAX_BYTES, ARTIFACT_GC_GRACE
+
+
+def _blob_path(digest):
+    return sidecar_path(digest, ".mp4")
+
+
+def sidecar_path(digest, suffix):
+    """Path for a file derived from a blob, e.g. sidecar_path(digest, ".poster.jpg")"""
+    return os.path.join(ARTIFACT_BLOB_DIR, digest[:2], f"{digest}{suffix}")
+
+
+def _place(src, dst):
+    # Link under a temporary name and rename, so readers never see dst missing or partial
+    tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        link_or_copy(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _same_file(path, other):
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+
+def _linked_digest(st):
+    # A file that is already a link to a blob (e.g. a render cache hit) needs no hashing
+    with scene_store.transaction() as db:
+        row = db.execute(
+            "SELECT digest FROM blobs WHERE device = ? AND inode = ?", (st.st_dev, st.st_ino)
+        ).fetchone()
+    if row is None:
+        return None
+    try:
+        blob_stat = os.stat(_blob_path(row["digest"]))
+    except OSError:
+        return None
+    return row["digest"] if (blob_stat.st_dev, blob_stat.st_ino) == (st.st_dev, st.st_ino) else None
+
+
+def find_digest(path):
+    """Return the sha256 of a video, without hashing it if it is linked to its blob"""
+    return _linked_digest(os.stat(path)) or file_digest(path)
+
+
+def publish(src, dest, kind, scene_id=None, session_id=None, move=False):
+    """
+    Store a video and place it at dest as a hardlink to its blob.
+
+    Each distinct video is kept once, as a blob named by its sha256 under
+    ARTIFACT_BLOB_DIR, so an identical render or stitch costs no extra disk
+    space. dest shares the blob's inode: replace it, never write into it.
+
+    Args:
+        src (str): The video file; may be dest itself, to adopt a file already in place.
+        dest (str): Where the video should appear, normally under OUTPUT_DIR.
+        kind (str): "video", "draft" or "final" (see scene_store.record_artifact).
+        scene_id (str): Scene that owns the video. Videos without an owner are
+            kept for ARTIFACT_GC_GRACE seconds so the caller can claim them.
+        session_id (str): Session that owns the video, for stitched videos.
+        move (bool): Remove src afterwards; within one file system nothing is copied.
+    Returns:
+        str: dest.
+    """
+    digest = find_digest(src)
+    blob = _blob_path(digest)
+
+    # Mark the blob as in use first, so a concurrent collect_garbage() leaves it alone
+    with scene_store.transaction() as db:
+        db.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), digest))
+    if not os.path.exists(blob):
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        _place(src, blob)
+    if not _same_file(blob, dest):
+        _place(blob, dest)
+    if move and os.path.abspath(src) != os.path.abspath(dest) and os.path.exists(src):
+        os.remove(src)
+
+    st = os.stat(blob)
+    with scene_store.transaction() as db:
+        db.execute(
+            """
+            INSERT INTO blobs (digest, bytes, device, inode, last_used) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (digest) DO UPDATE SET
+                bytes = excluded.bytes,
+                device = excluded.device,
+                inode = excluded.inode,
+                last_used = excluded.last_used
+            """,
+            (digest, st.st_size, st.st_dev, st.st_ino, time.time())
+        )
+        scene_store.record_artifact(dest, kind, scene_id=scene_id, session_id=session_id, digest=digest)
+
+    collect_garbage()
+    return dest
+
+
+def _delete_blob(db, digest):
+    # The blob, every file linked to it and its sidecars; returns the number of files removed
+    paths = [artifact["path"] for artifact in db.execute("SELECT path FROM artifacts WHERE digest = ?", (digest,))]
+    blob_dir = glob.escape(os.path.dirname(_blob_path(digest)))
+    removed = 0
+    for path in [*paths, *glob.glob(os.path.join(blob_dir, f"{digest}.*"))]:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    db.execute("DELETE FROM artifacts WHERE digest = ?", (digest,))
+    db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+    return removed
+
+
+def discard(path):
+    """
+    Delete a published video straight away, e.g. a benchmark render.
+
+    Its blob and previews are deleted too unless another artifact still uses them.
+    """
+    with scene_store.transaction() as db:
+        row = db.execute("SELECT digest FROM artifacts WHERE path = ?", (path,)).fetchone()
+        db.execute("DELETE FROM artifacts WHERE path = ?", (path,))
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        if row and row["digest"] and not db.execute(
+            "SELECT 1 FROM artifacts WHERE digest = ?", (row["digest"],)
+        ).fetchone():
+            _delete_blob(db, row["digest"])
+
+
+def collect_garbage(max_bytes=ARTIFACT_MAX_BYTES, grace=ARTIFACT_GC_GRACE):
+    """
+    Delete unreferenced videos, least recently published first, until the blobs fit in max_bytes.
+
+    A video is referenced while any of its artifact records has a scene or a
+    session. Videos published in the last grace seconds are always kept.
+
+    Returns:
+        int: Bytes freed.
+    """
+    freed = 0
+    removed = 0
+    with scene_store.transaction() as db:
+        total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM blobs").fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        candidates = db.execute(
+            """
+            SELECT digest, bytes FROM blobs
+            WHERE last_used < ? AND NOT EXISTS (
+                SELECT 1 FROM artifacts
+                WHERE artifacts.digest = blobs.digest AND (scene_id IS NOT NULL OR session_id IS NOT NULL)
+            )
+            ORDER BY last_used
+            """,
+            (time.time() - grace,)
+        ).fetchall()
+
+        # Files are deleted inside the transaction, so publish() never links a blob being removed
+        for row in candidates:
+            if total - freed <= max_bytes:
+                break
+            removed += _delete_blob(db, row["digest"])
+            freed += row["bytes"]
+
+    if freed:
+        log_event("artifacts_collected", files=removed, bytes=freed, total_bytes=total - freed)
+    return freed
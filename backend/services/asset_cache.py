@@ -0,0 +1,148 @@
+import os
+import threading
+import uuid
+from backend.utils import link_or_copy, evict_lru
+from config import ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES
+
+# Manim config option -> shared cache subdirectory
+ASSET_KINDS = {"tex_dir": "Tex", "text_dir": "texts"}
+
+# TeX hit/miss counters for this process
+_stats = {"tex_hits": 0, "tex_misses": 0, "text_rendered": 0, "published": 0, "evictions": 0}
+_lock = threading.Lock()
+
+
+def _svg_names(directory):
+    try:
+        return {name for name in os.listdir(directory) if name.endswith(".svg")}
+    except OSError:
+        return set()
+
+
+def open_asset_dirs(root):
+    """
+    Prepare private TeX and Text directories for one manim process.
+
+    Every SVG in the shared cache is hardlinked in, so manim finds compiled
+    formulas and glyphs without ever writing to the shared directory; the
+    links only live for one render, publish_assets() removes them. Leftover
+    files are removed: with no_latex_cleanup manim writes a .tex file for
+    every formula it uses, which is how hits are counted afterwards.
+
+    Args:
+        root (str): Directory to create the private asset directories in.
+    Returns:
+        dict: Private directory per manim option, plus the SVGs present before the render.
+    """
+    assets = {"before": {}}
+    for option, kind in ASSET_KINDS.items():
+        shared_dir = os.path.join(ASSET_CACHE_DIR, kind)
+        private_dir = os.path.abspath(os.path.join(root, kind))
+        os.makedirs(shared_dir, exist_ok=True)
+        os.makedirs(private_dir, exist_ok=True)
+
+        _clear(private_dir)  # e.g. after a killed render
+
+        present = set()
+        for name in _svg_names(shared_dir) - present:
+            try:
+                link_or_copy(os.path.join(shared_dir, name), os.path.join(private_dir, name))
+                present.add(name)
+            except OSError:
+                pass  # evicted meanwhile
+
+        assets[option] = private_dir
+        assets["before"][option] = present
+    return assets
+
+
+def _clear(directory):
+    for name in os.listdir(directory):
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def asset_overrides(assets):
+    """Manim config values that point a render at its private asset directories"""
+    return {"tex_dir": assets["tex_dir"], "text_dir": assets["text_dir"], "no_latex_cleanup": True}
+
+
+def write_asset_config(assets, path):
+    """Write a manim.cfg with the asset overrides, for use with --config_file"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[CLI]\n")
+        for option, value in asset_overrides(assets).items():
+            f.write(f"{option} = {value}\n")
+    return path
+
+
+def _publish(private_path, shared_path):
+    # Link under a temporary name and rename, so readers never see a partial file
+    if os.path.exists(shared_path):
+        return False
+    tmp_path = f"{shared_path}.{uuid.uuid4().hex}.tmp"
+    link_or_copy(private_path, tmp_path)
+    os.replace(tmp_path, shared_path)
+    return True
+
+
+def publish_assets(assets, succeeded=True):
+    """
+    Move newly compiled SVGs into the shared cache after a render, and empty
+    the private directories so they don't keep a copy of the whole cache.
+
+    Args:
+        assets (dict): The result of open_asset_dirs.
+        succeeded (bool): False if manim failed or was killed; its new SVGs
+            may be truncated, so they are deleted instead of published.
+    Returns:
+        dict: tex_hits, tex_misses and text_rendered for this render.
+    """
+    tex_dir = assets["tex_dir"]
+    new_tex = _svg_names(tex_dir) - assets["before"]["tex_dir"]
+    new_text = _svg_names(assets["text_dir"]) - assets["before"]["text_dir"]
+
+    # Every formula used leaves a .tex file; those without a new SVG were hits
+    used_tex = {name[:-len(".tex")] + ".svg" for name in os.listdir(tex_dir) if name.endswith(".tex")}
+    hits = used_tex - new_tex
+    for name in hits:
+        try:
+            os.utime(os.path.join(tex_dir, name))  # shared inode: keeps the entry fresh
+        except OSError:
+            pass
+
+    published = 0
+    for option, names in (("tex_dir", new_tex), ("text_dir", new_text)):
+        shared_dir = os.path.join(ASSET_CACHE_DIR, ASSET_KINDS[option])
+        for name in names:
+            private_path = os.path.join(assets[option], name)
+            try:
+                if succeeded:
+                    published += _publish(private_path, os.path.join(shared_dir, name))
+                else:
+                    os.remove(private_path)
+            except OSError as e:
+                print(f"Warning: Failed to publish {name} to the asset cache: {str(e)}")
+
+    for option in ASSET_KINDS:
+        _clear(assets[option])
+    evicted = evict_lru(ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES, ".svg") if published else 0
+
+    stats = {"tex_hits": len(hits), "tex_misses": len(new_tex), "text_rendered": len(new_text)}
+    with _lock:
+        for key, value in stats.items():
+            _stats[key] += value
+        _stats["published"] += published
+        _stats["evictions"] += evicted
+    return stats
+
+
+def get_asset_cache_stats():
+    """Return the TeX hit/miss counters for this process"""
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["tex_hits"] + stats["tex_misses"]
+    stats["tex_hit_rate"] = stats["tex_hits"] / lookups if lookups else 0.0
+    return stats
@@ -1,8 +1,14 @@
-import streamlit as st
-from backend.utils import get_fallback_code
+import ast
+import re
+from backend.utils import code_validator
+from backend.services.preflight import PreflightError, find_scene_class
 
+# Lines a Manim module can reasonably start with
+CODE_START = re.compile(r"^(import |from |class |def |#|@|\"\"\"|'''|[A-Za-z_][\w.]*\s*=)")
+TOP_LEVEL_CLASS = re.compile(r"^class\s+\w+", re.MULTILINE)
 
-def code_cleaner(code):
+
+def strip_code_fences(code):
     # Clean up the code - remove markdown code blocks if present
     code = code.strip()
     if code.startswith('```python'):
@@ -13,15 +19,81 @@ def code_cleaner(code):
         code = code[:-len('```')]
 
     # Remove any leading/trailing whitespace
-    code = code.strip()
+    return code.strip()
+
+
+def code_cleaner(code):
+    code = strip_code_fences(code)
 
     # Ensure it starts with import or from statement
     if not (code.startswith('import') or code.startswith('from')):
         code = 'from manim import *\n\n' + code
 
-    # Validate that it contains necessary components
-    if 'class' not in code or "def construct(self):" not in code:
-        st.warning("LLM response incomplete, using fallback code...")
-        return get_fallback_code()
-    
-    return code
\ No newline at end of file
+    # A missing Scene or a syntax error is reported by preflight, so the LLM gets to repair it
+    return code
+
+
+class IncrementalCodeChecker:
+    """
+    Check a streamed LLM response while it grows and flag it as soon as it
+    obviously is not Manim code.
+
+    Args:
+        prose_check_chars (int): Characters to wait for before judging the first line.
+        scene_check_chars (int): Characters allowed before a class must appear. Imports and
+            helper functions may come first, and the first class may be a helper scene, so
+            whether there is a Scene subclass is only decided by finish().
+    """
+
+    # Syntax errors that more text could still fix
+    INCOMPLETE_ERRORS = ("never closed", "unterminated", "unexpected EOF", "expected an indented block")
+
+    def __init__(self, prose_check_chars=120, scene_check_chars=4000):
+        self.prose_check_chars = prose_check_chars
+        self.scene_check_chars = scene_check_chars
+        self.buffer = ""
+        self._checked_lines = 0
+
+    def feed(self, chunk):
+        """
+        Add a chunk of the response.
+
+        Returns:
+            tuple: (ok (bool), reason (str) or None) - ok is False once the response is hopeless.
+        """
+        self.buffer += chunk
+        code = strip_code_fences(self.buffer)
+
+        if len(code) >= self.prose_check_chars:
+            first_line = code.lstrip().split("\n", 1)[0]
+            if not CODE_START.match(first_line):
+                return False, f"Response is not Python code: {first_line[:60]!r}"
+
+        if len(code) >= self.scene_check_chars and not TOP_LEVEL_CLASS.search(code):
+            return False, f"No class in the first {self.scene_check_chars} characters, so no Scene subclass."
+
+        # Compile the complete lines; only errors well before the end are final
+        complete_lines = code.count("\n")
+        if complete_lines - self._checked_lines >= 10:
+            self._checked_lines = complete_lines
+            try:
+                compile(code.rsplit("\n", 1)[0], "<stream>", "exec")
+            except SyntaxError as e:
+                incomplete = any(marker in str(e.msg) for marker in self.INCOMPLETE_ERRORS)
+                if not incomplete and e.lineno is not None and e.lineno < complete_lines - 1:
+                    return False, f"Syntax Error at line {e.lineno}: {e.msg}"
+
+        return True, None
+
+    def finish(self):
+        """Validate the complete response"""
+        code = strip_code_fences(self.buffer)
+        valid, error = code_validator(code)
+        if not valid:
+            return valid, error
+        # The same rule as preflight, so a scene derived from a helper scene is accepted
+        try:
+            find_scene_class(ast.parse(code))
+        except PreflightError as e:
+            return False, str(e)
+        return True, None
@@ -0,0 +1,169 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from config import LLM_CACHE_DIR, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+
+try:
+    import fcntl
+except ImportError:  # Windows: identical requests are not coalesced
+    fcntl = None
+
+# In-memory tier: key -> (created_at, response, disk_mtime), most recently used last
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+
+def llm_cache_key(model, system_prompt, **params):
+    """
+    Build the cache key for an LLM request.
+
+    Args:
+        model (str): Model name the request is sent to.
+        system_prompt (str): The full system prompt.
+        **params: Request parameters (prompt, subject, animation_type, ...).
+    Returns:
+        str: Hex digest identifying the request.
+    """
+    payload = {
+        "model": model,
+        "system_prompt": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _disk_path(key):
+    return os.path.join(LLM_CACHE_DIR, key[:2], f"{key}.json")
+
+
+def _disk_mtime(key):
+    try:
+        return os.stat(_disk_path(key)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _remember(key, created_at, response):
+    disk_mtime = _disk_mtime(key)
+    with _lock:
+        _memory[key] = (created_at, response, disk_mtime)
+        _memory.move_to_end(key)
+        while len(_memory) > LLM_CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def get_cached_response(key, ttl=None):
+    """
+    Look up a response in memory, then on disk.
+
+    Returns:
+        str or None: The cached response, or None if missing or expired.
+    """
+    ttl = LLM_CACHE_TTL if ttl is None else ttl
+    now = time.time()
+
+    # A memory entry is only good while its disk file is unchanged, so an
+    # invalidation or a newer response from another process is seen here too
+    disk_mtime = _disk_mtime(key)
+    with _lock:
+        entry = _memory.get(key)
+        if entry:
+            if now - entry[0] <= ttl and entry[2] == disk_mtime:
+                _memory.move_to_end(key)
+                return entry[1]
+            del _memory[key]
+
+    try:
+        with open(_disk_path(key), "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if now - record["created_at"] > ttl:
+        invalidate_cached_response(key)
+        return None
+
+    _remember(key, record["created_at"], record["response"])
+    return record["response"]
+
+
+def store_response(key, response):
+    """Save a response in both tiers"""
+    created_at = time.time()
+    path = _disk_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": created_at, "response": response}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Failed to persist LLM response {key}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _remember(key, created_at, response)
+
+
+def invalidate_cached_response(key=None):
+    """Drop one cached response, or every cached response when key is None"""
+    with _lock:
+        if key is None:
+            _memory.clear()
+        else:
+            _memory.pop(key, None)
+
+    if key is not None:
+        paths = [_disk_path(key)]
+    else:
+        paths = [
+            os.path.join(root, file)
+            for root, dirs, files in os.walk(LLM_CACHE_DIR)
+            for file in files
+        ]
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def single_flight(key):
+    """
+    Let one request per key at a time run, across threads and processes.
+
+    Identical requests that arrive while one is in flight wait here and
+    should then find its response in the cache, so they share one upstream call.
+    Does nothing when key is None.
+    """
+    if key is None or not fcntl:
+        yield
+        return
+
+    path = os.path.join(LLM_CACHE_DIR, key[:2], f"{key}.lock")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    while True:
+        lock = open(path, "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.fstat(lock.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        # The previous holder removed the file on release; lock the current one
+        lock.close()
+    try:
+        yield
+    finally:
+        # Removed while still locked, so a waiter on this file knows to start over
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
@@ -1,23 +1,25 @@
 from backend.api import llm_client
-from config import MODEL_NAME
+from config import MODEL_NAME, LLM_STREAM
+from config.logger import span, increment, observe
 import streamlit as st
+import time
 from backend.utils import get_fallback_code
+from backend.services.clean_code import IncrementalCodeChecker
+from backend.services.llm_cache import (
+    llm_cache_key, get_cached_response, store_response, invalidate_cached_response, single_flight
+)
 
-# Initialize the OpenAI client
-client = llm_client.get_openai_client()
+class LLMResponseError(Exception):
+    """The LLM request failed or its response was abandoned"""
 
-def get_llm_response(prompt, subject, animation_type, duration, background_color, text_color):
-    """
-    Get a response from the LLM based on the provided prompt.
-    
-    Args:
-        prompt (str): The input prompt for the LLM.
-    Returns:
-        str: The response from the LLM.
-    """
 
-    # System prompt based on parameters
-    system_prompt = f"""You are a highly trained Manim coder. Your sole responsibility is to generate Python code strictly for the Manim library. 
+# Pooled OpenAI client and the request rate limit shared with the other processes
+client = llm_client.get_openai_client()
+rate_limiter = llm_client.get_rate_limiter()
+
+def build_system_prompt(subject, animation_type, duration, background_color, text_color):
+    """Build the system prompt for the given scene parameters"""
+    return f"""You are a highly trained Manim coder. Your sole responsibility is to generate Python code strictly for the Manim library. 
 
 Requirements:
 - Generate complete, runnable Manim code
@@ -28,6 +30,7 @@ Requirements:
 - Animation type: {animation_type}
 - Include proper imports and scene class
 - Use Scene class and construct method (not create_animation)
+- Call self.next_section() between the main parts of the animation
 - Code should be production-ready and error-free
 - Return ONLY Python code, no markdown formatting, no explanations
 - Do not wrap code in ```python or ``` blocks
@@ -40,22 +43,174 @@ class MyScene(Scene):
     def construct(self):
         # Your animation code here
 """
-    
+
+def build_repair_prompt(error):
+    """Build the follow-up message asking the LLM to fix its code"""
+    return f"""The code above failed when rendered with Manim:
+
+{error}
+
+Fix the error and return the complete corrected code. Keep the animation the same otherwise.
+Return ONLY Python code, no markdown formatting, no explanations."""
+
+def _cache_key(prompt, subject, animation_type, duration, background_color, text_color, repair_context=None):
+    system_prompt = build_system_prompt(subject, animation_type, duration, background_color, text_color)
+    # Repairs are keyed on the failing code and error too; first attempts keep their old keys
+    extra = {"repair_code": repair_context["code"], "repair_error": repair_context["error"]} if repair_context else {}
+    return llm_cache_key(
+        MODEL_NAME,
+        system_prompt,
+        prompt=prompt,
+        subject=subject,
+        animation_type=animation_type,
+        duration=duration,
+        background_color=background_color,
+        text_color=text_color,
+        **extra
+    )
+
+def invalidate_llm_response(prompt, subject, animation_type, duration, background_color, text_color):
+    """Drop the cached response for these parameters so the next call hits the LLM"""
+    invalidate_cached_response(_cache_key(prompt, subject, animation_type, duration, background_color, text_color))
+
+def _stream_completion(messages, on_token=None, record=None):
+    """
+    Stream a completion through the incremental checker.
+
+    Args:
+        record (dict): Filled with time to first token, the number of content chunks
+            and, when the provider reports usage, the completion tokens.
+    Returns:
+        tuple: (response (str), abort_reason (str) or None, valid (bool))
+    """
+    checker = IncrementalCodeChecker()
+    record = {} if record is None else record
+    started = time.perf_counter()
+    stream = llm_client.create_chat_completion(
+        client,
+        rate_limiter,
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=0.1,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
     try:
-        completion = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-        )
-
-        response = completion.choices[0].message.content
-        return response
-    
-    except Exception as e:
-        st.error(f"Error getting LLM response: {str(e)}")
-        st.info("Using fallback code...")
-        response = get_fallback_code()
-        return response
\ No newline at end of file
+        for chunk in stream:
+            # The usage arrives in a last chunk without choices
+            if getattr(chunk, "usage", None):
+                record["tokens"] = chunk.usage.completion_tokens
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if "ttft_s" not in record:
+                record["ttft_s"] = round(time.perf_counter() - started, 4)
+            record["chunks"] = record.get("chunks", 0) + 1
+            ok, reason = checker.feed(chunk.choices[0].delta.content)
+            if on_token:
+                on_token(checker.buffer)
+            if not ok:
+                # Closing the stream stops the provider from generating further tokens
+                return checker.buffer, reason, False
+    finally:
+        stream.close()
+
+    valid, _ = checker.finish()
+    return checker.buffer, None, valid
+
+def get_llm_response(prompt, subject, animation_type, duration, background_color, text_color,
+                     use_cache=True, stream=LLM_STREAM, on_token=None, repair_context=None, raise_errors=False):
+    """
+    Get a response from the LLM based on the provided prompt.
+
+    Args:
+        prompt (str): The input prompt for the LLM.
+        use_cache (bool): Return a cached response for identical parameters.
+        stream (bool): Stream the completion and abort early if it is clearly not Manim code.
+        on_token (callable): Called with the response so far whenever a streamed chunk arrives.
+        repair_context (dict): "code" that failed and the trimmed "error" it raised;
+            the LLM is asked to fix that code instead of starting over.
+        raise_errors (bool): Raise instead of warning and returning the fallback code,
+            for callers outside the Streamlit script such as render job workers.
+    Returns:
+        str: The response from the LLM.
+    Raises:
+        LLMResponseError: With raise_errors, when the request fails or the stream is aborted.
+    """
+
+    # System prompt based on parameters
+    system_prompt = build_system_prompt(subject, animation_type, duration, background_color, text_color)
+
+    cache_key = _cache_key(prompt, subject, animation_type, duration, background_color, text_color,
+                           repair_context) if use_cache else None
+    if cache_key:
+        cached = get_cached_response(cache_key)
+        if cached:
+            increment("fyp_llm_cache_hits_total")
+            return cached
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+    if repair_context:
+        messages += [
+            {"role": "assistant", "content": repair_context["code"]},
+            {"role": "user", "content": build_repair_prompt(repair_context["error"])}
+        ]
+
+    # Identical concurrent requests share one upstream call; the others get its cached response
+    with single_flight(cache_key):
+        if cache_key:
+            cached = get_cached_response(cache_key)
+            if cached:
+                increment("fyp_llm_coalesced_total")
+                return cached
+
+        try:
+            with span("llm_request", model=MODEL_NAME, stream=stream, repair=bool(repair_context)) as record:
+                if stream:
+                    response, abort_reason, valid = _stream_completion(messages, on_token, record)
+                    if abort_reason:
+                        record.update(status="aborted", error=abort_reason)
+                else:
+                    completion = llm_client.create_chat_completion(
+                        client,
+                        rate_limiter,
+                        model=MODEL_NAME,
+                        messages=messages,
+                        temperature=0.1,
+                    )
+                    response = completion.choices[0].message.content
+                    abort_reason = None
+                    # Same check as a finished stream, so prose or broken code is not cached
+                    checker = IncrementalCodeChecker()
+                    checker.feed(response or "")
+                    valid, _ = checker.finish()
+                    if completion.usage:
+                        record["tokens"] = completion.usage.completion_tokens
+                record["chars"] = len(response or "")
+
+            if "ttft_s" in record:
+                observe("fyp_llm_time_to_first_token_seconds", record["ttft_s"])
+            increment("fyp_llm_tokens_total", record.get("tokens", 0))
+
+            if abort_reason:
+                if raise_errors:
+                    raise LLMResponseError(f"Stopped LLM generation early: {abort_reason}")
+                st.warning(f"Stopped LLM generation early: {abort_reason}")
+                st.info("Using fallback code...")
+                return get_fallback_code()
+
+            if cache_key and response and valid:
+                store_response(cache_key, response)
+            return response
+
+        except LLMResponseError:
+            raise
+        except Exception as e:
+            if raise_errors:
+                raise LLMResponseError(f"Error getting LLM response: {str(e)}") from e
+            st.error(f"Error getting LLM response: {str(e)}")
+            st.info("Using fallback code...")
+            response = get_fallback_code()
+            return response
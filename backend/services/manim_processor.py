@@ -1,102 +1,339 @@
 from backend.utils import code_validator
-import tempfile
+from backend.services.artifact_store import publish
+from backend.services.render_cache import render_cache_key, get_cached_render, get_cached_profile, store_render
+from backend.services.render_workers import get_render_pool
+from backend.services.parallel_render import find_sections, plan_sections, render_sections
+from backend.services.render_runner import run_manim, ProgressTracker
+from backend.services.preflight import preflight
+from backend.services.render_profiler import load_profile, summarize_profile
+from backend.services.asset_cache import open_asset_dirs, asset_overrides, write_asset_config, publish_assets
+from backend.services.workspace import (
+    open_workspace, close_workspace, clear_rendered_videos, find_rendered_video,
+    manim_env, count_partial_movies, record_partial_movies
+)
 import os
-import subprocess
-import shutil
-from config import OUTPUT_DIR
+import sys
+from config.logger import bind, span
+from config import OUTPUT_DIR, RENDER_BACKEND, DRAFT_FRAME_RATE, PARALLEL_SECTIONS, RENDER_SECTION_WORKERS, RENDER_TIMEOUT
+from config import RENDER_PROFILE
 
-def execute_manim_code(code, scene_id, quality="720p"):
+# Repository root, so the profiler launcher can be imported from a scene's workspace
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _publish_video(video_path, final_path, cache_key, profile=None):
+    # Move the rendered video into the artifact store and remember it (and its profile) in the cache
+    with span("publish", bytes=os.path.getsize(video_path)):
+        publish(video_path, final_path, _artifact_kind(final_path), move=True)
+        if cache_key:
+            store_render(cache_key, final_path, profile)
+    return final_path
+
+def _artifact_kind(final_path):
+    return "draft" if final_path.endswith("_draft.mp4") else "video"
+
+def _read_profile(profile_path, stats, error_msg):
+    # Store the profile and, for slow renders that were killed, say where the time went
+    report = load_profile(profile_path)
+    if not report:
+        return error_msg
+    stats["profile"] = report
+    if error_msg and "timed out" in error_msg:
+        error_msg += f"\nSlowest animations before the timeout:\n{summarize_profile(report)}"
+    return error_msg
+
+def execute_manim_code(code, scene_id, quality="720p", use_cache=True, render_backend=None, parallel_sections=PARALLEL_SECTIONS, stats=None,
+                       on_progress=None, should_cancel=None, on_start=None, profile=RENDER_PROFILE):
     """
     Execute the provided Manim code and render the animation.
     
     Args:
         code (str): The Manim Python code to execute.
         scene_id (str): Unique identifier for the scene.
-        quality (str): Video quality setting.
+        quality (str): Video quality setting, or "draft" for a fast low-resolution preview.
         background_color (str): Background color in hex format.
         text_color (str): Text color in hex format.
+        use_cache (bool): Reuse a previously rendered video for identical code and quality.
+        render_backend (str): "subprocess" or "warm"; defaults to RENDER_BACKEND.
+        parallel_sections (bool): Render next_section() sections on separate cores.
+        stats (dict): Filled with cache_hit, the partial movies manim reused or
+            rendered, and TeX asset cache hits and misses.
+        on_progress (callable): Called with (overall fraction or None, animation number) while rendering.
+        should_cancel (callable): Polled while rendering; True kills the render.
+        on_start (callable): Called with the process group ID of each manim process.
+        profile (bool): Fill stats["profile"] with the time, frames and cache hit of every
+            play()/wait() call and the TeX/frame/encoding split. Sections render serially.
+            A render cache hit returns the profile of the render that made the video.
     Returns:
         tuple: (video_path (str) or None, error_message (str) or None)
     """
+    if stats is None:
+        stats = {}
+    with bind(scene_id=scene_id, quality=quality), span("render") as record:
+        video_path, error_msg = _execute_manim_code(
+            code, scene_id, quality, use_cache, render_backend, parallel_sections, stats,
+            on_progress, should_cancel, on_start, profile
+        )
+        record.update(
+            status="ok" if video_path else "error",
+            cache_hit=stats.get("cache_hit"),
+            partial_movies_reused=stats.get("partial_movies_reused"),
+            partial_movies_rendered=stats.get("partial_movies_rendered"),
+            tex_hits=stats.get("tex_hits"),
+            tex_misses=stats.get("tex_misses")
+        )
+        if error_msg:
+            record["error"] = error_msg[-300:]
+    return video_path, error_msg
 
+def _execute_manim_code(code, scene_id, quality, use_cache, render_backend, parallel_sections, stats,
+                        on_progress, should_cancel, on_start, profile):
     # Check code validity
     is_valid, error_msg = code_validator(code)
     if not is_valid:
         return None, f"Code validation failed: {error_msg}"
-    
-    # Create a temporary directory for this scene
-    temp_dir = tempfile.mkdtemp(prefix=f"manim_scene_{scene_id}_")
-    code_file = os.path.join(temp_dir, f"scene_{scene_id}.py")
+
+    # Reject code with no Scene, disallowed imports or endless loops before spawning manim
+    report, error_msg = preflight(code)
+    if error_msg:
+        return None, f"Invalid Manim code: {error_msg}"
+    # Named explicitly: manim would ask which one to render if the code has helper scenes
+    scene_name = report["scene"]
+
+    # Serve identical code and quality straight from the render cache
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    suffix = "_draft" if quality == "draft" else ""
+    final_path = os.path.join(OUTPUT_DIR, f"scene_{scene_id}{suffix}.mp4")
+    cache_key = render_cache_key(code, quality) if use_cache else None
+    stats.update(cache_hit=False, partial_movies_reused=0, partial_movies_rendered=0,
+                 tex_hits=0, tex_misses=0, text_rendered=0)
+    stats.pop("profile", None)
+    if cache_key and get_cached_render(cache_key, final_path):
+        stats["cache_hit"] = True
+        if profile:
+            # The profile of the render that made the cached video
+            report = get_cached_profile(cache_key)
+            if report:
+                stats["profile"] = report
+        # Usually still linked to its blob, so this needs no hashing
+        publish(final_path, final_path, _artifact_kind(final_path))
+        return final_path, None
+
+    sections = find_sections(code)
+    progress = ProgressTracker(sum(sections) if sections else None, on_progress) if on_progress else None
+
+    # Reuse the scene's workspace so manim can skip unchanged animations
+    work_dir, lock = open_workspace(scene_id)
+    code_file = os.path.join(work_dir, f"scene_{scene_id}.py")
+    profile_path = os.path.join(work_dir, "profile.jsonl") if profile else None
 
     try:
-        # Validate code before writing
-        if "class" not in code:
-            return None, "Invalid Manim code: No class definition found."
-        if "def construct(self):" not in code:
-            return None, "Invalid Manim code: No construct method found."
-        
-        # Write the code to a temporary Python file
+        # Write the code to the workspace and drop videos and the profile from the last render
         with open(code_file, "w", encoding="utf-8") as f:
             f.write(code)
+        clear_rendered_videos(work_dir)
+        if profile_path and os.path.exists(profile_path):
+            os.remove(profile_path)
+
+        # Render on a warm worker instead of spawning the manim CLI
+        if (render_backend or RENDER_BACKEND) == "warm":
+            assets = open_asset_dirs(work_dir)
+            video_path, error_msg = get_render_pool().render(
+                code=code,
+                scene_id=scene_id,
+                scene_name=scene_name,
+                quality=quality,
+                media_dir=os.path.join(work_dir, "media"),
+                timeout=RENDER_TIMEOUT,
+                config_overrides=asset_overrides(assets),
+                stats=stats,
+                should_cancel=should_cancel,
+                profile_path=profile_path,
+                on_progress=progress,
+                on_start=on_start
+            )
+            stats.update(publish_assets(assets, succeeded=bool(video_path)))
+            record_partial_movies(stats)
+            if profile_path:
+                error_msg = _read_profile(profile_path, stats, error_msg)
+            if not video_path or not os.path.exists(video_path):
+                return None, f"Manim execution failed: {error_msg}"
+            return _publish_video(video_path, final_path, cache_key, stats.get("profile")), None
 
         # Quality mapping
         quality_flags = {
             "480p": ["-ql"],   # low quality (854x480)
             "720p": ["-qm"],   # medium quality (1280x720)
             "1080p": ["-qh"],  # high quality (1920x1080)
-            "4k": ["-qk"]      # 4k quality
+            "4k": ["-qk"],     # 4k quality
+            "draft": ["-ql", "--frame_rate", str(DRAFT_FRAME_RATE)]  # quick preview
         }
         quality_args = quality_flags.get(quality, ["-qm"])  # fallback: 720p
 
-        # Build manim command
+        # Render sections on separate cores and join them losslessly; a profile needs one process
+        ranges = plan_sections(code, RENDER_SECTION_WORKERS) if parallel_sections and not profile else None
+        if ranges:
+            video_path, error_msg = render_sections(
+                code_file, scene_name, work_dir, quality_args, scene_id, ranges, timeout=RENDER_TIMEOUT, stats=stats,
+                on_progress=progress, should_cancel=should_cancel, on_start=on_start
+            )
+            record_partial_movies(stats)
+            if not video_path:
+                return None, f"Manim execution failed: {error_msg}"
+            return _publish_video(video_path, final_path, cache_key), None
+
+        # Build manim command, pointing TeX and Text output at the shared asset cache
+        assets = open_asset_dirs(work_dir)
         cmd = [
             "manim",
             *quality_args,
             code_file,
-            "--output_file", f"scene_{scene_id}"
+            scene_name,
+            "--output_file", f"scene_{scene_id}",
+            "--config_file", write_asset_config(assets, os.path.join(work_dir, "assets.cfg"))
         ]
+        env = manim_env()
+        if profile_path:
+            # Same manim CLI, run through the profiler's launcher
+            cmd = [sys.executable, "-m", "backend.services.render_profiler", profile_path, "--", *cmd[1:]]
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_ROOT, env.get("PYTHONPATH")]))
 
-        # Run the command with better error handling
-        result = subprocess.run(
+        # Run manim in its own process group, with resource limits
+        result = run_manim(
             cmd,
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            timeout=300,  # 5 minute timeout
-            encoding='utf-8',
-            errors='replace'
+            cwd=work_dir,
+            timeout=RENDER_TIMEOUT,
+            env=env,
+            on_progress=progress,
+            should_cancel=should_cancel,
+            on_start=on_start
         )
+        stats.update(publish_assets(assets, succeeded=result.returncode == 0))
+        stats.update(count_partial_movies(result.output))
+        record_partial_movies(stats)
 
+        if result.cancelled:
+            return None, "Render cancelled."
+        if result.timed_out:
+            error_msg = f"Manim execution timed out ({RENDER_TIMEOUT} seconds)."
+            return None, _read_profile(profile_path, stats, error_msg) if profile_path else error_msg
+        if profile_path:
+            _read_profile(profile_path, stats, None)
         if result.returncode == 0:
             # Locate the rendered video file
-            media_dir = os.path.join(temp_dir, "media", "videos")
-
-            if not os.path.exists(media_dir):
-                return None, f"No video file generated. Manim output: {result.stdout}"
-            for root, dirs, files in os.walk(media_dir):
-                for file in files:
-                    if file.endswith(".mp4"):
-                        video_path = os.path.join(root, file)
-                        
-                        # Create output directory if it doesn't exist
-                        output_dir = OUTPUT_DIR
-                        os.makedirs(output_dir, exist_ok=True)
-
-                        # Copy video to output directory
-                        final_path = os.path.join(output_dir, f"scene_{scene_id}.mp4")
-                        shutil.copy2(video_path, final_path)
-
-                        return final_path, None
+            video_path = find_rendered_video(os.path.join(work_dir, "media", "videos"))
+            if not video_path:
+                return None, f"No video file generated. Manim output: {result.output}"
+
+            # Copy video to output directory
+            return _publish_video(video_path, final_path, cache_key, stats.get("profile")), None
         else:
-            error_msg = result.stderr if result.stderr else result.stdout
-            return None, f"Manim execution failed: {error_msg}"
-    except subprocess.TimeoutExpired:
-        return None, "Manim execution timed out (5 minutes)."
+            return None, f"Manim execution failed: {result.output}"
     except Exception as e:
         return None, f"Execution error: {str(e)}"
     finally:
-        # Clean up temporary directory
+        # Keep the workspace (and its partial movies) for the next render
+        try:
+            close_workspace(work_dir, lock)
+        except Exception as e:
+            print(f"Warning: Failed to release workspace {work_dir}: {str(e)}")
+
+def validate_manim_code(code, scene_id, render_backend=None, stats=None,
+                        on_progress=None, should_cancel=None, on_start=None):
+    """
+    Run the scene in manim's dry-run mode before paying for a real render.
+
+    construct() runs to the end, so runtime errors surface, but no frames are
+    written or encoded. Formulas compiled here land in the asset cache and
+    are reused by the real render.
+
+    Args:
+        code (str): The Manim Python code to execute.
+        scene_id (str): Unique identifier for the scene.
+        render_backend (str): "subprocess" or "warm"; defaults to RENDER_BACKEND.
+        stats (dict): Filled with the TeX asset cache counts of the dry run.
+        on_progress (callable): Called with (overall fraction or None, animation number) while running.
+        should_cancel (callable): Polled while running; True kills the dry run.
+        on_start (callable): Called with the process group ID of the manim process.
+    Returns:
+        tuple: (passed (bool), error_message (str) or None)
+    """
+    with span("dry_run", scene_id=scene_id) as record:
+        passed, error_msg = _validate_manim_code(code, scene_id, render_backend, stats, on_progress, should_cancel, on_start)
+        record["status"] = "ok" if passed else "error"
+        if error_msg:
+            record["error"] = error_msg[-300:]
+    return passed, error_msg
+
+
+def _validate_manim_code(code, scene_id, render_backend, stats, on_progress, should_cancel, on_start):
+    is_valid, error_msg = code_validator(code)
+    if not is_valid:
+        return False, f"Code validation failed: {error_msg}"
+    report, error_msg = preflight(code)
+    if error_msg:
+        return False, f"Invalid Manim code: {error_msg}"
+    scene_name = report["scene"]
+
+    if stats is None:
+        stats = {}
+    sections = find_sections(code)
+    progress = ProgressTracker(sum(sections) if sections else None, on_progress) if on_progress else None
+
+    work_dir, lock = open_workspace(scene_id)
+    code_file = os.path.join(work_dir, f"scene_{scene_id}.py")
+    try:
+        with open(code_file, "w", encoding="utf-8") as f:
+            f.write(code)
+        assets = open_asset_dirs(work_dir)
+
+        if (render_backend or RENDER_BACKEND) == "warm":
+            _, error_msg = get_render_pool().render(
+                code=code,
+                scene_id=scene_id,
+                scene_name=scene_name,
+                quality="480p",
+                media_dir=os.path.join(work_dir, "media"),
+                timeout=RENDER_TIMEOUT,
+                config_overrides=dict(asset_overrides(assets), dry_run=True),
+                should_cancel=should_cancel,
+                on_progress=progress,
+                on_start=on_start
+            )
+            stats.update(publish_assets(assets, succeeded=error_msg is None))
+            if error_msg:
+                return False, f"Dry run failed: {error_msg}"
+            return True, None
+
+        cmd = [
+            "manim",
+            "-ql",
+            "--dry_run",
+            code_file,
+            scene_name,
+            "--config_file", write_asset_config(assets, os.path.join(work_dir, "assets.cfg"))
+        ]
+        result = run_manim(
+            cmd,
+            cwd=work_dir,
+            timeout=RENDER_TIMEOUT,
+            env=manim_env(),
+            on_progress=progress,
+            should_cancel=should_cancel,
+            on_start=on_start
+        )
+        stats.update(publish_assets(assets, succeeded=result.returncode == 0))
+
+        if result.cancelled:
+            return False, "Render cancelled."
+        if result.timed_out:
+            return False, f"Dry run timed out ({RENDER_TIMEOUT} seconds)."
+        if result.returncode != 0:
+            return False, f"Dry run failed: {result.output}"
+        return True, None
+    except Exception as e:
+        return False, f"Execution error: {str(e)}"
+    finally:
         try:
-            shutil.rmtree(temp_dir)
+            close_workspace(work_dir, lock)
         except Exception as e:
-            print(f"Warning: Failed to delete temp directory {temp_dir}: {str(e)}")
\ No newline at end of file
+            print(f"Warning: Failed to release workspace {work_dir}: {str(e)}")
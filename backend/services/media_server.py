@@ -0,0 +1,258 @@
+import email.utils
+import ipaddress
+import mimetypes
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit, parse_qs
+from config import OUTPUT_DIR, MEDIA_PORT, MEDIA_HOST, MEDIA_URL
+
+# Served URLs look like /media/<path relative to the media root>
+URL_PREFIX = "/media/"
+
+# Chunk size when sendfile is unavailable (Windows, some file systems)
+COPY_CHUNK = 1024 * 1024
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# The server started by start_media_server(), None while it is not running
+_server = None
+
+mimetypes.add_type("video/mp4", ".mp4")
+mimetypes.add_type("image/webp", ".webp")
+
+
+def make_etag(stat):
+    """Strong ETag from a file's size and modification time"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header.
+
+    Args:
+        header (str): Range header value, e.g. "bytes=0-1023", "bytes=500-" or "bytes=-500".
+        size (int): Size of the file in bytes.
+    Returns:
+        tuple or None: (start, end) inclusive byte offsets, None to send the whole file
+        (no header, or several ranges), or "unsatisfiable".
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None  # multiple or malformed ranges: ignoring Range is allowed
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """
+    Serve files under root with Range requests, ETags and os.sendfile.
+
+    st.video and st.download_button copy the whole file into the Streamlit
+    server's memory on every rerun; the browser streams from here instead.
+    """
+    protocol_version = "HTTP/1.1"  # keep-alive, so seeking doesn't reconnect
+    root = OUTPUT_DIR
+
+    def log_message(self, *args):
+        pass
+
+    def _resolve(self, url_path):
+        # Map the URL to a file inside the root, refusing anything that escapes it
+        if not url_path.startswith(URL_PREFIX):
+            return None
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, unquote(url_path[len(URL_PREFIX):])))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            return None
+        return path
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        url = urlsplit(self.path)
+        path = self._resolve(url.path)
+        if path is None:
+            self.send_error(404)
+            return
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = make_etag(stat)
+            if etag in (tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            # If-Range: only honour Range when the client's copy is still current
+            byte_range = None
+            if self.headers.get("If-Range", etag) == etag:
+                byte_range = parse_range(self.headers.get("Range"), stat.st_size)
+            if byte_range == "unsatisfiable":
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{stat.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = byte_range or (0, stat.st_size - 1)
+            length = max(end - start + 1, 0)
+            self.send_response(206 if byte_range else 200)
+            self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+            self.send_header("Cache-Control", "no-cache")  # revalidate with the ETag
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+            download = parse_qs(url.query).get("download")
+            if download:
+                self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(download[0])}")
+            self.end_headers()
+
+            if send_body and length:
+                try:
+                    self._send_file(f, start, length)
+                except ConnectionError:
+                    # The player seeked elsewhere and dropped this request
+                    self.close_connection = True
+
+    def _send_file(self, f, offset, count):
+        if hasattr(os, "sendfile"):
+            try:
+                # Zero-copy from the page cache to the socket
+                while count > 0:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset, count)
+                    if sent == 0:
+                        return
+                    offset += sent
+                    count -= sent
+                return
+            except OSError as e:
+                # A dropped client is final; anything else means no sendfile for this file
+                if isinstance(e, ConnectionError):
+                    raise
+        # Copy the rest in bounded chunks
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(COPY_CHUNK, count))
+            if not chunk:
+                return
+            self.wfile.write(chunk)
+            count -= len(chunk)
+
+
+def start_media_server(port=MEDIA_PORT, host=MEDIA_HOST, root=OUTPUT_DIR):
+    """
+    Serve the files under root from a background thread.
+
+    Returns:
+        ThreadingHTTPServer or None: The server, or None if the port is taken;
+        media_url() then returns None and videos go through Streamlit. With
+        port 0 the OS picks a free port, which media_url() reads back.
+    """
+    global _server
+    handler = type("BoundMediaHandler", (MediaHandler,), {"root": root})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"Warning: Media server not started on {host}:{port}: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _server = server
+    return server
+
+
+def stop_media_server():
+    """Stop the server started by start_media_server(), if any"""
+    global _server
+    server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+def _base_url(page_host):
+    # MEDIA_URL, or the host the browser loaded the page from, on the media server's port
+    if MEDIA_URL:
+        return MEDIA_URL.rstrip("/")
+    bound_host, port = _server.server_address[:2]
+    hostname = urlsplit(f"//{page_host}").hostname if page_host else None
+    hostname = hostname or "localhost"
+    # A server bound to the loopback interface is out of reach for other machines
+    if _is_loopback(bound_host) and not _is_loopback(hostname):
+        return None
+    if ":" in hostname:
+        hostname = f"[{hostname}]"
+    return f"http://{hostname}:{port}"
+
+
+def media_url(path, download_name=None, root=OUTPUT_DIR, page_host=None):
+    """
+    URL of a file under root on the media server.
+
+    Args:
+        path (str): The file.
+        download_name (str): Ask the browser to save the file under this name.
+        page_host (str): Host header of the page request, e.g. "example.com:8501".
+    Returns:
+        str or None: The URL, or None if the media server is not running, can't be
+        reached from the browser, or the file is outside root.
+    """
+    if _server is None or not path:
+        return None
+    base_url = _base_url(page_host)
+    if not base_url:
+        return None
+    root = os.path.realpath(root)
+    full_path = os.path.realpath(path)
+    if os.path.commonpath([root, full_path]) != root:
+        return None
+    try:
+        # A re-rendered scene keeps its file name; the version makes the player fetch it again
+        version = make_etag(os.stat(full_path)).strip('"')
+    except OSError:
+        return None
+    relative = os.path.relpath(full_path, root).replace(os.sep, "/")
+    url = f"{base_url}{URL_PREFIX}{quote(relative)}?v={version}"
+    if download_name:
+        url += f"&download={quote(download_name)}"
+    return url
@@ -0,0 +1,186 @@
+import ast
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.services.stitch_videos import video_stitcher
+from backend.services.asset_cache import open_asset_dirs, write_asset_config, publish_assets
+from backend.services.render_runner import run_manim
+from backend.services.preflight import find_scene_class, scene_methods, PreflightError
+from backend.services.workspace import find_rendered_video, manim_env, count_partial_movies
+from config import PARALLEL_MIN_ANIMATIONS, RENDER_SECTION_WORKERS
+
+# Scene methods that each count as one animation in manim's numbering
+ANIMATION_METHODS = ("play", "wait", "pause", "wait_until")
+
+
+def _self_call(node):
+    """Return the method name if node is a call like self.<name>(...)"""
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and isinstance(node.func.value, ast.Name) and node.func.value.id == "self"):
+        return node.func.attr
+    return None
+
+
+def find_sections(code):
+    """
+    Statically split construct() into sections at self.next_section() calls.
+
+    Only straight-line construct() bodies can be numbered ahead of time: if an
+    animation happens inside a loop, branch or helper method the count is
+    unknown and None is returned.
+
+    Args:
+        code (str): The Manim Python code.
+    Returns:
+        list or None: Animation counts per section, in order.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    try:
+        scene = find_scene_class(tree)
+    except PreflightError:
+        return None
+    methods = scene_methods(tree, scene)
+    helpers = set(methods) - {"construct"}
+    construct = methods["construct"]
+
+    sections = [0]
+    for stmt in construct.body:
+        name = _self_call(stmt.value) if isinstance(stmt, ast.Expr) else None
+        if name in ANIMATION_METHODS:
+            sections[-1] += 1
+            continue
+        if name == "next_section":
+            if sections[-1]:
+                sections.append(0)
+            continue
+
+        # Anything else must not animate, directly or through a helper
+        for node in ast.walk(stmt):
+            called = _self_call(node)
+            if called in ANIMATION_METHODS or called == "next_section" or called in helpers:
+                return None
+
+    return [count for count in sections if count]
+
+
+def plan_sections(code, max_parts):
+    """
+    Group a scene's sections into at most max_parts contiguous animation ranges.
+
+    Returns:
+        list or None: Inclusive (first, last) animation numbers per part, or
+        None when the scene should be rendered serially.
+    """
+    sections = find_sections(code)
+    if not sections or len(sections) < 2 or max_parts < 2 or sum(sections) < PARALLEL_MIN_ANIMATIONS:
+        return None
+
+    # Close a part whenever the running total passes the next even share
+    total = sum(sections)
+    parts = min(max_parts, len(sections))
+    ranges = []
+    first = done = 0
+    for i, count in enumerate(sections):
+        done += count
+        remaining_sections = len(sections) - i - 1
+        remaining_parts = parts - len(ranges) - 1
+        if done >= total * (len(ranges) + 1) / parts or remaining_sections == remaining_parts:
+            ranges.append((first, done - 1))
+            first = done
+        if len(ranges) == parts - 1:
+            break
+    ranges.append((first, total - 1))
+    return ranges
+
+
+def _render_part(code_file, scene_name, work_dir, quality_args, scene_id, index, first, last, timeout, monitor):
+    media_dir = os.path.join(work_dir, f"part_{index}")
+    # Each part gets its own asset directories; parts compile the same formulas concurrently
+    os.makedirs(media_dir, exist_ok=True)
+    assets = open_asset_dirs(media_dir)
+    cmd = [
+        "manim",
+        *quality_args,
+        "-n", f"{first},{last}",
+        code_file,
+        scene_name,
+        "--media_dir", media_dir,
+        "--output_file", f"scene_{scene_id}_part{index}",
+        "--config_file", write_asset_config(assets, os.path.join(media_dir, "assets.cfg"))
+    ]
+    result = run_manim(cmd, cwd=work_dir, timeout=timeout, env=manim_env(), **monitor)
+    counts = count_partial_movies(result.output)
+    counts.update(publish_assets(assets, succeeded=result.returncode == 0))
+    if result.cancelled:
+        return None, "Render cancelled.", counts
+    if result.timed_out:
+        return None, f"Manim execution timed out ({timeout} seconds).", counts
+    if result.returncode != 0:
+        return None, result.output, counts
+    video_path = find_rendered_video(os.path.join(media_dir, "videos"))
+    if not video_path:
+        return None, f"No video file generated for animations {first}-{last}. Manim output: {result.output}", counts
+    return video_path, None, counts
+
+
+def render_sections(code_file, scene_name, work_dir, quality_args, scene_id, ranges, timeout=300, stats=None,
+                    on_progress=None, should_cancel=None, on_start=None):
+    """
+    Render animation ranges of one scene in parallel manim processes and join them.
+
+    Each process skips (without rendering) the animations before its range,
+    so the parts line up exactly and can be concatenated with stream copy.
+
+    Args:
+        code_file (str): Path to the scene's Python file.
+        scene_name (str): Scene class to render.
+        work_dir (str): Directory for the per-part media.
+        quality_args (list): Manim quality flags.
+        scene_id (str): Unique identifier for the scene.
+        ranges (list): Inclusive (first, last) animation numbers per part.
+        timeout (float): Seconds allowed per part.
+        stats (dict): Filled with partial movie and asset cache counts summed over the parts.
+        on_progress (callable): Called with (animation number, fraction) from every part.
+        should_cancel (callable): Polled while rendering; True kills every part.
+        on_start (callable): Called with the process group ID of each part.
+    Returns:
+        tuple: (video_path (str) or None, error_message (str) or None)
+    """
+    # One failed part dooms the scene, so it stops the others
+    failed = threading.Event()
+    monitor = {
+        "on_progress": on_progress,
+        "should_cancel": lambda: failed.is_set() or bool(should_cancel and should_cancel()),
+        "on_start": on_start,
+    }
+
+    def render_part(part):
+        index, (first, last) = part
+        result = _render_part(code_file, scene_name, work_dir, quality_args, scene_id, index, first, last, timeout,
+                              monitor)
+        if result[1]:
+            failed.set()
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(min(len(ranges), RENDER_SECTION_WORKERS), 1)) as pool:
+        results = list(pool.map(render_part, enumerate(ranges)))
+
+    if stats is not None:
+        for path, error, counts in results:
+            for key, value in counts.items():
+                stats[key] = stats.get(key, 0) + value
+
+    # Report the part that failed, not the ones it cancelled
+    errors = sorted((error for path, error, counts in results if error), key=lambda error: error == "Render cancelled.")
+    if errors:
+        return None, errors[0]
+
+    output_path = os.path.join(work_dir, f"scene_{scene_id}.mp4")
+    success, message = video_stitcher([path for path, error, counts in results], output_path, "cut", use_cache=False)
+    if not success:
+        return None, f"Failed to join sections: {message}"
+    return output_path, None
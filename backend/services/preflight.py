@@ -0,0 +1,327 @@
+import ast
+from config import PREFLIGHT_MAX_VIDEO_SECONDS, PREFLIGHT_DOWNGRADE_SECONDS, PREFLIGHT_PARALLEL_MIN_SECONDS
+
+# Top-level modules scene code may import
+ALLOWED_IMPORTS = {
+    "manim", "numpy", "math", "cmath", "random", "itertools", "functools", "operator",
+    "collections", "copy", "string", "typing", "dataclasses", "enum", "decimal",
+    "fractions", "statistics", "colour", "__future__",
+}
+
+# Builtins and manim classes that execute code or touch files
+DISALLOWED_CALLS = {
+    "open", "exec", "eval", "compile", "__import__", "input", "breakpoint",
+    "globals", "vars", "getattr", "setattr", "delattr",
+    "ImageMobject", "SVGMobject",
+}
+
+# numpy functions and array methods that read or write files
+FILE_IO_FUNCTIONS = {
+    "load", "save", "savez", "savez_compressed", "loadtxt", "savetxt", "genfromtxt",
+    "fromfile", "tofile", "fromregex", "memmap", "DataSource",
+}
+
+# Attributes used to escape into the interpreter's internals
+DISALLOWED_ATTRIBUTES = {
+    "__subclasses__", "__globals__", "__builtins__", "__code__", "__bases__", "__mro__", "__loader__",
+}
+
+# Iterators that never end on their own
+UNBOUNDED_ITERATORS = {"count", "cycle", "repeat"}
+
+# Iterations assumed for a loop whose length is unknown
+UNKNOWN_LOOP_ITERATIONS = 5
+
+
+class PreflightError(Exception):
+    """Scene code that must not be rendered"""
+
+
+def _base_names(node):
+    return [base.attr if isinstance(base, ast.Attribute) else getattr(base, "id", "") for base in node.bases]
+
+
+def scene_methods(tree, scene):
+    """
+    Return a scene class's methods by name, including those it inherits from
+    classes defined in the same code (e.g. a helper base scene).
+    """
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    methods = {}
+    pending, seen = [scene], set()
+    while pending:
+        node = pending.pop(0)
+        if node.name in seen:
+            continue
+        seen.add(node.name)
+        for stmt in node.body:
+            if isinstance(stmt, ast.FunctionDef):
+                methods.setdefault(stmt.name, stmt)  # the subclass's own version wins
+        pending.extend(classes[name] for name in _base_names(node) if name in classes)
+    return methods
+
+
+def find_scene_class(tree):
+    """
+    Return the Scene subclass to render: the last one with a construct() method.
+
+    Helper scenes (a shared base class, say) have to be defined before the
+    scene that uses them, so the last one is the scene itself.
+
+    Raises:
+        PreflightError: If there is no such class.
+    """
+    scene_names = set()
+    scenes = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        if any(base.endswith("Scene") or base in scene_names for base in _base_names(node)):
+            scene_names.add(node.name)
+            if "construct" in scene_methods(tree, node):
+                scenes.append(node)
+
+    if not scenes:
+        raise PreflightError("No Scene subclass with a construct() method found.")
+    return scenes[-1]
+
+
+def _call_name(node):
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def _has_break(loop):
+    # A break that belongs to this loop, not to a nested loop or function
+    pending = list(loop.body)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, ast.Break):
+            return True
+        if not isinstance(node, (ast.For, ast.While, ast.FunctionDef, ast.Lambda)):
+            pending.extend(ast.iter_child_nodes(node))
+    return False
+
+
+def check_safety(tree):
+    """
+    Reject imports, calls and attributes scene code has no business using.
+
+    Raises:
+        PreflightError: On the first offending node.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] not in ALLOWED_IMPORTS:
+                    raise PreflightError(f"Import of '{alias.name}' is not allowed (line {node.lineno}).")
+        elif isinstance(node, ast.ImportFrom):
+            module = (node.module or "").split(".")[0]
+            if node.level or module not in ALLOWED_IMPORTS:
+                raise PreflightError(f"Import from '{node.module}' is not allowed (line {node.lineno}).")
+            for alias in node.names:
+                if alias.name in FILE_IO_FUNCTIONS:
+                    raise PreflightError(f"Import of '{alias.name}' is not allowed (line {node.lineno}).")
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in DISALLOWED_CALLS:
+            raise PreflightError(f"Call to '{node.func.id}' is not allowed (line {node.lineno}).")
+        elif isinstance(node, ast.Attribute) and node.attr in FILE_IO_FUNCTIONS:
+            # np.load(), np.save(), array.tofile() and the like; scenes have no files to read or write
+            raise PreflightError(f"Use of '{node.attr}' is not allowed (line {node.lineno}).")
+        elif isinstance(node, ast.Attribute) and node.attr in DISALLOWED_ATTRIBUTES:
+            raise PreflightError(f"Access to '{node.attr}' is not allowed (line {node.lineno}).")
+        elif isinstance(node, ast.While):
+            test = node.test
+            if isinstance(test, ast.Constant) and test.value and not _has_break(node):
+                raise PreflightError(f"Unbounded while loop without break (line {node.lineno}).")
+        elif isinstance(node, ast.For) and isinstance(node.iter, ast.Call):
+            if _call_name(node.iter) in UNBOUNDED_ITERATORS and not _has_break(node):
+                raise PreflightError(f"Unbounded for loop over {_call_name(node.iter)}() (line {node.lineno}).")
+
+
+def _number(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _number(node.operand)
+        return -value if value is not None else None
+    return None
+
+
+def _iterations(node):
+    """Length of a loop's iterable when it is known statically, else None"""
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return len(node.elts)
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return len(node.value)
+    if isinstance(node, ast.Call) and node.args:
+        name = _call_name(node)
+        if name == "range":
+            bounds = [_number(arg) for arg in node.args]
+            if all(isinstance(bound, int) for bound in bounds):
+                return len(range(*bounds))
+        elif name in ("enumerate", "reversed", "list", "tuple", "sorted"):
+            return _iterations(node.args[0])
+        elif name == "zip":
+            lengths = [_iterations(arg) for arg in node.args]
+            return min(lengths) if None not in lengths else None
+    return None
+
+
+def _keyword(call, name):
+    return next((keyword.value for keyword in call.keywords if keyword.arg == name), None)
+
+
+class _CostEstimator:
+    """Sum the run time of the play/wait calls construct() reaches"""
+
+    def __init__(self, scene, tree):
+        self.methods = scene_methods(tree, scene)
+        self.animations = 0
+        self.exact = True
+        self._active = set()
+
+    def seconds(self, value):
+        # Manim's default run time and wait duration are both one second
+        if value is None:
+            return 1.0
+        seconds = _number(value)
+        if seconds is None:
+            self.exact = False
+            return 1.0
+        return seconds
+
+    def run_time(self, call):
+        # play(..., run_time=x) wins; otherwise the longest animation inside it
+        value = _keyword(call, "run_time")
+        if value is not None:
+            return self.seconds(value)
+        animations = [arg for arg in call.args if isinstance(arg, ast.Call)]
+        return max([self.seconds(_keyword(animation, "run_time")) for animation in animations] or [1.0])
+
+    def wait_time(self, call):
+        return self.seconds(call.args[0] if call.args else _keyword(call, "duration"))
+
+    def calls(self, node):
+        seconds = 0.0
+        for child in ast.walk(node):
+            if not (isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+                    and isinstance(child.func.value, ast.Name) and child.func.value.id == "self"):
+                continue
+            name = child.func.attr
+            if name == "play":
+                self.animations += 1
+                seconds += self.run_time(child)
+            elif name in ("wait", "pause"):
+                self.animations += 1
+                seconds += self.wait_time(child)
+            elif name == "wait_until":
+                self.animations += 1
+                self.exact = False
+                seconds += self.wait_time(child)
+            elif name in self.methods and name not in self._active:
+                self._active.add(name)
+                seconds += self.block(self.methods[name].body)
+                self._active.discard(name)
+        return seconds
+
+    def block(self, body):
+        seconds = 0.0
+        for stmt in body:
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            if isinstance(stmt, (ast.For, ast.While)):
+                count = _iterations(stmt.iter) if isinstance(stmt, ast.For) else None
+                if count is None:
+                    count = UNKNOWN_LOOP_ITERATIONS
+                    self.exact = False
+                before = self.animations
+                loop_seconds = self.block(stmt.body)
+                self.animations = before + (self.animations - before) * count
+                seconds += loop_seconds * count + self.block(stmt.orelse)
+            elif isinstance(stmt, ast.If):
+                before = self.animations
+                then_seconds = self.block(stmt.body)
+                then_animations = self.animations - before
+                self.animations = before
+                else_seconds = self.block(stmt.orelse)
+                self.animations = before + max(then_animations, self.animations - before)
+                seconds += max(then_seconds, else_seconds)
+            elif isinstance(stmt, (ast.With, ast.Try)):
+                seconds += self.block(stmt.body) + self.block(getattr(stmt, "finalbody", []))
+            else:
+                seconds += self.calls(stmt)
+        return seconds
+
+
+def estimate_cost(scene, tree):
+    """
+    Estimate how long a scene's video will be.
+
+    Args:
+        scene (ast.ClassDef): The scene class, from find_scene_class.
+        tree (ast.Module): The parsed code, for methods inherited from helper classes.
+
+    Returns:
+        dict: scene class name, animations, video_seconds and whether the estimate is exact.
+    """
+    estimator = _CostEstimator(scene, tree)
+    seconds = estimator.block(estimator.methods["construct"].body)
+    return {
+        "scene": scene.name,
+        "animations": estimator.animations,
+        "video_seconds": round(seconds, 2),
+        "exact": estimator.exact,
+    }
+
+
+def preflight(code):
+    """
+    Check Manim code statically before any process is spawned.
+
+    Args:
+        code (str): The Manim Python code.
+    Returns:
+        tuple: (report (dict) or None, error_message (str) or None)
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return None, f"Syntax Error at line {e.lineno}: {e.msg}"
+
+    try:
+        scene = find_scene_class(tree)
+        check_safety(tree)
+    except PreflightError as e:
+        return None, str(e)
+    return estimate_cost(scene, tree), None
+
+
+def plan_render(report, quality):
+    """
+    Decide how to render a scene from its pre-flight report.
+
+    Args:
+        report (dict): The result of preflight.
+        quality (str): Requested video quality.
+    Returns:
+        tuple: (plan (dict) with quality, downgraded and parallel_sections, or None;
+        error_message (str) or None)
+    """
+    seconds = report["video_seconds"]
+    if seconds > PREFLIGHT_MAX_VIDEO_SECONDS:
+        return None, f"Scene is estimated at {seconds:.0f}s of video; the limit is {PREFLIGHT_MAX_VIDEO_SECONDS}s."
+
+    # Long scenes at high resolution are what fill the render queue
+    planned = quality
+    if quality in ("1080p", "4k") and seconds > PREFLIGHT_DOWNGRADE_SECONDS:
+        planned = "720p"
+
+    return {
+        "quality": planned,
+        "downgraded": planned != quality,
+        # Short scenes finish before extra processes pay off
+        "parallel_sections": seconds >= PREFLIGHT_PARALLEL_MIN_SECONDS,
+    }, None
@@ -0,0 +1,127 @@
+import json
+import os
+import subprocess
+import uuid
+from backend.services.artifact_store import find_digest, sidecar_path
+from config.logger import span
+from config import PREVIEW_HEIGHT, PREVIEW_BITRATE_KBPS, THUMBNAIL_WIDTH, THUMBNAIL_SECONDS
+
+# File suffix of each preview, next to the video's blob
+PREVIEW_SUFFIXES = {"poster": ".poster.jpg", "thumbnail": ".thumb.webp", "proxy": ".proxy.mp4"}
+
+# Where in the video the poster frame is taken, as a fraction of its length
+POSTER_POSITION = 0.5
+
+THUMBNAIL_FPS = 8
+
+
+def _probe_duration(path):
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            return None
+        return float(json.loads(result.stdout)["format"]["duration"])
+    except (OSError, ValueError, KeyError, subprocess.TimeoutExpired):
+        return None
+
+
+def _encode(args, output_path):
+    # Encode to a temporary name and rename, so a half-written preview is never served
+    root, ext = os.path.splitext(output_path)
+    tmp_path = f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+    cmd = ["ffmpeg", "-y", "-v", "error", *args, tmp_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        if result.returncode != 0:
+            return result.stderr.strip()[-300:]
+        os.replace(tmp_path, output_path)
+        return None
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return str(e)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _poster_args(video_path, duration):
+    return [
+        "-ss", f"{duration * POSTER_POSITION:.3f}",
+        "-i", video_path,
+        "-frames:v", "1",
+        "-vf", f"scale=-2:'min({PREVIEW_HEIGHT},ih)'",
+        "-q:v", "4",
+        "-update", "1"
+    ]
+
+
+def _proxy_args(video_path):
+    return [
+        "-i", video_path,
+        "-vf", f"scale=-2:'min({PREVIEW_HEIGHT},ih)'",
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-crf", "30",
+        "-maxrate", f"{PREVIEW_BITRATE_KBPS}k",
+        "-bufsize", f"{PREVIEW_BITRATE_KBPS * 2}k",
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-b:a", "64k",
+        "-movflags", "+faststart"
+    ]
+
+
+def _thumbnail_args(video_path, duration):
+    # The whole scene, sped up to at most THUMBNAIL_SECONDS
+    speed = min(THUMBNAIL_SECONDS / duration, 1.0) if duration > 0 else 1.0
+    return [
+        "-i", video_path,
+        "-vf", f"setpts={speed:.4f}*PTS,fps={THUMBNAIL_FPS},scale={THUMBNAIL_WIDTH}:-2:flags=lanczos",
+        "-an",
+        "-c:v", "libwebp",
+        "-loop", "0",
+        "-quality", "60"
+    ]
+
+
+def make_previews(video_path):
+    """
+    Make (or reuse) the poster, animated thumbnail and proxy clip of a published video.
+
+    They sit next to the video's blob, so identical renders share them and
+    they are deleted with the video. A preview that ffmpeg fails to make is
+    left out; the scene list then falls back to the full video.
+
+    Args:
+        video_path (str): A video published through the artifact store.
+    Returns:
+        dict: Paths of the previews that exist, keyed by "poster", "thumbnail" and "proxy".
+    """
+    try:
+        digest = find_digest(video_path)
+    except OSError as e:
+        print(f"Warning: No previews for {video_path}: {str(e)}")
+        return {}
+    paths = {name: sidecar_path(digest, suffix) for name, suffix in PREVIEW_SUFFIXES.items()}
+    missing = [name for name, path in paths.items() if not os.path.exists(path)]
+    if not missing:
+        return paths
+
+    with span("previews", bytes=os.path.getsize(video_path), made=len(missing)):
+        duration = _probe_duration(video_path) or 0.0
+        if "proxy" in missing:
+            error = _encode(_proxy_args(video_path), paths["proxy"])
+            if error:
+                print(f"Warning: Proxy clip failed for {video_path}: {error}")
+        if "poster" in missing:
+            error = _encode(_poster_args(video_path, duration), paths["poster"])
+            if error:
+                print(f"Warning: Poster failed for {video_path}: {error}")
+        if "thumbnail" in missing:
+            # Decoding the small proxy is much cheaper than the full video
+            source = paths["proxy"] if os.path.exists(paths["proxy"]) else video_path
+            error = _encode(_thumbnail_args(source, duration), paths["thumbnail"])
+            if error:
+                print(f"Warning: Thumbnail failed for {video_path}: {error}")
+
+    return {name: path for name, path in paths.items() if os.path.exists(path)}
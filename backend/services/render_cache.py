@@ -0,0 +1,163 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import uuid
+from importlib import metadata
+from backend.utils import link_or_copy, evict_lru
+from config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+
+# Hit/miss counters for this process
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_lock = threading.Lock()
+
+
+def _manim_version():
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def normalize_code(code):
+    """Normalize code so formatting-only differences share a cache entry"""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip() + "\n"
+
+
+def render_cache_key(code, quality):
+    """
+    Build the cache key for a render.
+
+    Args:
+        code (str): The Manim Python code.
+        quality (str): Video quality setting.
+    Returns:
+        str: Hex digest of the normalized code, quality and manim version.
+    """
+    digest = hashlib.sha256()
+    for part in (normalize_code(code), quality, _manim_version()):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(RENDER_CACHE_DIR, key[:2], f"{key}.mp4")
+
+
+def _profile_path(key):
+    return os.path.join(RENDER_CACHE_DIR, key[:2], f"{key}.profile.json")
+
+
+def get_cached_render(key, dest_path):
+    """
+    Place the cached video for key at dest_path.
+
+    Returns:
+        str or None: dest_path on a hit, None on a miss.
+    """
+    entry = _entry_path(key)
+    try:
+        # Touch the entry so eviction treats it as recently used
+        os.utime(entry)
+        link_or_copy(entry, dest_path)
+    except OSError:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    with _lock:
+        _stats["hits"] += 1
+    return dest_path
+
+
+def is_render_cached(code, quality):
+    """Return True if a render of this code and quality is in the cache, without counting a lookup"""
+    return os.path.exists(_entry_path(render_cache_key(code, quality)))
+
+
+def get_cached_profile(key):
+    """
+    Return the profile stored with a cached render.
+
+    Returns:
+        dict or None: The report of the render that made the cached video, or None if it was not profiled.
+    """
+    try:
+        with open(_profile_path(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_render(key, video_path, profile=None):
+    """
+    Add a rendered video to the cache and evict old entries if needed.
+
+    Args:
+        key (str): Cache key from render_cache_key.
+        video_path (str): The rendered video.
+        profile (dict): The render's profile, returned with the video on later hits.
+    """
+    entry = _entry_path(key)
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    _store_profile(key, profile)
+
+    # Write under a temporary name and rename so readers never see a partial file
+    tmp_path = f"{entry}.{uuid.uuid4().hex}.tmp"
+    try:
+        link_or_copy(video_path, tmp_path)
+        os.replace(tmp_path, entry)
+    except OSError as e:
+        print(f"Warning: Failed to cache render {key}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    with _lock:
+        _stats["stores"] += 1
+    evict_renders()
+
+
+def _store_profile(key, profile):
+    # Drop a profile left behind by an evicted entry, so it never describes another render
+    path = _profile_path(key)
+    if profile is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Failed to cache the profile of render {key}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict_renders(max_bytes=None):
+    """Delete least recently used entries until the cache fits in max_bytes"""
+    evicted = evict_lru(RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes, ".mp4")
+    if evicted:
+        # Profiles go with their videos
+        for path in glob.glob(os.path.join(glob.escape(RENDER_CACHE_DIR), "*", "*.profile.json")):
+            if not os.path.exists(path.removesuffix(".profile.json") + ".mp4"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    with _lock:
+        _stats["evictions"] += evicted
+
+
+def get_render_cache_stats():
+    """Return the hit/miss counters for this process"""
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
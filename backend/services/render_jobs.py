@@ -0,0 +1,460 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from backend.services import scene_store
+from backend.services.llm_response import get_llm_response, LLMResponseError
+from backend.services.clean_code import code_cleaner
+from backend.services.manim_processor import execute_manim_code, validate_manim_code
+from backend.services.previews import make_previews
+from backend.services.render_cache import is_render_cached
+from backend.services.render_runner import kill_process_group
+from backend.services.preflight import preflight, plan_render
+from backend.utils import trim_traceback
+from config.logger import bind, span, log_event, observe, export_metrics
+import logging
+from config import JOBS_DIR, RENDER_MAX_WORKERS, PARALLEL_SECTIONS, DRY_RUN_VALIDATION
+from config import REPAIR_MAX_ATTEMPTS, REPAIR_MAX_SECONDS, RENDER_PROFILE, PREVIEWS
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_GENERATING = "generating_code"
+JOB_VALIDATING = "validating"
+JOB_REPAIRING = "repairing_code"
+JOB_DRAFT = "rendering_draft"
+JOB_RENDERING = "rendering"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+ACTIVE_STATES = (JOB_QUEUED, JOB_GENERATING, JOB_REPAIRING, JOB_VALIDATING, JOB_DRAFT, JOB_RENDERING)
+
+# One bounded pool per server process, shared by every session
+_executor = None
+_futures = {}
+_lock = threading.Lock()
+_state_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Spawn instead of fork: the Streamlit server is multi-threaded
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _cancel_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.cancel")
+
+
+def _update_job(job_id, **fields):
+    """Merge fields into the job's record in the store"""
+    return scene_store.update_job(job_id, **fields)
+
+
+def _cancel_requested(job_id):
+    return os.path.exists(_cancel_path(job_id))
+
+
+def _metrics_path():
+    return os.path.join(JOBS_DIR, "metrics.jsonl")
+
+
+def _record_metrics(job):
+    """Append a finished job's outcome to the metrics log shared by all workers"""
+    stats = job.get("render_stats") or {}
+    line = json.dumps({
+        "job_id": job["id"],
+        "status": job["status"],
+        "time_to_video": stats.get("time_to_video"),
+        "repair_attempts": stats.get("repair_attempts", 0),
+        "finished_at": time.time(),
+    })
+    # One short O_APPEND write per job, so concurrent workers don't interleave
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(_metrics_path(), "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def get_job_metrics():
+    """
+    Summarize finished jobs from the metrics log.
+
+    Returns:
+        dict: jobs, succeeded, repaired (succeeded after at least one repair),
+        success_rate and median/p90 time_to_first_video in seconds.
+    """
+    try:
+        with open(_metrics_path(), "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        records = []
+
+    done = [record for record in records if record["status"] == JOB_DONE]
+    times = sorted(record["time_to_video"] for record in done if record["time_to_video"] is not None)
+    def percentile(p):
+        return times[min(int(p * len(times)), len(times) - 1)] if times else None
+
+    return {
+        "jobs": len(records),
+        "succeeded": len(done),
+        "repaired": sum(1 for record in done if record["repair_attempts"]),
+        "success_rate": len(done) / len(records) if records else 0.0,
+        "time_to_first_video_p50": percentile(0.5),
+        "time_to_first_video_p90": percentile(0.9),
+    }
+
+
+def _render(job_id, render, **kwargs):
+    """Run a render stage with live progress, killable from the UI through the stored process groups"""
+    pgids = []
+    last_publish = [0.0]
+
+    def on_start(pgid):
+        with _state_lock:
+            pgids.append(pgid)
+        _update_job(job_id, render_pgids=list(pgids))
+
+    def on_progress(fraction, animation):
+        now = time.time()
+        if now - last_publish[0] >= 0.5:
+            last_publish[0] = now
+            _update_job(job_id, progress=fraction, progress_animation=animation)
+
+    try:
+        return render(
+            on_progress=on_progress,
+            should_cancel=lambda: _cancel_requested(job_id),
+            on_start=on_start,
+            **kwargs
+        )
+    finally:
+        _update_job(job_id, render_pgids=[], progress=None, progress_animation=None)
+
+
+def _generate(job_id, scene, repair_context=None, use_cache=True):
+    """
+    Ask the LLM for scene code (or a fix for failing code) and clean it up.
+
+    Args:
+        use_cache (bool): Reuse a cached LLM response; False asks the LLM again.
+    Returns:
+        tuple: (code (str) or None, error_message (str) or None)
+    """
+    # Publish streamed tokens for the UI, at most a couple of times per second
+    last_publish = [0.0]
+    def on_token(buffer):
+        now = time.time()
+        if now - last_publish[0] >= 0.5:
+            last_publish[0] = now
+            _update_job(job_id, partial_code=buffer)
+
+    try:
+        code = get_llm_response(
+            prompt=scene["prompt"],
+            subject=scene["subject"],
+            animation_type=scene["type"],
+            duration=scene["duration"],
+            background_color=scene["background_color"],
+            text_color=scene["text_color"],
+            use_cache=use_cache,
+            on_token=on_token,
+            repair_context=repair_context,
+            raise_errors=True
+        )
+    except LLMResponseError as e:
+        # Warnings from the worker never reach the UI; fail the job instead of rendering fallback code
+        _update_job(job_id, partial_code=None)
+        return None, str(e)
+    log_event("code_generated", level=logging.DEBUG, repair=bool(repair_context), code=code)
+    if not code:
+        return None, "The LLM returned an empty response"
+
+    # Removing unnecessary things from code
+    with span("clean"):
+        return code_cleaner(code), None
+
+
+def _attempt(job_id, scene, code, render_stats):
+    """
+    Check and render one version of the scene's code.
+
+    Returns:
+        tuple: (video_path (str) or None, error_message (str) or None)
+    """
+    # Reject, downgrade or route the scene from its code alone
+    with span("validate", quality=scene["quality"]) as record:
+        report, error = preflight(code)
+        plan = None
+        if report:
+            plan, error = plan_render(report, scene["quality"])
+            record.update(video_seconds=report["video_seconds"], animations=report["animations"])
+        if error:
+            record.update(status="error", error=error)
+    if error:
+        _update_job(job_id, code=code, partial_code=None, preflight=report)
+        return None, f"Pre-flight check failed: {error}"
+    _update_job(job_id, code=code, partial_code=None, preflight=dict(report, **plan))
+    parallel = plan["parallel_sections"] and PARALLEL_SECTIONS
+
+    if _cancel_requested(job_id):
+        return None, None
+
+    # Run construct() without encoding so runtime errors surface in seconds
+    if DRY_RUN_VALIDATION and not is_render_cached(code, plan["quality"]):
+        _update_job(job_id, status=JOB_VALIDATING)
+        started = time.time()
+        passed, error = _render(job_id, validate_manim_code, code=code, scene_id=scene["id"])
+        render_stats["dry_run_seconds"] = round(time.time() - started, 2)
+        if not passed or _cancel_requested(job_id):
+            return None, error or "Dry run failed"
+
+    # Show a quick draft first; 480p is about as fast as the draft itself
+    if scene.get("progressive") and plan["quality"] != "480p":
+        _update_job(job_id, status=JOB_DRAFT)
+        started = time.time()
+        draft_path, error = _render(job_id, execute_manim_code, code=code, scene_id=scene["id"],
+                                    quality="draft", parallel_sections=parallel)
+        render_stats["draft_seconds"] = round(time.time() - started, 2)
+        if not draft_path:
+            return None, error or "Unknown error occurred"
+        _update_job(job_id, draft_video_path=draft_path)
+        scene_store.record_artifact(draft_path, "draft", scene_id=scene["id"])
+
+        # The draft may be cancelled or rejected before the full render starts
+        if _cancel_requested(job_id):
+            return None, None
+
+    _update_job(job_id, status=JOB_RENDERING)
+    started = time.time()
+    video_path, error = _render(job_id, execute_manim_code, code=code, scene_id=scene["id"],
+                                quality=plan["quality"], stats=render_stats, parallel_sections=parallel,
+                                profile=scene.get("profile", RENDER_PROFILE))
+    render_stats["render_seconds"] = round(time.time() - started, 2)
+    if video_path and os.path.exists(video_path):
+        scene_store.record_artifact(video_path, "video", scene_id=scene["id"])
+        return video_path, None
+    return None, error or "Unknown error occurred"
+
+
+def _finish(job_id, render_stats, **fields):
+    """Record the job's outcome and its end-to-end time"""
+    job = poll_job(job_id) or {}
+    render_stats["time_to_video"] = round(time.time() - job.get("submitted_at", time.time()), 2)
+    job = _update_job(job_id, render_stats=render_stats, **fields)
+    _record_metrics(job)
+    if job["status"] == JOB_DONE:
+        observe("fyp_time_to_first_video_seconds", render_stats["time_to_video"])
+    log_event("job_finished", status=job["status"], **render_stats)
+    export_metrics()
+
+
+def _make_previews(job_id, video_path, render_stats):
+    """
+    Post-render stage: a poster, animated thumbnail and proxy clip for the scene list.
+
+    Runs once the job is done, so the video is shown without waiting for its
+    previews; previews_pending tells the UI to pick them up when it clears.
+    """
+    try:
+        render_stats["previews"] = make_previews(video_path)
+    except Exception as e:
+        print(f"Warning: Previews failed for {video_path}: {str(e)}")
+    finally:
+        _update_job(job_id, render_stats=render_stats, previews_pending=False)
+
+
+def _run_job(job_id, scene):
+    """Generate and render one scene, feeding render errors back to the LLM. Runs inside a pool worker process."""
+    with bind(job_id=job_id, scene_id=scene["id"]):
+        _run_job_stages(job_id, scene)
+
+
+def _run_job_stages(job_id, scene):
+    if _cancel_requested(job_id):
+        _update_job(job_id, status=JOB_CANCELLED)
+        return
+
+    started = time.time()
+    # A resumed job keeps the code it already had
+    job = poll_job(job_id) or {}
+    code = job.get("code")
+    use_cache = not job.get("regenerate")
+    _update_job(job_id, started_at=started)
+    error = None
+    if not code:
+        _update_job(job_id, status=JOB_GENERATING)
+        code, error = _generate(job_id, scene, use_cache=use_cache)
+    render_stats = {"repair_attempts": 0}
+
+    while True:
+        if not code:
+            _finish(job_id, render_stats, status=JOB_FAILED, error=f"Failed to generate code: {error}")
+            return
+        if _cancel_requested(job_id):
+            _finish(job_id, render_stats, status=JOB_CANCELLED, code=code)
+            return
+
+        video_path, error = _attempt(job_id, scene, code, render_stats)
+        if _cancel_requested(job_id):
+            _finish(job_id, render_stats, status=JOB_CANCELLED)
+            return
+        if video_path:
+            _finish(job_id, render_stats, status=JOB_DONE, video_path=video_path, error=None,
+                    previews_pending=PREVIEWS)
+            if PREVIEWS:
+                _make_previews(job_id, video_path, render_stats)
+            return
+
+        # Send the trimmed traceback back to the LLM while the retry budget lasts
+        out_of_budget = (render_stats["repair_attempts"] >= REPAIR_MAX_ATTEMPTS
+                         or time.time() - started >= REPAIR_MAX_SECONDS)
+        if out_of_budget:
+            _finish(job_id, render_stats, status=JOB_FAILED, error=error)
+            return
+
+        render_stats["repair_attempts"] += 1
+        trimmed = trim_traceback(error)
+        _update_job(job_id, status=JOB_REPAIRING, repair_attempt=render_stats["repair_attempts"],
+                    last_error=trimmed, render_stats=render_stats)
+        code, error = _generate(job_id, scene, repair_context={"code": code, "error": trimmed}, use_cache=use_cache)
+
+
+def _on_job_finished(job_id, future):
+    global _executor
+    with _lock:
+        _futures.pop(job_id, None)
+
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is None:
+        return
+
+    # The worker died or raised; record it so the UI stops waiting
+    _update_job(job_id, status=JOB_FAILED, error=f"Job crashed: {str(exc)}")
+    if isinstance(exc, BrokenProcessPool):
+        with _lock:
+            _executor = None
+
+
+def _start_job(job_id, scene):
+    future = _get_executor().submit(_run_job, job_id, dict(scene))
+    with _lock:
+        _futures[job_id] = future
+    future.add_done_callback(lambda f: _on_job_finished(job_id, f))
+
+
+def submit_job(scene, regenerate=False):
+    """
+    Queue a scene for code generation and rendering.
+
+    Args:
+        scene (dict): Scene record with prompt, subject, type, duration,
+            quality, background_color and text_color.
+        regenerate (bool): Ask the LLM again instead of reusing its cached response.
+    Returns:
+        str: The job ID to poll.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    # The scene and the owning server are stored so the job can be resumed after a restart
+    _update_job(job_id, status=JOB_QUEUED, scene_id=scene["id"], submitted_at=time.time(),
+                scene=dict(scene), owner_pid=os.getpid(), regenerate=regenerate)
+    _start_job(job_id, scene)
+    return job_id
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def resume_interrupted_jobs():
+    """
+    Requeue jobs left active by a server that is no longer running.
+
+    Their leftover manim processes are killed first. A job that already had
+    code skips generation and goes straight back to rendering, reusing the
+    partial movies in the scene's workspace.
+
+    Returns:
+        list: IDs of the resumed jobs.
+    """
+    resumed = []
+    for job in scene_store.find_jobs(ACTIVE_STATES):
+        owner = job.get("owner_pid")
+        with _lock:
+            running_here = job["id"] in _futures
+        if running_here or (owner and owner != os.getpid() and _pid_alive(owner)) or not job.get("scene"):
+            continue
+        for pgid in job.get("render_pgids") or []:
+            kill_process_group(pgid)
+        _update_job(job["id"], status=JOB_QUEUED, owner_pid=os.getpid(), render_pgids=[],
+                    resumed=job.get("resumed", 0) + 1)
+        _start_job(job["id"], job["scene"])
+        log_event("job_resumed", job_id=job["id"], scene_id=job.get("scene_id"), previous_status=job["status"])
+        resumed.append(job["id"])
+
+    # Previews cut short by the restart are skipped; the scene list falls back to the video
+    for job in scene_store.find_jobs((JOB_DONE,)):
+        owner = job.get("owner_pid")
+        if job.get("previews_pending") and not (owner and (owner == os.getpid() or _pid_alive(owner))):
+            _update_job(job["id"], previews_pending=False)
+    return resumed
+
+
+def poll_job(job_id):
+    """
+    Read the current state of a job.
+
+    Returns:
+        dict or None: Job state (status, code, video_path, error, ...) or None if unknown.
+    """
+    return scene_store.get_job(job_id)
+
+
+def cancel_job(job_id):
+    """
+    Cancel a job. Queued jobs are dropped immediately, a running render is
+    killed with its whole process group, and code generation stops at the
+    next stage boundary.
+
+    Returns:
+        bool: True if the job was cancelled before it started.
+    """
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    open(_cancel_path(job_id), "w").close()
+
+    with _lock:
+        future = _futures.get(job_id)
+    if future and future.cancel():
+        _update_job(job_id, status=JOB_CANCELLED)
+        return True
+
+    # Free the render's CPU and memory now rather than at the worker's next poll
+    job = poll_job(job_id) or {}
+    for pgid in job.get("render_pgids") or []:
+        kill_process_group(pgid)
+    return False
+
+
+def forget_job(job_id):
+    """Remove a finished job's state"""
+    scene_store.delete_job(job_id)
+    try:
+        os.remove(_cancel_path(job_id))
+    except OSError:
+        pass
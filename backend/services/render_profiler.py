@@ -0,0 +1,235 @@
+import json
+import logging
+import sys
+import time
+from backend.services.workspace import CACHED_MARKER
+
+# Animations named in a label before it is cut short
+MAX_LABEL_ANIMATIONS = 3
+
+# Timed kinds of work besides drawing frames
+WORK_KEYS = ("tex_seconds", "text_seconds", "encode_seconds")
+
+
+def _describe(animation):
+    name = type(animation).__name__
+    mobject = getattr(animation, "mobject", None)
+    if name == "_AnimationBuilder":
+        return f"{type(mobject).__name__}.animate" if mobject is not None else "animate"
+    if name == "Wait":
+        return f"wait({getattr(animation, 'run_time', 1):g}s)"
+    return f"{name}({type(mobject).__name__})" if mobject is not None else name
+
+
+def _label(args):
+    parts = [_describe(arg) for arg in args[:MAX_LABEL_ANIMATIONS]]
+    if len(args) > MAX_LABEL_ANIMATIONS:
+        parts.append(f"+{len(args) - MAX_LABEL_ANIMATIONS} more")
+    return ", ".join(parts) or "play()"
+
+
+def build_report(animations, totals, total_seconds, complete):
+    """
+    Break a render's time down by animation and by kind of work.
+
+    Returns:
+        dict: animations (slowest first), tex/text/encode/frame/other seconds,
+        total_seconds and whether the render finished.
+    """
+    in_animations = sum(entry["seconds"] for entry in animations)
+    # TeX, text and encoding time, split into inside and outside play() calls
+    inside = {key: sum(entry.get(key, 0) for entry in animations) for key in WORK_KEYS}
+    outside = {key: totals.get(key, 0) - inside[key] for key in WORK_KEYS}
+    return {
+        "animations": sorted(animations, key=lambda entry: entry["seconds"], reverse=True),
+        **{key: round(totals.get(key, 0), 3) for key in WORK_KEYS},
+        # Drawing frames: play() time not spent on the work above
+        "frame_seconds": round(max(in_animations - sum(inside.values()), 0), 3),
+        # construct() code between animations and scene setup
+        "other_seconds": round(max(total_seconds - in_animations - sum(outside.values()), 0), 3),
+        "total_seconds": round(total_seconds, 3),
+        "complete": complete,
+    }
+
+
+def load_profile(path):
+    """
+    Read a report written by the profiler launcher.
+
+    Returns:
+        dict or None: The report (see build_report), or None if nothing was recorded.
+    """
+    animations, summary = [], None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # last line cut off by a kill
+                if entry.pop("type") == "animation":
+                    animations.append(entry)
+                else:
+                    summary = entry
+    except OSError:
+        return None
+
+    if summary:
+        return build_report(animations, summary["totals"], summary["total_seconds"], True)
+    if not animations:
+        return None
+    # Killed before the end: only the animations that finished are known
+    totals = {key: sum(entry.get(key, 0) for entry in animations) for key in WORK_KEYS}
+    return build_report(animations, totals, sum(entry["seconds"] for entry in animations), False)
+
+
+def summarize_profile(report, limit=3):
+    """One line per slowest animation, for error messages and the repair prompt"""
+    lines = [
+        f"Animation {entry['index']} ({entry['label']}): {entry['seconds']:.1f}s, {entry['frames']} frames"
+        + (" (cached)" if entry["cached"] else "")
+        for entry in report["animations"][:limit]
+    ]
+    lines.append(
+        f"TeX {report['tex_seconds']:.1f}s, drawing frames {report['frame_seconds']:.1f}s, "
+        f"encoding {report['encode_seconds']:.1f}s of {report['total_seconds']:.1f}s"
+    )
+    return "\n".join(lines)
+
+
+class _CacheHitFlag(logging.Handler):
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    def emit(self, record):
+        if self.profiler.current is not None and CACHED_MARKER in record.getMessage():
+            self.profiler.current["cached"] = True
+
+
+class RenderProfiler:
+    """
+    Patch manim to time every play()/wait() call, TeX compilation, text
+    rendering and video encoding.
+
+    Runs inside the manim process, from main() or in a warm render worker.
+    Each animation is written out as soon as it finishes, so a render killed
+    by a timeout still shows where its time went.
+
+    Args:
+        path (str): JSON-lines file to append each animation to as it finishes; None keeps it in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.animations = []
+        self.totals = dict.fromkeys(WORK_KEYS, 0.0)
+        self.current = None
+        self._patches = []
+        self._handler = _CacheHitFlag(self)
+        self._started = None
+
+    def _write(self, entry):
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _patch(self, owner, name, make_wrapper):
+        original = getattr(owner, name, None)
+        if original is None:
+            return  # not in this manim version
+        setattr(owner, name, make_wrapper(original))
+        self._patches.append((owner, name, original))
+
+    def _timed(self, total_key, count_frames=False):
+        profiler = self
+
+        def make_wrapper(original):
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    profiler.totals[total_key] += elapsed
+                    if profiler.current is not None:
+                        current = profiler.current
+                        current[total_key] += elapsed
+                        if count_frames:
+                            # write_frame(frame, num_frames=1)
+                            current["frames"] += args[2] if len(args) > 2 else kwargs.get("num_frames", 1)
+            return wrapper
+        return make_wrapper
+
+    def _play_wrapper(self, original):
+        profiler = self
+
+        def play(scene, *args, **kwargs):
+            if profiler.current is not None:
+                return original(scene, *args, **kwargs)  # wait() calls play()
+            entry = {
+                "index": len(profiler.animations),
+                "label": _label(args),
+                "frames": 0,
+                "cached": False,
+                **dict.fromkeys(WORK_KEYS, 0.0),
+            }
+            profiler.current = entry
+            start = time.perf_counter()
+            try:
+                return original(scene, *args, **kwargs)
+            finally:
+                profiler.current = None
+                entry["seconds"] = round(time.perf_counter() - start, 4)
+                for key in WORK_KEYS:
+                    entry[key] = round(entry[key], 4)
+                profiler.animations.append(entry)
+                profiler._write({"type": "animation", **entry})
+        return play
+
+    def install(self):
+        """Patch manim; call before the scene is constructed"""
+        import manimpango
+        from manim.scene.scene import Scene
+        from manim.scene.scene_file_writer import SceneFileWriter
+        from manim.utils import tex_file_writing
+
+        self._patch(Scene, "play", self._play_wrapper)
+        self._patch(tex_file_writing, "compile_tex", self._timed("tex_seconds"))
+        self._patch(tex_file_writing, "convert_to_svg", self._timed("tex_seconds"))
+        self._patch(manimpango, "text2svg", self._timed("text_seconds"))
+        self._patch(SceneFileWriter, "write_frame", self._timed("encode_seconds", count_frames=True))
+        self._patch(SceneFileWriter, "end_animation", self._timed("encode_seconds"))
+        self._patch(SceneFileWriter, "combine_to_movie", self._timed("encode_seconds"))
+        logging.getLogger("manim").addHandler(self._handler)
+        self._started = time.perf_counter()
+        return self
+
+    def uninstall(self):
+        """Restore manim and return the report"""
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches = []
+        logging.getLogger("manim").removeHandler(self._handler)
+
+        total_seconds = time.perf_counter() - self._started
+        self._write({"type": "summary", "totals": self.totals, "total_seconds": total_seconds})
+        return build_report(self.animations, self.totals, total_seconds, True)
+
+
+def main():
+    # python -m backend.services.render_profiler <report.jsonl> -- <manim arguments>
+    report_path = sys.argv[1]
+    manim_args = sys.argv[3:] if sys.argv[2:3] == ["--"] else sys.argv[2:]
+
+    from manim.__main__ import main as manim_main
+    profiler = RenderProfiler(report_path).install()
+    sys.argv = ["manim", *manim_args]
+    try:
+        manim_main()
+    finally:
+        profiler.uninstall()
+
+
+if __name__ == "__main__":
+    main()
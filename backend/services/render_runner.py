@@ -0,0 +1,191 @@
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from config.logger import observe
+from config import RENDER_CPU_SECONDS, RENDER_MAX_MEMORY_MB, RENDER_MAX_FILE_MB
+
+try:
+    import resource
+    resource.prlimit
+except (ImportError, AttributeError):  # Windows and macOS: renders run without rlimits
+    resource = None
+
+# tqdm bar manim prints per animation, e.g. "Animation 3: Write(Text):  45%|####  | 27/60"
+PROGRESS_LINE = re.compile(r"Animation (\d+)\b.*?(\d+)%\|")
+
+
+class RenderResult:
+    """Outcome of one manim process"""
+
+    def __init__(self, returncode, output, cancelled=False, timed_out=False, spawn_seconds=None):
+        self.returncode = returncode
+        self.output = output
+        self.cancelled = cancelled
+        self.timed_out = timed_out
+        self.spawn_seconds = spawn_seconds
+
+
+def render_limits():
+    """
+    The rlimits applied to each render, from RENDER_CPU_SECONDS, RENDER_MAX_MEMORY_MB and RENDER_MAX_FILE_MB.
+
+    Returns:
+        list: (resource kind, limit) pairs; empty where rlimits are not supported.
+    """
+    if resource is None:
+        return []
+    limits = (
+        (resource.RLIMIT_CPU, RENDER_CPU_SECONDS),
+        (resource.RLIMIT_AS, RENDER_MAX_MEMORY_MB * 1024 ** 2),
+        (resource.RLIMIT_FSIZE, RENDER_MAX_FILE_MB * 1024 ** 2),
+    )
+    return [(kind, value) for kind, value in limits if value > 0]
+
+
+def limit_resources(pid, cpu=True):
+    """
+    Apply render_limits() to a process that has just been spawned.
+
+    They are set from outside: preexec_fn is unsafe while other threads run.
+    Manim spawns ffmpeg and latex only after its slow import, so they still
+    inherit the limits.
+
+    Args:
+        pid (int): The process to limit.
+        cpu (bool): Also limit its CPU time; reused workers limit that per render themselves.
+    """
+    for kind, value in render_limits():
+        if not cpu and kind == resource.RLIMIT_CPU:
+            continue
+        try:
+            resource.prlimit(pid, kind, (value, value))
+        except (OSError, ValueError) as e:  # e.g. the process already exited
+            print(f"Warning: Could not limit render {pid}: {str(e)}")
+
+
+def parse_progress(line):
+    """
+    Read manim's progress bar line.
+
+    Returns:
+        tuple or None: (animation number (int), fraction done (float)), or None for other lines.
+    """
+    match = PROGRESS_LINE.search(line)
+    if not match:
+        return None
+    return int(match.group(1)), min(int(match.group(2)), 100) / 100
+
+
+def kill_process_group(pgid):
+    """Kill a render and everything it started (ffmpeg, latex, ...)"""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+        return True
+    except (ProcessLookupError, PermissionError, AttributeError):
+        return False
+
+
+def run_manim(cmd, cwd, timeout, env=None, on_progress=None, should_cancel=None, on_start=None):
+    """
+    Run a manim command in its own process group, with rlimits and live progress.
+
+    Output is read while manim runs; progress bar updates go to on_progress
+    and are left out of the returned output.
+
+    Args:
+        cmd (list): The manim command line.
+        cwd (str): Working directory.
+        timeout (float): Wall-clock seconds before the process group is killed.
+        env (dict): Environment for the process.
+        on_progress (callable): Called with (animation number, fraction of that animation).
+        should_cancel (callable): Polled while running; True kills the process group.
+        on_start (callable): Called with the process group ID once manim has started.
+    Returns:
+        RenderResult: returncode, combined stdout/stderr, cancelled and timed_out.
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        process_group=0
+    )
+    limit_resources(process.pid)
+    pgid = process.pid  # leader of its new process group
+    if on_start:
+        on_start(pgid)
+
+    lines = []
+    spawn_seconds = None
+    def read_output():
+        nonlocal spawn_seconds
+        # tqdm redraws with \r, so split on both line endings
+        pending = b""
+        for chunk in iter(lambda: process.stdout.read1(4096), b""):
+            if spawn_seconds is None:
+                # Interpreter start plus manim import, until manim first prints
+                spawn_seconds = time.perf_counter() - started
+                observe("fyp_manim_spawn_seconds", spawn_seconds)
+            pending += chunk
+            *complete, pending = re.split(rb"[\r\n]", pending)
+            for raw in complete:
+                line = raw.decode("utf-8", errors="replace")
+                progress = parse_progress(line)
+                if progress is None:
+                    if line.strip():
+                        lines.append(line)
+                elif on_progress:
+                    on_progress(*progress)
+        if pending.strip():
+            lines.append(pending.decode("utf-8", errors="replace"))
+
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+
+    cancelled = timed_out = False
+    deadline = time.monotonic() + timeout
+    while process.poll() is None:
+        if should_cancel and should_cancel():
+            cancelled = True
+        elif time.monotonic() > deadline:
+            timed_out = True
+        if cancelled or timed_out:
+            kill_process_group(pgid)
+            break
+        try:
+            process.wait(0.2)
+        except subprocess.TimeoutExpired:
+            pass
+
+    process.wait()
+    reader.join(5)
+    process.stdout.close()
+    return RenderResult(process.returncode, "\n".join(lines), cancelled, timed_out, spawn_seconds)
+
+
+class ProgressTracker:
+    """
+    Combine per-animation progress from one or more manim processes into one fraction.
+
+    Args:
+        total (int or None): Animations in the scene, if known ahead of time.
+        on_progress (callable): Called with (overall fraction or None, animation number).
+    """
+
+    def __init__(self, total, on_progress):
+        self.total = total
+        self.on_progress = on_progress
+        self.done = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, animation, fraction):
+        with self._lock:
+            self.done[animation] = fraction
+            overall = min(sum(self.done.values()) / self.total, 1.0) if self.total else None
+        self.on_progress(overall, animation)
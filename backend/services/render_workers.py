@@ -0,0 +1,337 @@
+import logging
+import multiprocessing
+import os
+import resource
+import threading
+import time
+import traceback
+from backend.services.render_runner import kill_process_group, limit_resources
+from backend.services.workspace import CACHED_MARKER, RENDERED_MARKER
+from config import WARM_WORKERS, WARM_WORKER_MAX_JOBS, WARM_WORKER_MAX_RSS_MB, DRAFT_FRAME_RATE, RENDER_CPU_SECONDS
+
+# Manim quality presets matching the CLI flags used by execute_manim_code
+QUALITY_PRESETS = {
+    "480p": "low_quality",
+    "720p": "medium_quality",
+    "1080p": "high_quality",
+    "4k": "fourk_quality",
+    "draft": "low_quality",
+}
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is reported in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _limit_cpu_time():
+    """Give the next render RENDER_CPU_SECONDS of CPU time on top of what this worker has used"""
+    if RENDER_CPU_SECONDS <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + RENDER_CPU_SECONDS
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _find_scene_class(namespace, module_name, scene_base, scene_name=None):
+    scenes = [
+        obj for obj in namespace.values()
+        if isinstance(obj, type) and issubclass(obj, scene_base)
+        and obj.__module__ == module_name
+    ]
+    if scene_name:
+        scenes = [scene for scene in scenes if scene.__name__ == scene_name]
+    return scenes[-1] if scenes else None
+
+
+class _ProgressReporter:
+    """
+    Stand-in for the tqdm bar of one animation that reports each whole percent.
+
+    Args:
+        bar: The progress bar manim made (disabled, since progress_bar is "none").
+        animation (int): Number of the animation, as in manim's progress lines.
+        report (callable): Called with (animation number, fraction of that animation).
+    """
+
+    def __init__(self, bar, animation, report):
+        self.bar = bar
+        self.animation = animation
+        self.report = report
+
+    def __iter__(self):
+        total = getattr(self.bar, "total", None)
+        sent = None
+        for step, t in enumerate(self.bar, 1):
+            percent = int(step * 100 / total) if total else None
+            if percent is not None and percent != sent:
+                sent = percent
+                self.report(self.animation, min(percent, 100) / 100)
+            yield t
+
+    def __getattr__(self, name):
+        return getattr(self.bar, name)
+
+
+class _PartialMovieCounter(logging.Handler):
+    """Count manim's per-animation cache log lines during one render"""
+
+    def __init__(self):
+        super().__init__()
+        self.counts = {"partial_movies_reused": 0, "partial_movies_rendered": 0}
+
+    def emit(self, record):
+        message = record.getMessage()
+        if CACHED_MARKER in message:
+            self.counts["partial_movies_reused"] += 1
+        elif RENDERED_MARKER in message:
+            self.counts["partial_movies_rendered"] += 1
+
+
+def _render_scene(code, scene_id, quality, media_dir, config_overrides, counter, profile_path=None, scene_name=None,
+                  on_progress=None):
+    # Imported here: the worker pays for manim once, the parent never does
+    from manim import Scene, tempconfig
+    from backend.services.render_profiler import RenderProfiler
+
+    module_name = f"scene_{scene_id}"
+    namespace = {"__name__": module_name}
+    exec(compile(code, f"{module_name}.py", "exec"), namespace)
+
+    scene_class = _find_scene_class(namespace, module_name, Scene, scene_name)
+    if scene_class is None:
+        raise ValueError("No Scene subclass found in code.")
+
+    overrides = {
+        "quality": QUALITY_PRESETS.get(quality, "medium_quality"),
+        "media_dir": media_dir,
+        "output_file": module_name,
+        "input_file": f"{module_name}.py",
+        "progress_bar": "none",
+        **({"frame_rate": DRAFT_FRAME_RATE} if quality == "draft" else {}),
+        **(config_overrides or {}),
+    }
+    manim_logger = logging.getLogger("manim")
+    manim_logger.addHandler(counter)
+    # The worker is reused, so the profiler's patches must come off again
+    profiler = RenderProfiler(profile_path).install() if profile_path else None
+    get_time_progression = Scene.get_time_progression
+    if on_progress:
+        def reporting_time_progression(scene, *args, **kwargs):
+            bar = get_time_progression(scene, *args, **kwargs)
+            return _ProgressReporter(bar, scene.renderer.num_plays, on_progress)
+        Scene.get_time_progression = reporting_time_progression
+    try:
+        with tempconfig(overrides):
+            scene = scene_class()
+            scene.render()
+            # Dry runs write no movie
+            movie_file_path = getattr(scene.renderer.file_writer, "movie_file_path", None)
+            return str(movie_file_path) if movie_file_path else None
+    finally:
+        Scene.get_time_progression = get_time_progression
+        if profiler:
+            profiler.uninstall()
+        manim_logger.removeHandler(counter)
+
+
+def _worker_main(conn, max_jobs, max_rss_mb):
+    """Worker loop: import manim once, then serve render requests until recycled"""
+    # Lead a process group, so a kill also reaches the latex, dvisvgm and ffmpeg this worker starts
+    os.setpgid(0, 0)
+    import manim  # noqa: F401  (warm the import before the first request)
+
+    jobs = 0
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+
+        jobs += 1
+        counter = _PartialMovieCounter()
+        _limit_cpu_time()
+        try:
+            video_path = _render_scene(
+                **request, counter=counter,
+                on_progress=lambda animation, fraction: conn.send({"progress": (animation, fraction)})
+            )
+            reply = {"video_path": video_path, "error": None}
+        except Exception:
+            reply = {"video_path": None, "error": traceback.format_exc()}
+        reply["stats"] = counter.counts
+
+        # Ask the pool to replace this worker once it has done enough work
+        reply["recycle"] = jobs >= max_jobs or _rss_mb() > max_rss_mb
+        conn.send(reply)
+        if reply["recycle"]:
+            return
+
+
+class _Worker:
+    def __init__(self, ctx, max_jobs, max_rss_mb):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, max_jobs, max_rss_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        # The limits every manim CLI render runs with; CPU time is limited per render by the worker
+        limit_resources(self.process.pid, cpu=False)
+
+    @property
+    def pgid(self):
+        """The worker's process group, which it leads"""
+        return self.process.pid
+
+    def stop(self, kill=False):
+        try:
+            if kill:
+                kill_process_group(self.pgid)
+                self.process.kill()  # in case it had not made its group yet
+            else:
+                self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class WarmRenderPool:
+    """
+    Pool of long-lived processes that import manim once and render scenes in-process.
+
+    Workers are recycled after max_jobs renders or once their RSS exceeds
+    max_rss_mb, so leaks from LLM-written scenes cannot accumulate.
+    """
+
+    def __init__(self, size=WARM_WORKERS, max_jobs=WARM_WORKER_MAX_JOBS, max_rss_mb=WARM_WORKER_MAX_RSS_MB):
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._busy = 0
+        self._cond = threading.Condition()
+
+    def warm_up(self):
+        """Start all workers ahead of the first request"""
+        with self._cond:
+            while len(self._idle) + self._busy < self.size:
+                self._idle.append(_Worker(self._ctx, self.max_jobs, self.max_rss_mb))
+
+    def _checkout(self):
+        with self._cond:
+            while not self._idle and self._busy >= self.size:
+                self._cond.wait()
+            worker = self._idle.pop() if self._idle else None
+            self._busy += 1
+        if worker is None or not worker.process.is_alive():
+            worker = _Worker(self._ctx, self.max_jobs, self.max_rss_mb)
+        return worker
+
+    def _checkin(self, worker):
+        with self._cond:
+            self._busy -= 1
+            if worker is not None:
+                self._idle.append(worker)
+            self._cond.notify()
+
+    def render(self, code, scene_id, quality="720p", media_dir="media", timeout=300, config_overrides=None, stats=None,
+               should_cancel=None, profile_path=None, scene_name=None, on_progress=None, on_start=None):
+        """
+        Render a scene on a warm worker.
+
+        Args:
+            code (str): The Manim Python code to execute.
+            scene_id (str): Unique identifier for the scene.
+            quality (str): Video quality setting.
+            media_dir (str): Directory manim writes its media into.
+            timeout (float): Seconds to wait before killing the worker.
+            config_overrides (dict): Extra manim config values for this render.
+            stats (dict): Filled with partial movie counts for this render.
+            should_cancel (callable): Polled while rendering; True kills the worker.
+            profile_path (str): Record a per-animation profile to this file (see render_profiler).
+            scene_name (str): Scene class to render; None renders the last one defined.
+            on_progress (callable): Called with (animation number, fraction of that animation).
+            on_start (callable): Called with the worker's process group ID once the render is sent.
+        Returns:
+            tuple: (video_path (str) or None, error_message (str) or None)
+        """
+        worker = self._checkout()
+        reply = None
+        try:
+            worker.conn.send({
+                "code": code,
+                "scene_id": scene_id,
+                "quality": quality,
+                "media_dir": os.path.abspath(media_dir),
+                "config_overrides": config_overrides,
+                "profile_path": profile_path,
+                "scene_name": scene_name,
+            })
+            if on_start:
+                on_start(worker.pgid)
+            deadline = time.monotonic() + timeout
+            while reply is None:
+                if should_cancel and should_cancel():
+                    worker.stop(kill=True)
+                    worker = None
+                    return None, "Render cancelled."
+                if time.monotonic() > deadline:
+                    worker.stop(kill=True)
+                    worker = None
+                    return None, f"Manim execution timed out ({timeout} seconds)."
+                if not worker.conn.poll(0.2):
+                    continue
+                message = worker.conn.recv()
+                if "progress" not in message:
+                    reply = message
+                elif on_progress:
+                    on_progress(*message["progress"])
+        except (EOFError, OSError) as e:
+            worker.stop(kill=True)
+            worker = None
+            return None, f"Render worker died: {str(e)}"
+        finally:
+            # Retire recycled workers before anyone else can check them out
+            if worker is not None and reply is not None and reply["recycle"]:
+                worker.stop()
+                worker = None
+            self._checkin(worker)
+
+        if stats is not None:
+            stats.update(reply["stats"])
+        return reply["video_path"], reply["error"]
+
+    def shutdown(self):
+        with self._cond:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Return this process's warm render pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WarmRenderPool()
+        return _pool
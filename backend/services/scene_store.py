@@ -0,0 +1,298 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import STORE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    generation_history TEXT NOT NULL DEFAULT '[]',
+    selection_order TEXT NOT NULL DEFAULT '[]',
+    final_video_path TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scenes (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    job_id TEXT,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scenes_by_session ON scenes (session_id, created_at);
+CREATE INDEX IF NOT EXISTS scenes_by_status ON scenes (status);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    scene_id TEXT,
+    status TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_scene ON jobs (scene_id);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    scene_id TEXT,
+    session_id TEXT,
+    bytes INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_by_scene ON artifacts (scene_id);
+CREATE INDEX IF NOT EXISTS artifacts_by_session ON artifacts (session_id);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    device INTEGER,
+    inode INTEGER,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_by_inode ON blobs (device, inode);
+CREATE INDEX IF NOT EXISTS blobs_by_last_used ON blobs (last_used);
+"""
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = (
+    ("artifacts", "digest", "ALTER TABLE artifacts ADD COLUMN digest TEXT"),
+)
+
+# One connection per thread; the schema is created once per process
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    os.makedirs(os.path.dirname(STORE_PATH) or ".", exist_ok=True)
+    # Autocommit; multi-statement updates use transaction()
+    conn = sqlite3.connect(STORE_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL: the UI reads while render workers in other processes write job progress
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _schema_lock:
+        if not _schema_ready:
+            conn.executescript(SCHEMA)
+            _migrate(conn)
+            _schema_ready = True
+    _local.conn = conn
+    return conn
+
+
+def _migrate(conn):
+    for table, column, statement in MIGRATIONS:
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(statement)
+    conn.execute("CREATE INDEX IF NOT EXISTS artifacts_by_digest ON artifacts (digest)")
+
+
+@contextlib.contextmanager
+def transaction():
+    """Run a read-modify-write atomically, across threads and processes"""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# Sessions
+
+def load_session(session_id):
+    """
+    Load everything a browser session needs to rebuild its page.
+
+    Returns:
+        dict: scenes (in creation order), generation_history, selection_order and final_video_path.
+    """
+    conn = _connect()
+    row = conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+    scenes = conn.execute(
+        "SELECT data FROM scenes WHERE session_id = ? ORDER BY created_at, rowid", (session_id,)
+    ).fetchall()
+    return {
+        "scenes": [json.loads(scene["data"]) for scene in scenes],
+        "generation_history": json.loads(row["generation_history"]) if row else [],
+        "selection_order": json.loads(row["selection_order"]) if row else [],
+        "final_video_path": row["final_video_path"] if row else None,
+    }
+
+
+def save_session(session_id, generation_history, selection_order, final_video_path):
+    """Store a session's prompt history, stitch selection and stitched video"""
+    _connect().execute(
+        """
+        INSERT INTO sessions (id, generation_history, selection_order, final_video_path, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            generation_history = excluded.generation_history,
+            selection_order = excluded.selection_order,
+            final_video_path = excluded.final_video_path,
+            updated_at = excluded.updated_at
+        """,
+        (session_id, json.dumps(generation_history), json.dumps(selection_order), final_video_path, time.time())
+    )
+
+
+def delete_session(session_id):
+    """Forget a session with its scenes, releasing their artifacts for garbage collection"""
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE artifacts SET scene_id = NULL, session_id = NULL "
+            "WHERE session_id = ? OR scene_id IN (SELECT id FROM scenes WHERE session_id = ?)",
+            (session_id, session_id)
+        )
+        conn.execute("DELETE FROM scenes WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+# Scenes
+
+def save_scene(session_id, scene):
+    """Insert or update a scene record; its position in the session is kept"""
+    now = time.time()
+    _connect().execute(
+        """
+        INSERT INTO scenes (id, session_id, status, job_id, data, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            status = excluded.status,
+            job_id = excluded.job_id,
+            data = excluded.data,
+            updated_at = excluded.updated_at
+        """,
+        (scene["id"], session_id, scene["status"], scene.get("job_id"), json.dumps(scene, default=str), now, now)
+    )
+
+
+def get_scene(scene_id):
+    """
+    Returns:
+        dict or None: The scene record, or None if unknown.
+    """
+    row = _connect().execute("SELECT data FROM scenes WHERE id = ?", (scene_id,)).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def find_scenes(status):
+    """Return every scene with the given status, across sessions"""
+    rows = _connect().execute("SELECT data FROM scenes WHERE status = ?", (status,)).fetchall()
+    return [json.loads(row["data"]) for row in rows]
+
+
+def delete_scene(scene_id):
+    """Forget a scene, releasing its artifacts for garbage collection"""
+    with transaction() as conn:
+        conn.execute("UPDATE artifacts SET scene_id = NULL WHERE scene_id = ?", (scene_id,))
+        conn.execute("DELETE FROM scenes WHERE id = ?", (scene_id,))
+
+
+# Jobs
+
+def get_job(job_id):
+    """
+    Returns:
+        dict or None: The job's state, or None if unknown.
+    """
+    row = _connect().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def update_job(job_id, **fields):
+    """
+    Merge fields into a job's state.
+
+    Returns:
+        dict: The job's state after the update.
+    """
+    with transaction() as conn:
+        row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        job = json.loads(row["data"]) if row else {"id": job_id}
+        job.update(fields, updated_at=time.time())
+        conn.execute(
+            """
+            INSERT INTO jobs (id, scene_id, status, data, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                scene_id = excluded.scene_id,
+                status = excluded.status,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            (job_id, job.get("scene_id"), job.get("status"), json.dumps(job, default=str), job["updated_at"])
+        )
+    return job
+
+
+def find_jobs(statuses):
+    """Return every job in one of the given states"""
+    placeholders = ",".join("?" * len(statuses))
+    rows = _connect().execute(
+        f"SELECT data FROM jobs WHERE status IN ({placeholders}) ORDER BY updated_at", tuple(statuses)
+    ).fetchall()
+    return [json.loads(row["data"]) for row in rows]
+
+
+def delete_job(job_id):
+    _connect().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+# Artifacts
+
+def record_artifact(path, kind, scene_id=None, session_id=None, digest=None):
+    """
+    Remember a video file produced for a scene or a session.
+
+    The owner is the artifact's reference: artifacts without a scene or
+    session are released and may be garbage-collected (see artifact_store).
+
+    Args:
+        path (str): The video file.
+        kind (str): "video", "draft" or "final" (a stitched video).
+        scene_id (str): Scene the file belongs to; None keeps the recorded owner
+            (release_artifact() drops it).
+        session_id (str): Session the file belongs to, for stitched videos; None keeps the recorded one.
+        digest (str): sha256 of the file's blob; None keeps the recorded one.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = None
+    _connect().execute(
+        """
+        INSERT INTO artifacts (path, kind, scene_id, session_id, bytes, created_at, digest)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE SET
+            kind = excluded.kind,
+            scene_id = COALESCE(excluded.scene_id, artifacts.scene_id),
+            session_id = COALESCE(excluded.session_id, artifacts.session_id),
+            bytes = excluded.bytes,
+            digest = COALESCE(excluded.digest, artifacts.digest)
+        """,
+        (path, kind, scene_id, session_id, size, time.time(), digest)
+    )
+
+
+def release_artifact(path):
+    """Drop a file's owner, e.g. a stitched video replaced by a newer one"""
+    _connect().execute("UPDATE artifacts SET scene_id = NULL, session_id = NULL WHERE path = ?", (path,))
+
+
+def get_artifacts(scene_id):
+    """Return the artifact records of a scene, newest first"""
+    rows = _connect().execute(
+        "SELECT * FROM artifacts WHERE scene_id = ? ORDER BY created_at DESC", (scene_id,)
+    ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from backend.utils import link_or_copy, evict_lru
+from config import STITCH_CACHE_DIR, STITCH_CACHE_MAX_BYTES
+
+# (path, size, mtime) -> sha256, so unchanged inputs are hashed once per process
+_digests = {}
+_lock = threading.Lock()
+
+
+def file_digest(path):
+    """Return the sha256 of a file's content"""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _lock:
+        if memo_key in _digests:
+            return _digests[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    with _lock:
+        _digests[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+def stitch_cache_key(digests, transition_effect, transition_duration):
+    """
+    Build the cache key for a stitch.
+
+    Args:
+        digests (list): Content hashes of the inputs, in order.
+        transition_effect (str): Transition between inputs.
+        transition_duration (float): Transition length in seconds.
+    Returns:
+        str: Hex digest identifying the stitched output.
+    """
+    payload = json.dumps([list(digests), transition_effect, round(float(transition_duration), 3)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(STITCH_CACHE_DIR, f"{key}.mp4")
+
+
+def find_cached_prefix(digests, transition_effect, transition_duration):
+    """
+    Find the longest cached stitch of a prefix of digests.
+
+    Returns:
+        tuple: (prefix length, cached path), or (0, None) if no prefix of two or more inputs is cached.
+    """
+    for length in range(len(digests), 1, -1):
+        entry = _entry_path(stitch_cache_key(digests[:length], transition_effect, transition_duration))
+        if os.path.exists(entry):
+            try:
+                # Touch the entry so eviction treats it as recently used
+                os.utime(entry)
+            except OSError:
+                continue
+            return length, entry
+    return 0, None
+
+
+def store_stitch(digests, transition_effect, transition_duration, video_path):
+    """Add a stitched video to the cache and evict old entries if needed"""
+    entry = _entry_path(stitch_cache_key(digests, transition_effect, transition_duration))
+    os.makedirs(STITCH_CACHE_DIR, exist_ok=True)
+
+    # Write under a temporary name and rename so readers never see a partial file
+    tmp_path = f"{entry}.{uuid.uuid4().hex}.tmp"
+    try:
+        link_or_copy(video_path, tmp_path)
+        os.replace(tmp_path, entry)
+    except OSError as e:
+        print(f"Warning: Failed to cache stitched video: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    evict_lru(STITCH_CACHE_DIR, STITCH_CACHE_MAX_BYTES, ".mp4")
@@ -1,50 +1,400 @@
+import json
+import os
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from backend.utils import link_or_copy
+from backend.services.stitch_cache import file_digest, find_cached_prefix, store_stitch
+from config.logger import span
 
-def video_stitcher(video_paths, output_path, transition_effect="fade"):
+# Stream properties that must match for the concat demuxer to copy packets as-is
+CONCAT_STREAM_KEYS = (
+    "codec_type", "codec_name", "profile", "width", "height", "pix_fmt",
+    "r_frame_rate", "time_base", "sample_rate", "channels"
+)
+
+# ffmpeg xfade transition for each effect offered in the scene manager
+TRANSITION_FILTERS = {
+    "fade": "fade",
+    "slide": "slideleft",
+    "zoom": "zoomin",
+}
+
+def probe_streams(path):
+    """
+    Read the stream parameters of a video with ffprobe.
+
+    Args:
+        path (str): Path to the video file.
+    Returns:
+        list: One dict of CONCAT_STREAM_KEYS per stream, or None if probing failed.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", f"stream={','.join(CONCAT_STREAM_KEYS)}",
+        "-of", "json",
+        path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        if result.returncode != 0:
+            return None
+        streams = json.loads(result.stdout).get("streams", [])
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+    return [{key: stream.get(key) for key in CONCAT_STREAM_KEYS} for stream in streams]
+
+def probe_keyframes(path):
+    """
+    Read the duration and keyframe timestamps of a video's first video stream.
+
+    Packets are listed without decoding, so this is fast even for long clips.
+
+    Returns:
+        tuple: (duration (float), keyframes (list of (pts, dts) in seconds)), or (None, None) if probing failed.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "format=duration:packet=pts_time,dts_time,flags",
+        "-of", "json",
+        path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            return None, None
+        info = json.loads(result.stdout)
+        duration = float(info["format"]["duration"])
+    except (OSError, ValueError, KeyError, subprocess.TimeoutExpired):
+        return None, None
+
+    keyframes = sorted(
+        (float(packet["pts_time"]), float(packet.get("dts_time", packet["pts_time"])))
+        for packet in info.get("packets", [])
+        if "K" in packet.get("flags", "")
+        and packet.get("pts_time") not in (None, "N/A") and packet.get("dts_time") != "N/A"
+    )
+    return duration, keyframes
+
+def can_stream_copy(video_paths):
+    """Check whether all videos share codec parameters and can be concatenated without re-encoding"""
+    signatures = [probe_streams(path) for path in video_paths]
+    if any(not signature for signature in signatures):
+        return False, "could not probe every input"
+    if any(signature != signatures[0] for signature in signatures[1:]):
+        return False, "inputs have different codec parameters"
+    return True, None
+
+def _concat_copy(entries, output_path):
+    """
+    Concatenate files with the concat demuxer, copying packets as-is.
+
+    Args:
+        entries (list): Paths, or (path, inpoint, outpoint, duration) tuples to copy only
+            part of a file. The outpoint is a decode timestamp; duration is the presented length.
+    """
+    fd, list_path = tempfile.mkstemp(prefix="concat_", suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for entry in entries:
+                path, inpoint, outpoint, duration = entry if isinstance(entry, tuple) else (entry, None, None, None)
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+                if inpoint:
+                    f.write(f"inpoint {inpoint:.6f}\n")
+                if outpoint is not None:
+                    f.write(f"outpoint {outpoint:.6f}\n")
+                if duration is not None:
+                    f.write(f"duration {duration:.6f}\n")
+
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            "-movflags", "+faststart",
+            output_path
+        ]
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    finally:
+        os.remove(list_path)
+
+def _concat_reencode(video_paths, output_path):
+    input_parts = []
+
+    for path in video_paths:
+        input_parts.extend(['-i', path])
+
+    # Build the stream labels: [0:v:0][1:v:0]...
+    labels = ''.join(f"[{i}:v:0]" for i in range(len(video_paths)))
+
+    # concat: n=<number of inputs>, output 1 video stream, no audio
+    filter_complex = f"{labels}concat=n={len(video_paths)}:v=1:a=0[outv]"
+
+    cmd = [
+        'ffmpeg',
+        "-y",  # Overwrite output files without asking
+        *input_parts,
+        '-filter_complex', filter_complex,
+        '-map', '[outv]',
+        output_path
+    ]
+
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+
+def _xfade_filter(lengths, effect, transition_duration, normalize=None):
+    """Chain xfade over inputs 0..n-1 whose lengths (in seconds) are given"""
+    parts = []
+    labels = []
+    for i in range(len(lengths)):
+        if normalize:
+            parts.append(f"[{i}:v:0]{normalize}[n{i}]")
+            labels.append(f"[n{i}]")
+        else:
+            labels.append(f"[{i}:v:0]")
+
+    current, length = labels[0], lengths[0]
+    for i in range(1, len(lengths)):
+        out = "[outv]" if i == len(lengths) - 1 else f"[x{i}]"
+        offset = max(length - transition_duration, 0)
+        parts.append(
+            f"{current}{labels[i]}xfade=transition={effect}"
+            f":duration={transition_duration:.3f}:offset={offset:.3f}{out}"
+        )
+        current, length = out, length + lengths[i] - transition_duration
+    return ";".join(parts)
+
+def _encode_pieces(pieces, effect, transition_duration, output_path, encode_args, normalize=None):
+    """
+    Decode only the given (path, start, end) pieces, xfade them together and encode the result.
+    """
+    input_parts = []
+    for path, start, end in pieces:
+        input_parts.extend(["-ss", f"{start:.6f}", "-to", f"{end:.6f}", "-i", path])
+
+    filter_complex = _xfade_filter(
+        [end - start for path, start, end in pieces],
+        effect, transition_duration, normalize
+    )
+
+    cmd = [
+        "ffmpeg",
+        "-y",
+        *input_parts,
+        "-filter_complex", filter_complex,
+        "-map", "[outv]",
+        "-an",
+        *encode_args,
+        output_path
+    ]
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+
+def plan_transition_segments(clips, transition_duration):
+    """
+    Split clips into stream-copied middles and short windows that need re-encoding.
+
+    Each clip's middle runs between keyframes, so it can be copied without
+    decoding. Only the window around each boundary (tail of one clip plus
+    head of the next) is decoded and crossfaded. Clips without a usable
+    keyframe are folded whole into the neighbouring window.
+
+    Args:
+        clips (list): Dicts with "path", "duration" and sorted "keyframes".
+        transition_duration (float): Overlap at each boundary in seconds.
+    Returns:
+        list: ("copy", path, start, end) and ("xfade", [(path, start, end), ...]) segments in order.
+    """
+    segments = []
+    window = []
+    last = len(clips) - 1
+    for i, clip in enumerate(clips):
+        if i == 0:
+            start = 0.0
+        else:
+            start = next((k for k in clip["keyframes"] if k >= transition_duration), None)
+        if i == last:
+            end = clip["duration"]
+        else:
+            end = max((k for k in clip["keyframes"] if k <= clip["duration"] - transition_duration), default=None)
+
+        if start is None or end is None or end <= start:
+            window.append((clip["path"], 0.0, clip["duration"]))
+            continue
+
+        if i > 0:
+            window.append((clip["path"], 0.0, start))
+            segments.append(("xfade", window))
+        segments.append(("copy", clip["path"], start, end))
+        window = [(clip["path"], end, clip["duration"])] if i < last else []
+
+    if window:
+        segments.append(("xfade", window))
+    return segments
+
+def _encode_args(stream):
+    # Match the copied segments so the concat demuxer can join them
+    time_base = (stream.get("time_base") or "1/15360").split("/")[-1]
+    return [
+        "-c:v", "libx264",
+        "-crf", "18",
+        "-preset", "veryfast",
+        "-pix_fmt", stream.get("pix_fmt") or "yuv420p",
+        "-r", stream.get("r_frame_rate") or "30",
+        "-video_track_timescale", time_base,
+    ]
+
+def _stitch_with_transitions(video_paths, output_path, effect, transition_duration):
+    streams = probe_streams(video_paths[0]) or [{}]
+    video_stream = next((s for s in streams if s.get("codec_type") == "video"), streams[0])
+
+    clips = []
+    for path in video_paths:
+        duration, keyframes = probe_keyframes(path)
+        if duration is None:
+            return None, "could not probe every input"
+        clips.append({
+            "path": path,
+            "duration": duration,
+            "keyframes": [pts for pts, dts in keyframes],
+            "keyframe_dts": dict(keyframes),
+        })
+
+    # Never overlap more than half of the shortest clip
+    transition_duration = min(transition_duration, min(clip["duration"] for clip in clips) / 2)
+
+    compatible, reason = can_stream_copy(video_paths)
+    only_video = all(s.get("codec_type") == "video" for s in streams)
+    with tempfile.TemporaryDirectory(prefix="stitch_") as temp_dir:
+        if not (compatible and only_video):
+            # Inputs differ: crossfade whole clips after normalizing them to the first one
+            width, height = video_stream.get("width"), video_stream.get("height")
+            normalize = (
+                f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+                f"fps={video_stream.get('r_frame_rate') or 30},format=yuv420p,settb=AVTB"
+            )
+            pieces = [(clip["path"], 0.0, clip["duration"]) for clip in clips]
+            result = _encode_pieces(pieces, effect, transition_duration, output_path,
+                                    _encode_args(video_stream), normalize)
+            if result.returncode != 0:
+                return False, result.stderr
+            return True, f"Stitched with full re-encode ({reason or 'inputs carry audio'})."
+
+        segments = plan_transition_segments(clips, transition_duration)
+        windows = [segment for segment in segments if segment[0] == "xfade"]
+        window_paths = [os.path.join(temp_dir, f"window_{i}.mp4") for i in range(len(windows))]
+
+        # Transition windows are independent, so encode them concurrently
+        with ThreadPoolExecutor(max_workers=max(1, min(len(windows), os.cpu_count() or 1))) as pool:
+            results = list(pool.map(
+                lambda job: _encode_pieces(job[0][1], effect, transition_duration, job[1],
+                                           _encode_args(video_stream)),
+                zip(windows, window_paths)
+            ))
+        failed = next((result for result in results if result.returncode != 0), None)
+        if failed:
+            return False, failed.stderr
+
+        # With B-frames the concat demuxer must stop at the keyframe's decode timestamp
+        keyframe_dts = {clip["path"]: clip["keyframe_dts"] for clip in clips}
+        entries = []
+        window_iter = iter(window_paths)
+        for segment in segments:
+            if segment[0] == "copy":
+                kind, path, start, end = segment
+                outpoint = keyframe_dts[path].get(end)
+                entries.append((path, start, outpoint, end - start))
+            else:
+                entries.append(next(window_iter))
+
+        result = _concat_copy(entries, output_path)
+        if result.returncode != 0:
+            return False, result.stderr
+
+    copied = sum(segment[3] - segment[2] for segment in segments if segment[0] == "copy")
+    total = sum(clip["duration"] for clip in clips)
+    return True, (
+        f"Stitched with {len(windows)} re-encoded transition window(s); "
+        f"{copied:.1f}s of {total:.1f}s stream-copied."
+    )
+
+def _stitch(video_paths, output_path, transition_effect, transition_duration):
+    # Transitions re-encode only the windows around each boundary
+    effect = TRANSITION_FILTERS.get(transition_effect)
+    if effect and transition_duration > 0:
+        success, message = _stitch_with_transitions(video_paths, output_path, effect, transition_duration)
+        if success is not None:
+            return success, message
+
+    # Copy packets when every input shares codec parameters, otherwise decode and re-encode
+    compatible, reason = can_stream_copy(video_paths)
+    if compatible:
+        result = _concat_copy(video_paths, output_path)
+        if result.returncode == 0:
+            return True, "Stitched with stream copy (no re-encode)."
+        reason = "stream copy failed"
+
+    result = _concat_reencode(video_paths, output_path)
+
+    if result.returncode == 0:
+        return True, f"Stitched with re-encode ({reason})."
+    else:
+        return False, result.stderr
+
+def video_stitcher(video_paths, output_path, transition_effect="fade", transition_duration=0.5, use_cache=True):
     """
     Stitch multiple videos together with various transition effects
-    
+
     Args:
         video_paths (list): List of paths to video files
         output_path (str): Path where the output video will be saved
         transition_effect (str): Type of transition - "fade", "cut", "slide", "zoom"
         transition_duration (float): Duration of transition in seconds (ignored for "cut")
-    
+        use_cache (bool): Reuse earlier stitches of the same inputs or of a prefix of them
+
     Returns:
-        tuple: (success: bool, message: str)
+        tuple: (success: bool, message: str) - on success the message names the path taken
     """
-    
+    with span("stitch", inputs=len(video_paths), transition=transition_effect) as record:
+        success, message = _cached_stitch(video_paths, output_path, transition_effect, transition_duration, use_cache)
+        record["status"] = "ok" if success else "error"
+        record["path"] = (message or "")[:300]
+    return success, message
+
+def _cached_stitch(video_paths, output_path, transition_effect, transition_duration, use_cache):
     if len(video_paths) < 2:
         return False, "Need at least 2 videos to stitch."
-    
+
     try:
-        input_parts = []
+        if not use_cache:
+            return _stitch(video_paths, output_path, transition_effect, transition_duration)
 
-        for path in video_paths:
-            input_parts.extend(['-i', path])
-        
-        # Build the stream labels: [0:v:0][1:v:0]...
-        labels = ''.join(f"[{i}:v:0]" for i in range(len(video_paths)))
+        # Cuts have no duration, so every "cut" stitch shares one key
+        if transition_effect not in TRANSITION_FILTERS:
+            transition_duration = 0
 
-        # Simple concatenation for now (later can add transitions)
-        # concat: n=<number of inputs>, output 1 video stream, no audio
-        filter_complex = f"{labels}concat=n={len(video_paths)}:v=1:a=0[outv]"
+        digests = [file_digest(path) for path in video_paths]
+        prefix_length, prefix_path = find_cached_prefix(digests, transition_effect, transition_duration)
+        if prefix_length == len(video_paths):
+            link_or_copy(prefix_path, output_path)
+            return True, "Reused a previously stitched video."
 
-        cmd = [
-            'ffmpeg',
-            "-y",  # Overwrite output files without asking
-            *input_parts,
-            '-filter_complex', filter_complex,
-            '-map', '[outv]',
-            output_path
-        ]
+        # Append only the new scenes to the longest cached prefix
+        inputs = [prefix_path, *video_paths[prefix_length:]] if prefix_path else video_paths
+        success, message = _stitch(inputs, output_path, transition_effect, transition_duration)
+        if not success:
+            return success, message
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        store_stitch(digests, transition_effect, transition_duration, output_path)
+        if prefix_path:
+            message = f"Appended {len(video_paths) - prefix_length} scene(s) to a cached stitch of {prefix_length}. {message}"
+        return True, message
 
-        if result.returncode == 0:
-            return True, None
-        else:
-            return False, result.stderr
-        
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
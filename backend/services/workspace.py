@@ -0,0 +1,151 @@
+import os
+import shutil
+import threading
+from config import WORKSPACE_DIR, WORKSPACE_MAX_COUNT, WORKSPACE_MAX_BYTES
+
+try:
+    import fcntl
+except ImportError:  # Windows: workspaces are used without locking
+    fcntl = None
+
+# Manim log lines for each animation, see CairoRenderer.play and SceneFileWriter
+CACHED_MARKER = "Using cached data"
+RENDERED_MARKER = "Partial movie file written"
+
+# Partial movie counters for this process
+_stats = {"renders": 0, "partial_movies_reused": 0, "partial_movies_rendered": 0}
+_lock = threading.Lock()
+
+
+def open_workspace(scene_id):
+    """
+    Lock and return the persistent render directory for a scene.
+
+    Returns:
+        tuple: (workspace path (str), lock handle to pass to close_workspace)
+    """
+    path = os.path.join(WORKSPACE_DIR, f"scene_{scene_id}")
+    os.makedirs(path, exist_ok=True)
+
+    lock = open(os.path.join(path, ".lock"), "w")
+    if fcntl:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    os.utime(path)
+    return path, lock
+
+
+def close_workspace(path, lock):
+    """Unlock a workspace and prune old ones beyond the retention limits"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    if fcntl:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    lock.close()
+    prune_workspaces()
+
+
+def manim_env():
+    """Environment for manim subprocesses; a wide console keeps each log line on one line"""
+    return dict(os.environ, COLUMNS="400")
+
+
+def find_rendered_video(media_dir):
+    """Return the finished video under media_dir, ignoring manim's partial movie files"""
+    for root, dirs, files in os.walk(media_dir):
+        if "partial_movie_files" in dirs:
+            dirs.remove("partial_movie_files")
+        for file in files:
+            if file.endswith(".mp4"):
+                return os.path.join(root, file)
+    return None
+
+
+def clear_rendered_videos(media_dir):
+    """Remove finished videos from earlier renders but keep manim's partial movie files"""
+    for root, dirs, files in os.walk(media_dir):
+        if "partial_movie_files" in dirs:
+            dirs.remove("partial_movie_files")
+        for file in files:
+            if file.endswith(".mp4"):
+                os.remove(os.path.join(root, file))
+
+
+def _dir_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+def _is_locked(path):
+    if not fcntl:
+        return False
+    try:
+        with open(os.path.join(path, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+        return False
+    except OSError:
+        return True
+
+
+def prune_workspaces(max_count=WORKSPACE_MAX_COUNT, max_bytes=WORKSPACE_MAX_BYTES):
+    """Delete least recently used workspaces until both limits are met, skipping ones in use"""
+    try:
+        names = os.listdir(WORKSPACE_DIR)
+    except OSError:
+        return
+
+    workspaces = []
+    for name in names:
+        path = os.path.join(WORKSPACE_DIR, name)
+        if os.path.isdir(path):
+            workspaces.append([os.path.getmtime(path), _dir_size(path), path])
+
+    workspaces.sort()
+    count = len(workspaces)
+    total = sum(size for mtime, size, path in workspaces)
+    for mtime, size, path in workspaces:
+        if count <= max_count and total <= max_bytes:
+            break
+        if _is_locked(path):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        count -= 1
+        total -= size
+
+
+def count_partial_movies(output):
+    """
+    Count reused and freshly rendered partial movies in manim's log output.
+
+    Returns:
+        dict: partial_movies_reused and partial_movies_rendered.
+    """
+    return {
+        "partial_movies_reused": output.count(CACHED_MARKER),
+        "partial_movies_rendered": output.count(RENDERED_MARKER),
+    }
+
+
+def record_partial_movies(counts):
+    """Add one render's partial movie counts to the process totals"""
+    with _lock:
+        _stats["renders"] += 1
+        for key in ("partial_movies_reused", "partial_movies_rendered"):
+            _stats[key] += counts.get(key, 0)
+
+
+def get_workspace_stats():
+    """Return partial movie reuse counters for this process"""
+    with _lock:
+        stats = dict(_stats)
+    total = stats["partial_movies_reused"] + stats["partial_movies_rendered"]
+    stats["reuse_rate"] = stats["partial_movies_reused"] / total if total else 0.0
+    return stats
@@ -1,3 +1,8 @@
+import os
+import re
+import shutil
+
+
 def get_fallback_code():
     """Generate a fallback Manim codet"""
     return '''from manim import *
@@ -16,4 +21,102 @@ def code_validator(code):
     except SyntaxError as e:
         return False, f"Syntax Error at line {e.lineno}: {e.msg}"
     except Exception as e:
-        return False, f"Validation Error: {str(e)}"
\ No newline at end of file
+        return False, f"Validation Error: {str(e)}"
+
+def link_or_copy(src, dst):
+    """Place src at dst, hardlinking when possible and copying otherwise.
+
+    The destination is unlinked first so an existing hardlink (for example a
+    cache entry) is never overwritten in place.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+
+def evict_lru(directory, max_bytes, suffix=""):
+    """
+    Delete the least recently modified files under directory until it fits in max_bytes.
+
+    Args:
+        directory (str): Cache directory to scan recursively.
+        max_bytes (int): Size budget in bytes.
+        suffix (str): Only consider files ending with this suffix.
+    Returns:
+        int: Number of files deleted.
+    """
+    entries = []
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if not file.endswith(suffix):
+                continue
+            path = os.path.join(root, file)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+    evicted = 0
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        evicted += 1
+    return evicted
+
+# Final line of a Python traceback, e.g. "AttributeError: 'Circle' object has no attribute 'foo'"
+EXCEPTION_LINE = re.compile(r"^([A-Za-z_][\w.]*(Error|Exception|Exit|Interrupt))\b:?")
+# Frame header in a plain ('File "x.py", line 7') or rich ('x.py:7 in construct') traceback
+FRAME = re.compile(r'File ".*", line \d+|\.py:\d+ in ')
+SCENE_FRAME = re.compile(r'scene_\w*\.py(", line |:)\d+')
+
+
+def trim_traceback(output, max_chars=2000):
+    """
+    Cut manim's output down to what is needed to fix the scene code.
+
+    Keeps the traceback frames that point into the scene file, each with its
+    failing source line, and the final exception line; frames inside manim,
+    numpy and the interpreter are dropped.
+
+    Args:
+        output (str): Error output from a failed render.
+        max_chars (int): Maximum length of the result.
+    Returns:
+        str: The trimmed error.
+    """
+    # Strip rich's box drawing so plain and rich tracebacks read the same
+    lines = [line.strip(" │╭╰╮╯─") for line in output.splitlines()]
+    lines = [line for line in lines if line]
+
+    exception = next((i for i in reversed(range(len(lines))) if EXCEPTION_LINE.match(lines[i])), None)
+    if exception is None:
+        return output[-max_chars:].strip()
+
+    kept = []
+    for i, line in enumerate(lines[:exception]):
+        if not SCENE_FRAME.search(line):
+            continue
+        body = []
+        for following in lines[i + 1:exception]:
+            if FRAME.search(following):
+                break
+            body.append(following)
+        # Rich marks the failing line with ❱ among several lines of context
+        marked = [source for source in body if "❱" in source]
+        kept += [line] + (marked or body[:1])
+    kept += lines[exception:exception + 3]
+    return "\n".join(kept)[-max_chars:]
@@ -0,0 +1,182 @@
+"""
+Benchmark the generation -> render -> stitch pipeline on a fixed scene corpus.
+
+LLM calls go to a local stub OpenAI-compatible server, so timings measure our
+own overhead rather than a provider. Results are written as JSON for
+comparison across commits.
+
+Usage:
+    python -m benchmarks.bench_pipeline --runs 3 --qualities 480p,720p --stitch-counts 2,10,50
+    python -m benchmarks.bench_pipeline --skip render   # no manim installed
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import timeit
+from openai import OpenAI
+from backend.services import llm_response
+from backend.services.artifact_store import discard
+from backend.services.clean_code import code_cleaner
+from backend.services.manim_processor import execute_manim_code
+from backend.services.preflight import preflight
+from backend.services.stitch_videos import video_stitcher
+from backend.utils import code_validator
+from benchmarks.common import summarize, time_call, write_results
+from benchmarks.corpus import CORPUS
+from tests.stub_openai_server import StubOpenAIServer
+
+STAGES = ("llm", "clean", "render", "stitch")
+
+
+def bench_llm(runs, chunk_delay):
+    """Time get_llm_response against the stub, streamed and not, for every corpus scene"""
+    # The prompt names the corpus scene the stub should answer with
+    server = StubOpenAIServer(lambda body: CORPUS[body["messages"][1]["content"]], chunk_size=32, delay=chunk_delay)
+    results = {}
+    with server:
+        original_client, original_limiter = llm_response.client, llm_response.rate_limiter
+        # Time the pipeline, not the provider's rate limit
+        llm_response.client = OpenAI(api_key="bench", base_url=server.url)
+        llm_response.rate_limiter = None
+        try:
+            for name in CORPUS:
+                results[name] = {}
+                for stream in (True, False):
+                    timings = []
+                    for _ in range(runs):
+                        _, elapsed = time_call(
+                            llm_response.get_llm_response,
+                            prompt=name, subject="Mathematics", animation_type="Visualization",
+                            duration=10, background_color="#000000", text_color="#FFFFFF",
+                            use_cache=False, stream=stream
+                        )
+                        timings.append(elapsed)
+                    results[name]["stream" if stream else "non_stream"] = summarize(timings)
+        finally:
+            llm_response.client, llm_response.rate_limiter = original_client, original_limiter
+    return results
+
+
+def bench_clean(number):
+    """Micro-benchmark the code checks that run before every render"""
+    checks = {
+        "code_cleaner": code_cleaner,
+        "code_validator": code_validator,
+        "preflight": preflight,
+    }
+    results = {}
+    for name, code in CORPUS.items():
+        results[name] = {
+            check: {"per_call_us": timeit.timeit(lambda: func(code), number=number) / number * 1e6, "calls": number}
+            for check, func in checks.items()
+        }
+    return results
+
+
+def bench_render(runs, qualities):
+    """Time uncached execute_manim_code for every corpus scene at each quality"""
+    if not shutil.which("manim"):
+        return {"skipped": "manim is not installed"}
+
+    results = {}
+    for name, code in CORPUS.items():
+        results[name] = {}
+        for quality in qualities:
+            timings = []
+            stats = {}
+            error = None
+            for run in range(runs):
+                (video_path, error), elapsed = time_call(
+                    execute_manim_code, code=code, scene_id=f"bench_{name}_{quality}_{run}",
+                    quality=quality, use_cache=False, stats=stats
+                )
+                if error:
+                    break
+                timings.append(elapsed)
+                discard(video_path)
+            results[name][quality] = dict(summarize(timings), stats=stats) if timings else {"error": error[:500]}
+    return results
+
+
+def _make_clip(path, index, duration):
+    # Distinct test patterns so the stitch cache can't treat clips as identical
+    pattern = ("testsrc", "testsrc2", "smptebars", "rgbtestsrc")[index % 4]
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"{pattern}=size=854x480:rate=15:duration={duration}",
+        "-vf", f"hue=h={index * 37 % 360}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", "15",
+        path
+    ], check=True)
+
+
+def bench_stitch(runs, counts, clip_seconds):
+    """Time video_stitcher on 2-50 synthetic clips, for hard cuts and fades"""
+    if not shutil.which("ffmpeg"):
+        return {"skipped": "ffmpeg is not installed"}
+
+    work_dir = tempfile.mkdtemp(prefix="bench_stitch_")
+    try:
+        clips = []
+        for index in range(max(counts)):
+            path = os.path.join(work_dir, f"clip_{index}.mp4")
+            _make_clip(path, index, clip_seconds)
+            clips.append(path)
+
+        results = {}
+        for count in counts:
+            results[str(count)] = {}
+            for transition in ("cut", "fade"):
+                timings = []
+                message = None
+                for run in range(runs):
+                    output = os.path.join(work_dir, f"stitched_{count}_{transition}_{run}.mp4")
+                    (success, message), elapsed = time_call(
+                        video_stitcher, clips[:count], output, transition, use_cache=False
+                    )
+                    if not success:
+                        break
+                    timings.append(elapsed)
+                    os.remove(output)
+                entry = summarize(timings) if timings else {"error": (message or "")[:500]}
+                entry["path"] = message
+                results[str(count)][transition] = entry
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--qualities", default="480p,720p,1080p,4k")
+    parser.add_argument("--stitch-counts", default="2,5,10,25,50")
+    parser.add_argument("--clip-seconds", type=float, default=2.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed stub chunks")
+    parser.add_argument("--clean-calls", type=int, default=200)
+    parser.add_argument("--skip", default="", help=f"comma-separated stages to skip: {', '.join(STAGES)}")
+    parser.add_argument("--output", help="JSON file to write (default: benchmarks/results/...)")
+    args = parser.parse_args()
+
+    skip = set(filter(None, args.skip.split(",")))
+    results = {}
+    if "llm" not in skip:
+        results["llm"] = bench_llm(args.runs, args.chunk_delay)
+    if "clean" not in skip:
+        results["clean"] = bench_clean(args.clean_calls)
+    if "render" not in skip:
+        results["render"] = bench_render(args.runs, args.qualities.split(","))
+    if "stitch" not in skip:
+        counts = [int(count) for count in args.stitch_counts.split(",")]
+        results["stitch"] = bench_stitch(args.runs, counts, args.clip_seconds)
+
+    path = write_results("pipeline", results, args.output)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
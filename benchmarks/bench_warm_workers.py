@@ -0,0 +1,69 @@
+"""
+Compare the per-render cost of spawning the manim CLI against warm render workers.
+
+Usage:
+    python -m benchmarks.bench_warm_workers --runs 5 --quality 480p
+"""
+import argparse
+import json
+import time
+from backend.services.artifact_store import discard
+from backend.services.manim_processor import execute_manim_code
+from backend.services.render_workers import get_render_pool
+from benchmarks.common import summarize
+
+# Deliberately tiny so the timings are dominated by startup cost
+BENCH_SCENE = '''from manim import *
+
+class BenchScene(Scene):
+    def construct(self):
+        square = Square()
+        self.play(Create(square), run_time=0.5)
+'''
+
+
+def _render(backend, run, quality):
+    start = time.perf_counter()
+    video_path, error = execute_manim_code(
+        code=BENCH_SCENE,
+        scene_id=f"bench_{backend}_{run}",
+        quality=quality,
+        use_cache=False,
+        render_backend=backend
+    )
+    elapsed = time.perf_counter() - start
+    if error:
+        raise RuntimeError(f"{backend} render failed: {error}")
+    discard(video_path)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--quality", default="480p")
+    args = parser.parse_args()
+
+    subprocess_timings = [_render("subprocess", run, args.quality) for run in range(args.runs)]
+
+    # The first warm render pays the one-off worker start and manim import
+    pool = get_render_pool()
+    warmup_s = _render("warm", "warmup", args.quality)
+    warm_timings = [_render("warm", run, args.quality) for run in range(args.runs)]
+    pool.shutdown()
+
+    subprocess_stats = summarize(subprocess_timings)
+    warm_stats = summarize(warm_timings)
+    results = {
+        "quality": args.quality,
+        "subprocess": subprocess_stats,
+        "warm": warm_stats,
+        "warm_first_render_s": warmup_s,
+        "saved_per_render_s": subprocess_stats["median_s"] - warm_stats["median_s"],
+        "speedup": subprocess_stats["median_s"] / warm_stats["median_s"],
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Shared helpers for the benchmark scripts"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from importlib import metadata
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def summarize(timings):
+    """Summary statistics, in seconds, for a list of timings"""
+    return {
+        "runs": len(timings),
+        "mean_s": statistics.mean(timings),
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+    }
+
+
+def time_call(func, *args, **kwargs):
+    """Call func once and return (result, seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """What a result was measured on, so runs can be compared fairly"""
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "manim": _version("manim"),
+        "openai": _version("openai"),
+    }
+
+
+def write_results(name, results, output=None):
+    """
+    Write benchmark results as JSON, tagged with the environment.
+
+    Args:
+        name (str): Benchmark name, used in the default file name.
+        results (dict): The measurements.
+        output (str): File to write; defaults to benchmarks/results/<name>_<commit>_<time>.json.
+    Returns:
+        str: Path of the written file.
+    """
+    env = environment()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{name}_{env['commit'] or 'nogit'}_{stamp}.json")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": name, "environment": env, "results": results}, f, indent=2)
+    return output
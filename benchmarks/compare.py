@@ -0,0 +1,56 @@
+"""
+Compare two benchmark result files, e.g. from two commits.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/pipeline_abc123_*.json benchmarks/results/pipeline_def456_*.json
+"""
+import argparse
+import json
+
+# Leaf metrics worth comparing; the rest are descriptive
+METRICS = ("median_s", "per_call_us")
+
+
+def flatten(results, prefix=""):
+    """Map "stage.scene.variant.metric" paths to values for every compared metric"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif key in METRICS and isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+
+def compare(before, after):
+    """
+    Returns:
+        list: (metric path, before, after, after/before ratio) for metrics in both runs.
+    """
+    old, new = flatten(before["results"]), flatten(after["results"])
+    return [
+        (path, old[path], new[path], new[path] / old[path] if old[path] else None)
+        for path in sorted(old.keys() & new.keys())
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"before: {before['environment']['commit']}  after: {after['environment']['commit']}")
+    for path, old, new, ratio in compare(before, after):
+        change = f"{ratio:6.2f}x" if ratio is not None else "     -"
+        print(f"{change}  {old:12.4f} -> {new:12.4f}  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""A fixed set of representative scenes, so benchmark runs stay comparable across commits"""
+
+TEXT_HEAVY = '''from manim import *
+
+class TextHeavyScene(Scene):
+    def construct(self):
+        title = Text("Photosynthesis", font_size=56).to_edge(UP)
+        self.play(Write(title))
+        self.next_section()
+
+        steps = VGroup(*[
+            Text(line, font_size=30)
+            for line in [
+                "1. Light is absorbed by chlorophyll",
+                "2. Water is split, releasing oxygen",
+                "3. ATP and NADPH carry the energy",
+                "4. The Calvin cycle fixes carbon dioxide",
+                "5. Glucose is built from the fixed carbon",
+            ]
+        ]).arrange(DOWN, aligned_edge=LEFT).next_to(title, DOWN, buff=0.6)
+        for step in steps:
+            self.play(FadeIn(step, shift=RIGHT), run_time=0.8)
+        self.next_section()
+
+        summary = Text("Light energy becomes chemical energy", font_size=36, color=YELLOW)
+        self.play(FadeOut(steps), Transform(title, summary))
+        self.wait(1)
+'''
+
+TEX_HEAVY = r'''from manim import *
+
+class TexHeavyScene(Scene):
+    def construct(self):
+        quadratic = MathTex(r"ax^2 + bx + c = 0")
+        self.play(Write(quadratic))
+        self.next_section()
+
+        steps = [
+            r"x^2 + \frac{b}{a}x = -\frac{c}{a}",
+            r"\left(x + \frac{b}{2a}\right)^2 = \frac{b^2 - 4ac}{4a^2}",
+            r"x + \frac{b}{2a} = \pm\frac{\sqrt{b^2 - 4ac}}{2a}",
+            r"x = \frac{-b \pm \sqrt{b^2 - 4ac}}{2a}",
+        ]
+        for step in steps:
+            self.play(TransformMatchingTex(quadratic, quadratic := MathTex(step)), run_time=1.2)
+        self.next_section()
+
+        identity = MathTex(r"e^{i\pi} + 1 = 0", r"\quad", r"\sum_{n=1}^{\infty} \frac{1}{n^2} = \frac{\pi^2}{6}")
+        self.play(quadratic.animate.to_edge(UP), Write(identity))
+        self.wait(1)
+'''
+
+GRAPH_PLOT = '''from manim import *
+
+class GraphPlotScene(Scene):
+    def construct(self):
+        axes = Axes(x_range=[-4, 4, 1], y_range=[-2, 10, 2], x_length=9, y_length=6, tips=False)
+        labels = axes.get_axis_labels(x_label="x", y_label="y")
+        self.play(Create(axes), Write(labels))
+        self.next_section()
+
+        parabola = axes.plot(lambda x: x ** 2 / 2, color=BLUE)
+        sine = axes.plot(lambda x: 3 * np.sin(x) + 4, color=GREEN)
+        self.play(Create(parabola), run_time=1.5)
+        self.play(Create(sine), run_time=1.5)
+        self.next_section()
+
+        area = axes.get_area(parabola, x_range=[-2, 2], color=BLUE, opacity=0.4)
+        dot = Dot(axes.c2p(-3, 4.5), color=YELLOW)
+        self.play(FadeIn(area), FadeIn(dot))
+        self.play(MoveAlongPath(dot, sine), run_time=2)
+        self.wait(1)
+'''
+
+ALGORITHM_DEMO = '''from manim import *
+
+class AlgorithmDemoScene(Scene):
+    def construct(self):
+        values = [7, 3, 9, 1, 6, 2, 8, 4]
+        bars = VGroup(*[
+            Rectangle(width=0.6, height=0.4 * value, fill_color=BLUE, fill_opacity=0.8)
+            for value in values
+        ]).arrange(RIGHT, buff=0.2, aligned_edge=DOWN)
+        title = Text("Bubble Sort", font_size=40).to_edge(UP)
+        self.play(Write(title), Create(bars))
+        self.next_section()
+
+        # One swap animation per exchange keeps the scene long, like real algorithm walkthroughs
+        for i in range(len(values)):
+            for j in range(len(values) - i - 1):
+                if values[j] > values[j + 1]:
+                    values[j], values[j + 1] = values[j + 1], values[j]
+                    self.play(
+                        bars[j].animate.move_to(bars[j + 1], aligned_edge=DOWN),
+                        bars[j + 1].animate.move_to(bars[j], aligned_edge=DOWN),
+                        run_time=0.4
+                    )
+                    bars[j], bars[j + 1] = bars[j + 1], bars[j]
+        self.next_section()
+
+        self.play(bars.animate.set_fill(GREEN))
+        self.wait(1)
+'''
+
+# Scene name -> code
+CORPUS = {
+    "text_heavy": TEXT_HEAVY,
+    "tex_heavy": TEX_HEAVY,
+    "graph_plot": GRAPH_PLOT,
+    "algorithm_demo": ALGORITHM_DEMO,
+}
@@ -1,2 +1,22 @@
 # Expose configuration settings
-from .settings import API_KEY, BASE_URL, MODEL_NAME, OUTPUT_DIR
\ No newline at end of file
+from .settings import API_KEY, BASE_URL, MODEL_NAME, OUTPUT_DIR
+from .settings import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+from .settings import LLM_CACHE_DIR, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES, LLM_STREAM
+from .settings import JOBS_DIR, RENDER_MAX_WORKERS, JOB_POLL_INTERVAL, STORE_PATH
+from .settings import RENDER_BACKEND, WARM_WORKERS, WARM_WORKER_MAX_JOBS, WARM_WORKER_MAX_RSS_MB
+from .settings import STITCH_CACHE_DIR, STITCH_CACHE_MAX_BYTES
+from .settings import PROGRESSIVE_RENDER, DRAFT_FRAME_RATE
+from .settings import PARALLEL_SECTIONS, RENDER_SECTION_WORKERS, PARALLEL_MIN_ANIMATIONS
+from .settings import WORKSPACE_DIR, WORKSPACE_MAX_COUNT, WORKSPACE_MAX_BYTES
+from .settings import ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES
+from .settings import RENDER_TIMEOUT, RENDER_CPU_SECONDS, RENDER_MAX_MEMORY_MB, RENDER_MAX_FILE_MB
+from .settings import PREFLIGHT_MAX_VIDEO_SECONDS, PREFLIGHT_DOWNGRADE_SECONDS, PREFLIGHT_PARALLEL_MIN_SECONDS
+from .settings import DRY_RUN_VALIDATION, RENDER_PROFILE
+from .settings import REPAIR_MAX_ATTEMPTS, REPAIR_MAX_SECONDS
+from .settings import LOG_LEVEL, LOG_FILE, LOG_TO_STDERR, METRICS_DIR, METRICS_FILE, METRICS_PORT
+from .settings import METRICS_HOST, METRICS_FLUSH_INTERVAL
+from .settings import MEDIA_SERVER, MEDIA_PORT, MEDIA_HOST, MEDIA_URL
+from .settings import ARTIFACT_BLOB_DIR, ARTIFACT_MAX_BYTES, ARTIFACT_GC_GRACE
+from .settings import PREVIEWS, PREVIEW_HEIGHT, PREVIEW_BITRATE_KBPS, THUMBNAIL_WIDTH, THUMBNAIL_SECONDS
+from .settings import LLM_RATE_PER_MINUTE, LLM_BURST, LLM_RATE_STATE, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+from .settings import LLM_MAX_CONNECTIONS, LLM_TIMEOUT
\ No newline at end of file
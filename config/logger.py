@@ -0,0 +1,334 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .settings import LOG_LEVEL, LOG_FILE, LOG_TO_STDERR, METRICS_DIR, METRICS_FILE
+from .settings import METRICS_HOST, METRICS_FLUSH_INTERVAL
+
+try:
+    import fcntl
+except ImportError:  # Windows: metrics of exited processes are kept in their own files
+    fcntl = None
+
+# Latency histogram buckets in seconds, from code checks (ms) up to full renders (minutes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Span fields that become Prometheus labels; anything else (scene_id, job_id) stays in the logs
+METRIC_LABELS = ("stage", "quality", "status")
+
+# Fields inherited by every span and log line in the current context
+_context = contextvars.ContextVar("log_context", default={})
+
+# This process's metrics: {(name, labels): value} and {(name, labels): [bucket counts..., sum, count]}
+_counters = {}
+_histograms = {}
+_metrics_lock = threading.Lock()
+_metrics_path = os.path.join(METRICS_DIR, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+_save_timer = None
+_save_lock = threading.Lock()  # one write at a time, so an older snapshot never wins
+
+# Metrics of exited processes, merged into one file so the totals never go down
+RETIRED_METRICS = "retired.json"
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, event and the record's fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": record.getMessage(),
+            "pid": record.process,
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger():
+    """Return the pipeline logger, configured on first use in each process"""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            logger = logging.getLogger("fyp")
+            logger.setLevel(LOG_LEVEL)
+            logger.propagate = False
+            formatter = JsonFormatter()
+            if LOG_FILE:
+                os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+                # Several processes append to the same file; WatchedFileHandler tolerates external rotation
+                handler = logging.handlers.WatchedFileHandler(LOG_FILE, encoding="utf-8")
+                handler.setFormatter(formatter)
+                logger.addHandler(handler)
+            if LOG_TO_STDERR:
+                handler = logging.StreamHandler(sys.stderr)
+                handler.setFormatter(formatter)
+                logger.addHandler(handler)
+            _logger = logger
+        return _logger
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """Write a structured log line, including the fields bound to the current context"""
+    get_logger().log(level, event, extra={"fields": {**_context.get(), **fields}})
+
+
+@contextlib.contextmanager
+def bind(**fields):
+    """Attach fields such as scene_id and quality to every span and log line inside the block"""
+    token = _context.set({**_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def increment(name, value=1, **labels):
+    """Add to a counter"""
+    with _metrics_lock:
+        key = (name, _label_key(labels))
+        _counters[key] = _counters.get(key, 0) + value
+    _schedule_save()
+
+
+def observe(name, value, **labels):
+    """Record one value in a histogram"""
+    with _metrics_lock:
+        key = (name, _label_key(labels))
+        histogram = _histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+    _schedule_save()
+
+
+@contextlib.contextmanager
+def span(stage, **fields):
+    """
+    Time a pipeline stage and export it as a JSON log line and a latency histogram.
+
+    The yielded dict can be filled with extra fields (tokens, inputs, ...)
+    before the block ends. An exception marks the span as an error and is re-raised.
+
+    Args:
+        stage (str): Stage name, e.g. "llm_request", "render" or "stitch".
+        **fields: Extra fields such as scene_id and quality.
+    """
+    record = {"stage": stage, **_context.get(), **fields}
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        record.setdefault("status", "ok")
+        record["duration_s"] = round(time.perf_counter() - start, 4)
+        labels = {key: record.get(key) for key in METRIC_LABELS}
+        observe("fyp_stage_duration_seconds", record["duration_s"], **labels)
+        get_logger().info("span", extra={"fields": record})
+
+
+def _schedule_save():
+    # Write at most once per METRICS_FLUSH_INTERVAL rather than on every update
+    global _save_timer
+    if METRICS_FLUSH_INTERVAL <= 0:
+        _save_metrics()
+        return
+    with _metrics_lock:
+        if _save_timer is None:
+            _save_timer = threading.Timer(METRICS_FLUSH_INTERVAL, _save_metrics)
+            _save_timer.daemon = True
+            _save_timer.start()
+
+
+def _save_metrics():
+    # Each process owns one file; export_metrics merges them
+    global _save_timer
+    with _save_lock:
+        with _metrics_lock:
+            if _save_timer is not None:
+                _save_timer.cancel()
+                _save_timer = None
+            if not _counters and not _histograms:
+                return
+            snapshot = _snapshot(_counters, _histograms)
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            tmp_path = f"{_metrics_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, _metrics_path)
+        except OSError:
+            pass
+
+
+# Updates since the last write would be lost when the process exits
+atexit.register(_save_metrics)
+
+
+def _merge(snapshot, counters, histograms):
+    for metric, labels, value in snapshot["counters"]:
+        key = (metric, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for metric, labels, values in snapshot["histograms"]:
+        key = (metric, tuple(map(tuple, labels)))
+        merged = histograms.setdefault(key, [0] * len(values))
+        histograms[key] = [a + b for a, b in zip(merged, values)]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshot(counters, histograms):
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [[name, list(labels), values] for (name, labels), values in histograms.items()],
+    }
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _collect_metrics():
+    """
+    Merge the metric files of every process.
+
+    Files of exited processes are folded into RETIRED_METRICS, so METRICS_DIR
+    doesn't grow with every worker ever started. A lock keeps concurrent
+    exports from counting a file twice or not at all while it is folded.
+
+    Returns:
+        tuple: (counters, histograms) keyed by (name, labels).
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with open(os.path.join(METRICS_DIR, ".lock"), "a", encoding="utf-8") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        names = sorted(name for name in os.listdir(METRICS_DIR) if name.endswith(".json"))
+
+        # Without the lock (Windows) files are never folded; a live process could still be reading them
+        pids = {name: name.split("-", 1)[0] for name in names}
+        dead = [name for name, pid in pids.items() if fcntl and pid.isdigit() and not _pid_alive(int(pid))]
+        if dead:
+            counters, histograms = {}, {}
+            for name in [RETIRED_METRICS, *dead]:
+                snapshot = _read_snapshot(os.path.join(METRICS_DIR, name))
+                if snapshot:
+                    _merge(snapshot, counters, histograms)
+            retired_path = os.path.join(METRICS_DIR, RETIRED_METRICS)
+            with open(f"{retired_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(_snapshot(counters, histograms), f)
+            os.replace(f"{retired_path}.tmp", retired_path)
+            for name in dead:
+                os.remove(os.path.join(METRICS_DIR, name))
+            names = sorted(set(names) - set(dead) | {RETIRED_METRICS})
+
+        counters, histograms = {}, {}
+        for name in names:
+            snapshot = _read_snapshot(os.path.join(METRICS_DIR, name))
+            if snapshot:
+                _merge(snapshot, counters, histograms)
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = [f'{key}="{value}"' for key, value in list(labels) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def export_metrics(path=METRICS_FILE):
+    """
+    Merge the metrics of every process into Prometheus text format.
+
+    Args:
+        path (str): Also write the text to this file (for node_exporter's textfile collector); None to skip.
+    Returns:
+        str: The metrics in Prometheus exposition format.
+    """
+    _save_metrics()  # include this process's latest updates
+    try:
+        counters, histograms = _collect_metrics()
+    except OSError:
+        counters, histograms = {}, {}
+
+    lines = []
+    for metric in sorted({metric for metric, labels in counters}):
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for metric in sorted({metric for metric, labels in histograms}):
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            for bound, count in zip(BUCKETS, values):
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {round(values[-2], 6)}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {values[-1]}")
+    text = "\n".join(lines) + "\n"
+
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    return text
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = export_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host=METRICS_HOST):
+    """Serve GET /metrics in Prometheus text format from a background thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
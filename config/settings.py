@@ -5,8 +5,120 @@ import os
 load_dotenv()
 
 API_KEY = os.getenv("MY_OPENROUTER_API_KEY") # Load environment variable
-BASE_URL = "https://openrouter.ai/api/v1"
+BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
 MODEL_NAME = "qwen/qwen3-coder:free"
 
 OUTPUT_DIR = "generated_videos"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Content-addressed cache of rendered scenes
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(".cache", "renders"))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 2 * 1024 ** 3))  # 2 GB
+
+# Exact-match cache of LLM responses
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(".cache", "llm"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 256))  # in-memory entries
+
+# Background render jobs
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(".cache", "jobs"))
+# Half the CPUs by default, leaving the other half for the sections of each scene
+RENDER_MAX_WORKERS = int(os.getenv("RENDER_MAX_WORKERS", max((os.cpu_count() or 1) // 2, 1)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))  # seconds
+
+# Durable scenes, sessions, jobs and rendered videos (SQLite)
+STORE_PATH = os.getenv("STORE_PATH", os.path.join(".cache", "store.sqlite3"))
+
+# Render backend: "subprocess" spawns the manim CLI per scene, "warm" reuses long-lived workers
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "subprocess")
+WARM_WORKERS = int(os.getenv("WARM_WORKERS", 1))  # per process
+WARM_WORKER_MAX_JOBS = int(os.getenv("WARM_WORKER_MAX_JOBS", 20))
+WARM_WORKER_MAX_RSS_MB = int(os.getenv("WARM_WORKER_MAX_RSS_MB", 1536))
+
+# Cache of stitched videos, reused when a new stitch extends a previous one
+STITCH_CACHE_DIR = os.getenv("STITCH_CACHE_DIR", os.path.join(".cache", "stitches"))
+STITCH_CACHE_MAX_BYTES = int(os.getenv("STITCH_CACHE_MAX_BYTES", 2 * 1024 ** 3))  # 2 GB
+
+# Stream LLM completions and stop early when the output is clearly not Manim code
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
+
+# Progressive rendering: a fast low-quality draft is shown while the requested quality renders
+PROGRESSIVE_RENDER = os.getenv("PROGRESSIVE_RENDER", "1") == "1"
+DRAFT_FRAME_RATE = int(os.getenv("DRAFT_FRAME_RATE", 10))
+
+# Parallel rendering of a scene's next_section() sections
+PARALLEL_SECTIONS = os.getenv("PARALLEL_SECTIONS", "1") == "1"
+# manim processes per scene: the CPUs each of RENDER_MAX_WORKERS jobs gets, and at least 2 so scenes still split
+RENDER_SECTION_WORKERS = int(os.getenv("RENDER_SECTION_WORKERS", max((os.cpu_count() or 1) // max(RENDER_MAX_WORKERS, 1), 2)))
+PARALLEL_MIN_ANIMATIONS = int(os.getenv("PARALLEL_MIN_ANIMATIONS", 4))
+
+# Persistent per-scene render workspaces, so manim can reuse its partial movie files
+WORKSPACE_DIR = os.getenv("WORKSPACE_DIR", os.path.join(".cache", "workspaces"))
+WORKSPACE_MAX_COUNT = int(os.getenv("WORKSPACE_MAX_COUNT", 50))
+WORKSPACE_MAX_BYTES = int(os.getenv("WORKSPACE_MAX_BYTES", 5 * 1024 ** 3))  # 5 GB
+
+# Compiled TeX and Text SVGs shared by every render
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(".cache", "assets"))
+ASSET_CACHE_MAX_BYTES = int(os.getenv("ASSET_CACHE_MAX_BYTES", 512 * 1024 ** 2))  # 512 MB
+
+# Resource limits for each manim render process (0 disables a limit)
+RENDER_TIMEOUT = int(os.getenv("RENDER_TIMEOUT", 300))  # wall-clock seconds
+RENDER_CPU_SECONDS = int(os.getenv("RENDER_CPU_SECONDS", 600))
+RENDER_MAX_MEMORY_MB = int(os.getenv("RENDER_MAX_MEMORY_MB", 4096))  # address space
+RENDER_MAX_FILE_MB = int(os.getenv("RENDER_MAX_FILE_MB", 2048))  # largest file written
+
+# Pre-flight limits, applied to the video length estimated from the code
+PREFLIGHT_MAX_VIDEO_SECONDS = float(os.getenv("PREFLIGHT_MAX_VIDEO_SECONDS", 300))  # reject
+PREFLIGHT_DOWNGRADE_SECONDS = float(os.getenv("PREFLIGHT_DOWNGRADE_SECONDS", 90))  # 1080p/4k -> 720p
+PREFLIGHT_PARALLEL_MIN_SECONDS = float(os.getenv("PREFLIGHT_PARALLEL_MIN_SECONDS", 10))  # render sections in parallel
+
+# Dry-run each scene (construct() without encoding) before its real render
+DRY_RUN_VALIDATION = os.getenv("DRY_RUN_VALIDATION", "1") == "1"
+
+# Profile every render: time each play()/wait() call, TeX compilation and encoding
+RENDER_PROFILE = os.getenv("RENDER_PROFILE", "0") == "1"
+
+# Automatic repair: failed renders are sent back to the LLM with their traceback
+REPAIR_MAX_ATTEMPTS = int(os.getenv("REPAIR_MAX_ATTEMPTS", 2))
+REPAIR_MAX_SECONDS = float(os.getenv("REPAIR_MAX_SECONDS", 300))  # no new attempt after this
+
+# Structured logs (JSON lines) and Prometheus-style metrics
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(".cache", "logs", "pipeline.jsonl"))  # empty to disable
+LOG_TO_STDERR = os.getenv("LOG_TO_STDERR", "0") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(".cache", "metrics"))
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(METRICS_DIR, "metrics.prom"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # serve /metrics on this port; 0 disables
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # 0.0.0.0 to let another machine scrape it
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 2.0))  # seconds between metric file writes
+
+# Media server: the browser streams videos from OUTPUT_DIR over HTTP instead of through Streamlit
+MEDIA_SERVER = os.getenv("MEDIA_SERVER", "1") == "1"  # 0 sends videos through Streamlit
+MEDIA_PORT = int(os.getenv("MEDIA_PORT", 0))  # 0 lets the OS pick a free port
+MEDIA_HOST = os.getenv("MEDIA_HOST", "127.0.0.1")  # 0.0.0.0 to serve browsers on other machines
+# Base URL as seen from the browser; empty uses the host the page was loaded from.
+# Set it when the app is behind a reverse proxy or served over HTTPS.
+MEDIA_URL = os.getenv("MEDIA_URL", "")
+
+# Videos in OUTPUT_DIR: identical files share one hardlinked blob, and videos no scene or
+# session references are deleted once the blobs outgrow the quota
+ARTIFACT_BLOB_DIR = os.getenv("ARTIFACT_BLOB_DIR", os.path.join(OUTPUT_DIR, ".blobs"))  # same file system as OUTPUT_DIR
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", 10 * 1024 ** 3))  # 10 GB
+ARTIFACT_GC_GRACE = float(os.getenv("ARTIFACT_GC_GRACE", 600))  # seconds a new video is kept before its owner claims it
+
+# Previews made after each full render: a poster, an animated thumbnail and a low-bitrate proxy clip
+PREVIEWS = os.getenv("PREVIEWS", "1") == "1"
+PREVIEW_HEIGHT = int(os.getenv("PREVIEW_HEIGHT", 360))  # proxy clip and poster
+PREVIEW_BITRATE_KBPS = int(os.getenv("PREVIEW_BITRATE_KBPS", 400))  # proxy clip ceiling
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", 240))
+THUMBNAIL_SECONDS = float(os.getenv("THUMBNAIL_SECONDS", 4))  # longer scenes are sped up to fit
+
+# LLM client: a connection pool per process, a request rate shared by every process, and retries
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", 20))  # OpenRouter's free models allow 20; 0 disables
+LLM_BURST = int(os.getenv("LLM_BURST", 4))
+LLM_RATE_STATE = os.getenv("LLM_RATE_STATE", os.path.join(".cache", "llm_rate.json"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))  # on 429, 5xx and connection errors
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 1.0))  # seconds, doubled on every retry
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 60.0))  # longer Retry-After values fail at once
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 10))  # per process
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))  # seconds per request
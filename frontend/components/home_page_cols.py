@@ -1,12 +1,10 @@
 import streamlit as st
 import uuid
 from datetime import datetime
-from backend.services.llm_response import get_llm_response
-from backend.services.clean_code import code_cleaner
-from backend.services.manim_processor import execute_manim_code
-import os
-import time
-from frontend.utils import display_video, scene_manager
+from backend.services.llm_response import invalidate_llm_response
+from backend.services.render_jobs import submit_job, JOB_QUEUED
+from frontend.utils import display_video, scene_manager, job_queue, draft_previews, persist_scene, persist_session
+from config import PROGRESSIVE_RENDER, RENDER_PROFILE
 
 class HomePageColumns:
     def __init__(self):
@@ -25,32 +23,33 @@ class HomePageColumns:
             # Subject Selection
             self.subject = st.selectbox(
                 "Select Subject Area",
-                ["Mathematics", "Computer Science", "Physics", "General"],
-                disabled=(st.session_state.current_status == "generating")
+                ["Mathematics", "Computer Science", "Physics", "General"]
             )
 
             # Animation type # Later check, animation type -> play func: input
             self.animation_type = st.selectbox(
                 "Animation Type",
-                ["Visualization", "Explanation", "Proof", "Algorithm Demo", "Graph Plot"],
-                disabled=(st.session_state.current_status == "generating")
+                ["Visualization", "Explanation", "Proof", "Algorithm Demo", "Graph Plot"]
             )
         
             # Main prompt input
             self.user_prompt = st.text_area(
                 "Describe your animation",
                 placeholder="Example: Create an animation showing the Pythagorean theorem with a right triangle, highlighting the squares on each side and demonstrating that a² + b² = c²",
-                height=100,
-                disabled=(st.session_state.current_status == "generating")
+                height=100
             )
 
             # Additional parameters
             with st.expander("Advanced Options", icon="⚙️"):
-                self.duration = st.slider("Animation Duration (seconds)", 3, 15, 8, disabled=(st.session_state.current_status == "generating"))
-                self.quality = st.selectbox("Video Quality", ["480p", "720p", "1080p"], disabled=(st.session_state.current_status == "generating"))
-                self.background_color = st.color_picker("Background Color", "#000000", disabled=(st.session_state.current_status == "generating"))
-                self.text_color = st.color_picker("Text Color", "#FFFFFF", disabled=(st.session_state.current_status == "generating"))
-                self.show_code = st.checkbox("Show Generated Code", value=False, disabled=(st.session_state.current_status == "generating"))
+                self.duration = st.slider("Animation Duration (seconds)", 3, 15, 8)
+                self.quality = st.selectbox("Video Quality", ["480p", "720p", "1080p"])
+                self.background_color = st.color_picker("Background Color", "#000000")
+                self.text_color = st.color_picker("Text Color", "#FFFFFF")
+                self.progressive = st.checkbox("Fast Draft Preview", value=PROGRESSIVE_RENDER,
+                                               help="Show a quick low-resolution draft while the full quality renders")
+                self.profile = st.checkbox("Profile Render", value=RENDER_PROFILE,
+                                           help="Time every animation to find what makes a render slow")
+                self.show_code = st.checkbox("Show Generated Code", value=False)
 
             # Generate buttons
             self.col_gen, self.col_regen = st.columns(2, gap="medium", border=True)
@@ -69,8 +68,7 @@ class HomePageColumns:
                     
     def display_generate_button(self):
         with self.col_gen:
-            if not st.button("Generate Scene", type="primary", icon='🎬', use_container_width=True,
-                         disabled=(st.session_state.current_status == "generating")):
+            if not st.button("Generate Scene", type="primary", icon='🎬', use_container_width=True):
                 return
                 
             if not self.user_prompt.strip():
@@ -80,10 +78,6 @@ class HomePageColumns:
             # Generate unique scene ID
             scene_id = str(uuid.uuid4())[:8]
 
-            # Set generating status
-            st.session_state.current_status = "generating"
-            st.session_state.processing_scene_id = scene_id
-
             # Add to scenes list
             scene_data = {
                 "id": scene_id,
@@ -95,123 +89,66 @@ class HomePageColumns:
                 "background_color": self.background_color,
                 "text_color": self.text_color,
                 "status": "generating",
+                "progressive": self.progressive,
+                "profile": self.profile,
                 "video_path": None,
+                "draft_video_path": None,
                 "code": None,
                 "error": None,
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
 
-            st.session_state.generated_scenes.append(scene_data)
+            # Queue generation and rendering in the background
+            scene_data["job_id"] = submit_job(scene_data)
+            scene_data["job_status"] = JOB_QUEUED
+
+            st.session_state.scenes.add(scene_data)
             st.session_state.generation_history.append(self.user_prompt)
+            persist_scene(scene_data)
+            persist_session()
             st.rerun()
 
     def display_regenerate_button(self):
         with self.col_regen:
-            if not st.button("Regenerate Last", icon="🔄", use_container_width=True,
-                         disabled=(st.session_state.current_status == "generating")):
+            if not st.button("Regenerate Last", icon="🔄", use_container_width=True):
                 return
             
-            if not (st.session_state.generation_history and st.session_state.generated_scenes):
+            if not (st.session_state.generation_history and st.session_state.scenes):
                 st.error("No previous prompt to regenerate!", icon="❗")
                 return
             
             # Get last scene and regenerate
-            last_scene = st.session_state.generated_scenes[-1]
-            last_scene["status"] = "generating"
-            st.session_state.current_status = "generating"
-            st.session_state.processing_scene_id = last_scene["id"]
+            last_scene = st.session_state.scenes.latest()
+            if last_scene["status"] == "generating":
+                st.error("The last scene is still being generated!", icon="❗")
+                return
+
+            # Ask the LLM again instead of replaying the cached response; the job
+            # skips the cache too, as its worker process may still hold the old one
+            invalidate_llm_response(
+                prompt=last_scene["prompt"],
+                subject=last_scene["subject"],
+                animation_type=last_scene["type"],
+                duration=last_scene["duration"],
+                background_color=last_scene["background_color"],
+                text_color=last_scene["text_color"]
+            )
+
+            st.session_state.scenes.update(last_scene, status="generating", error=None,
+                                           draft_video_path=None, draft_rejected=False)
+            last_scene["job_id"] = submit_job(last_scene, regenerate=True)
+            last_scene["job_status"] = JOB_QUEUED
+            persist_scene(last_scene)
             st.rerun()
 
     def display_right_column(self):
         with self.col2:
             st.header("🎥 Video Preview & Management", divider=True)
 
-            # Handle generation process
-            if st.session_state.current_status == "generating" and st.session_state.processing_scene_id:
-                current_scene = next(
-                    (scene for scene in st.session_state.generated_scenes 
-                     if scene["id"] == st.session_state.processing_scene_id),
-                     None
-                )
-
-                if current_scene:
-                    st.markdown("""
-                    <div class="status-box status-generating">
-                    <strong>🔄 Generating Animation...</strong><br>
-                        Converting your prompt to Manim code and rendering the animation.
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                # Process tracking
-                process_container = st.container()
-
-                with process_container:
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-
-                    # Generate code
-                    status_text.text("🤖 Generating Manim code...")
-                    progress_bar.progress(10)
-
-                    code = get_llm_response(
-                        prompt=current_scene["prompt"],
-                        subject=current_scene["subject"],
-                        animation_type=current_scene["type"],
-                        duration=current_scene["duration"],
-                        background_color=current_scene["background_color"],
-                        text_color=current_scene["text_color"]
-                    )
-                    print("Generated Code:\n", code)  # Debug log
-
-                    if code:
-                        progress_bar.progress(50)
-                        status_text.text("Code Formatting...")
-
-                        # Removing unnecessary things from code
-                        code = code_cleaner(code)
-
-                        current_scene["code"] = code
-                        progress_bar.progress(60)
-                        status_text.text("🎬 Rendering animation...")
-
-                        # Execute Manim code
-                        video_path, error = execute_manim_code(
-                            code=code,
-                            scene_id=current_scene["id"],
-                            quality=current_scene["quality"]
-                        )
-
-                        progress_bar.progress(90)
-                        
-                        if video_path and os.path.exists(video_path):
-                            current_scene["video_path"] = video_path
-                            current_scene["status"] = "completed"
-                            current_scene["error"] = None
-                            progress_bar.progress(100)
-                            status_text.text("✅ Animation completed!")
-
-                            st.session_state.current_status = "ready"
-                            st.session_state.processing_scene_id = None
-                            st.success("✅ Animation generated successfully!")
-
-                            time.sleep(1)  # Brief pause before rerun
-                            st.rerun()                            
-
-                        else:
-                            current_scene["status"] = "error"
-                            current_scene["error"] = error or "Unknown error occurred"
-
-                            st.session_state.current_status = "ready"
-                            st.session_state.processing_scene_id = None
-
-                            st.error(f"❌ Rendering failed: {current_scene['error']}")
-                            
-                    else:
-                        current_scene["status"] = "error"
-                        current_scene["error"] = "Failed to generate code"
-                        st.session_state.current_status = "ready"
-                        st.session_state.processing_scene_id = None
-                        st.error("❌ Failed to generate Manim code")
+            # Track queued and running jobs without blocking the page
+            if st.session_state.scenes.count("generating"):
+                job_queue()
+                draft_previews()
             
             # Display video or info
             display_video()
@@ -2,8 +2,10 @@ import streamlit as st
 from datetime import datetime
 import json
 import os
-import shutil
-from config import OUTPUT_DIR
+from backend.services.render_jobs import cancel_job
+from backend.services.scene_store import delete_session
+from frontend.utils import served_url
+from frontend.scene_registry import SceneRegistry
 import time
 
 def create_sidebar():
@@ -20,18 +22,26 @@ Using Manim library to create educational animations from natural language promp
 • General concepts
 """)
         
-        st.header("📊 Session Statistics")
-        completed_scenes = len([s for s in st.session_state.generated_scenes if s['status'] == 'completed'])
-        error_scenes = len([s for s in st.session_state.generated_scenes if s['status'] == 'error'])
+        sidebar_controls()
 
-        st.metric("Total Scenes", len(st.session_state.generated_scenes))
-        st.metric("Completed Scenes", completed_scenes)
-        st.metric("Failed Scenes", error_scenes)
-        st.metric("Total Prompts" , len(st.session_state.generation_history))
+@st.fragment
+def sidebar_controls():
+    # A fragment: the export and reset buttons rerun only the sidebar
+    scenes = st.session_state.scenes
+    st.header("📊 Session Statistics")
+    st.metric("Total Scenes", len(scenes))
+    st.metric("Completed Scenes", scenes.count("completed"))
+    st.metric("Failed Scenes", scenes.count("error"))
+    st.metric("Total Prompts" , len(st.session_state.generation_history))
 
-        # Export options
-        st.header("💾 Export Options")
-        if st.session_state.final_video_path and os.path.exists(st.session_state.final_video_path):
+    # Export options
+    st.header("💾 Export Options")
+    if st.session_state.final_video_path and os.path.exists(st.session_state.final_video_path):
+        # Download straight from the media server rather than loading the video into this process
+        url = served_url(st.session_state.final_video_path, download_name="generative_manim_video.mp4")
+        if url:
+            st.link_button("📥 Download Final Video", url)
+        else:
             with open(st.session_state.final_video_path, "rb") as f:
                 st.download_button(
                     label="📥 Download Final Video",
@@ -40,36 +50,44 @@ Using Manim library to create educational animations from natural language promp
                     mime="video/mp4"
                 )
 
-        if st.session_state.generated_scenes:
-            # Export scene data as JSON
+    if scenes:
+        # Build the JSON only when asked, and again only once the scenes change
+        export = st.session_state.get("scene_export")
+        if (export is None or export["version"] != scenes.version) and st.button("📄 Prepare Scene Data Export"):
             scene_data = {
-                "scenes": st.session_state.generated_scenes,
+                "scenes": scenes.to_list(),
                 "export_time": datetime.now().isoformat(),
-                "total_scenes": len(st.session_state.generated_scenes)
+                "total_scenes": len(scenes)
             }
-
-            scene_json = json.dumps(scene_data, indent=2)
+            export = st.session_state.scene_export = {
+                "version": scenes.version,
+                "data": json.dumps(scene_data, indent=2),
+                "file_name": f"scene_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            }
+        if export is not None and export["version"] == scenes.version:
             st.download_button(
                 label="📄 Export Scene Data",
-                data=scene_json,
-                file_name=f"scene_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                data=export["data"],
+                file_name=export["file_name"],
                 mime="application/json"
             )
 
-        # Clear all data
-        st.header("🗑️ Reset")
-        if st.button("Clear All Data", type="secondary"):
-            # Clean up video files
-            shutil.rmtree(OUTPUT_DIR)
+    # Clear all data
+    st.header("🗑️ Reset")
+    if st.button("Clear All Data", type="secondary"):
+        # Stop any queued or running jobs
+        for scene in scenes.with_status("generating"):
+            if scene.get("job_id"):
+                cancel_job(scene["job_id"])
 
-            # Reset session state
-            st.session_state.current_status = "ready"
-            st.session_state.processing_scene_id = None
-            st.session_state.generated_scenes = []
-            st.session_state.generation_history = []
-            st.session_state.final_video_path = None
-            st.session_state.selection_order = []
+        # Reset session state and its saved copy; the videos are released for garbage collection
+        delete_session(st.session_state.session_id)
+        st.session_state.scenes = SceneRegistry()
+        st.session_state.generation_history = []
+        st.session_state.final_video_path = None
+        st.session_state.selection_order = []
+        st.session_state.pop("scene_export", None)
 
-            st.success("✅ All data cleared!")
-            time.sleep(1)
-            st.rerun()
\ No newline at end of file
+        st.success("✅ All data cleared!")
+        time.sleep(1)
+        st.rerun()
@@ -1,26 +1,55 @@
 import streamlit as st
-from frontend.utils import apply_custom_css
+from frontend.utils import apply_custom_css, reattach_scenes
+from frontend.scene_registry import SceneRegistry
 from frontend.components.home_page_cols import create_home_page_cols
 from frontend.components.sidebar import create_sidebar
 from frontend.components.footer import create_footer
+from backend.services.render_jobs import resume_interrupted_jobs
+from backend.services.scene_store import load_session
+from backend.services.media_server import start_media_server
+from config.logger import start_metrics_server
+from config import METRICS_PORT, MEDIA_SERVER
+import uuid
 
 # Initialize session states
 def initialize_session_states():
-    if 'current_status' not in st.session_state:
-        st.session_state.current_status = "ready"
-    if 'processing_scene_id' not in st.session_state:
-        st.session_state.processing_scene_id = None
-    if 'generated_scenes' not in st.session_state:
-        st.session_state.generated_scenes = []
-    if 'generation_history' not in st.session_state:
-        st.session_state.generation_history = []
-    if 'final_video_path' not in st.session_state:
-        st.session_state.final_video_path = None
-    if "selection_order" not in st.session_state:
-        st.session_state.selection_order = []
+    if "session_id" in st.session_state:
+        return
+
+    # The session ID in the URL brings a reloaded or reconnected browser back to its scenes
+    session_id = st.query_params.get("session") or uuid.uuid4().hex[:12]
+    st.query_params["session"] = session_id
+    saved = load_session(session_id)
+
+    st.session_state.session_id = session_id
+    st.session_state.scenes = SceneRegistry(reattach_scenes(saved["scenes"]))
+    st.session_state.generation_history = saved["generation_history"]
+    st.session_state.final_video_path = saved["final_video_path"]
+    st.session_state.selection_order = saved["selection_order"]
+    # Restore the stitch checkboxes, or the first run would deselect every scene
+    for scene_id in saved["selection_order"]:
+        st.session_state[f"scene_select_{scene_id}"] = True
         
+@st.cache_resource
+def start_metrics_endpoint():
+    # Once per server process, not once per rerun
+    return start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+
+@st.cache_resource
+def start_media_endpoint():
+    # Once per server process: videos are streamed by the media server, not through Streamlit
+    return start_media_server() if MEDIA_SERVER else None
+
+@st.cache_resource
+def resume_jobs():
+    # Once per server process: pick up the jobs a previous server left unfinished
+    return resume_interrupted_jobs()
+
 def run():
+    resume_jobs()
     initialize_session_states()
+    start_metrics_endpoint()
+    start_media_endpoint()
 
     # Streamlit page configuration
     st.set_page_config(
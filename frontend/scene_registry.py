@@ -0,0 +1,68 @@
+class SceneRegistry:
+    """
+    The scenes of one session in creation order, indexed by ID and by status.
+
+    Lookups by ID and status counts are O(1). Status changes must go through
+    update() so the status index stays correct; version changes on every
+    add, update and removal, so derived data (such as an export) can tell
+    when it is stale.
+    """
+
+    def __init__(self, scenes=()):
+        self._scenes = {}
+        self._by_status = {}
+        self.version = 0
+        for scene in scenes:
+            self.add(scene)
+
+    def __len__(self):
+        return len(self._scenes)
+
+    def __iter__(self):
+        # Iterate over a copy so scenes can be removed inside the loop
+        return iter(list(self._scenes.values()))
+
+    def __contains__(self, scene_id):
+        return scene_id in self._scenes
+
+    def get(self, scene_id):
+        """Return the scene with this ID, or None"""
+        return self._scenes.get(scene_id)
+
+    def count(self, status):
+        """Number of scenes with this status"""
+        return len(self._by_status.get(status, ()))
+
+    def with_status(self, status):
+        """Scenes with this status, in the order they reached it"""
+        return list(self._by_status.get(status, {}).values())
+
+    def latest(self, status=None):
+        """The scene that most recently reached this status (or was added), or None"""
+        scenes = self._by_status.get(status, {}) if status else self._scenes
+        return next(reversed(scenes.values()), None)
+
+    def add(self, scene):
+        self._scenes[scene["id"]] = scene
+        self._by_status.setdefault(scene["status"], {})[scene["id"]] = scene
+        self.version += 1
+
+    def update(self, scene, **fields):
+        """Change a scene's fields, moving it to its new status if that changed"""
+        old_status = scene["status"]
+        scene.update(fields)
+        if scene["status"] != old_status:
+            del self._by_status[old_status][scene["id"]]
+            self._by_status.setdefault(scene["status"], {})[scene["id"]] = scene
+        self.version += 1
+
+    def remove(self, scene_id):
+        """Remove and return a scene, or None if it is unknown"""
+        scene = self._scenes.pop(scene_id, None)
+        if scene is not None:
+            del self._by_status[scene["status"]][scene_id]
+            self.version += 1
+        return scene
+
+    def to_list(self):
+        return list(self._scenes.values())
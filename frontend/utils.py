@@ -2,6 +2,28 @@ import streamlit as st
 import os
 import time
 from backend.services.stitch_videos import video_stitcher
+from backend.services.media_server import media_url
+from backend.services.render_cache import render_cache_key, get_cached_render
+from backend.services.scene_store import save_scene, save_session, delete_scene, release_artifact, get_artifacts
+from backend.services.artifact_store import publish
+from backend.services.render_jobs import (
+    poll_job, cancel_job, forget_job,
+    JOB_QUEUED, JOB_GENERATING, JOB_REPAIRING, JOB_VALIDATING, JOB_DRAFT, JOB_RENDERING, JOB_DONE, JOB_CANCELLED
+)
+from config import OUTPUT_DIR, JOB_POLL_INTERVAL, THUMBNAIL_WIDTH
+
+# Progress bar value and label for each job state
+JOB_PROGRESS = {
+    JOB_QUEUED: (0, "⏳ Queued..."),
+    JOB_GENERATING: (10, "🤖 Generating Manim code..."),
+    JOB_REPAIRING: (20, "🛠️ Fixing the code..."),
+    JOB_VALIDATING: (30, "🧪 Checking the scene runs..."),
+    JOB_DRAFT: (40, "⚡ Rendering quick draft..."),
+    JOB_RENDERING: (60, "🎬 Rendering animation..."),
+}
+
+# Where the progress bar ends once each render stage completes
+RENDER_PROGRESS_END = {JOB_VALIDATING: 40, JOB_DRAFT: 60, JOB_RENDERING: 100}
 
 # Custom CSS for better styling
 def apply_custom_css():
@@ -38,31 +60,218 @@ def apply_custom_css():
 </style>
 """, unsafe_allow_html=True)
     
+def served_url(path, download_name=None):
+    """Media server URL of a file for this browser, or None if it can't be served"""
+    return media_url(path, download_name=download_name, page_host=st.context.headers.get("Host"))
+
+def video_source(path):
+    """Media server URL for a video, so the browser streams it; the path itself if it can't be served"""
+    return served_url(path) or path
+
+def preview_source(scene, name):
+    """Source of a scene's "poster", "thumbnail" or "proxy" preview, or None if it wasn't made"""
+    path = ((scene.get("render_stats") or {}).get("previews") or {}).get(name)
+    if path and os.path.exists(path):
+        return video_source(path)
+    return None
+
+def persist_scene(scene):
+    """Save a scene record so it survives a restart or reconnect"""
+    save_scene(st.session_state.session_id, scene)
+
+def persist_session():
+    """Save the prompt history, stitch selection and stitched video of this session"""
+    save_session(
+        st.session_state.session_id,
+        st.session_state.generation_history,
+        st.session_state.selection_order,
+        st.session_state.final_video_path
+    )
+
+def _find_video(scene):
+    # The recorded path, another recorded render of the scene, or the render cache
+    if scene.get("video_path") and os.path.exists(scene["video_path"]):
+        return scene["video_path"]
+    for artifact in get_artifacts(scene["id"]):
+        if artifact["kind"] == "video" and os.path.exists(artifact["path"]):
+            return artifact["path"]
+    if scene.get("code") and scene.get("video_path"):
+        quality = (scene.get("preflight") or {}).get("quality", scene["quality"])
+        video_path = get_cached_render(render_cache_key(scene["code"], quality), scene["video_path"])
+        if video_path:
+            # Collected from the output directory but still cached: the scene owns it again
+            publish(video_path, video_path, "video", scene_id=scene["id"])
+        return video_path
+    return None
+
+def reattach_scenes(scenes):
+    """
+    Check scenes restored from the store against the videos and jobs that still exist.
+
+    Finished videos are re-attached instead of being rendered again; scenes
+    whose job was lost are marked as failed so they can be regenerated.
+    """
+    for scene in scenes:
+        if scene["status"] == "completed" or (scene["status"] == "generating" and not
+                                              (scene.get("job_id") and poll_job(scene["job_id"]))):
+            video_path = _find_video(scene)
+            if video_path:
+                scene.update(video_path=video_path, status="completed", error=None)
+            else:
+                scene.update(status="error", error="The video is missing; regenerate the scene.")
+            persist_scene(scene)
+    return scenes
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def job_queue():
+    """Poll background jobs and show their progress, rerunning the app when one finishes"""
+    scenes = st.session_state.scenes
+    finished = False
+    for scene in scenes.with_status("completed"):
+        if not scene.get("previews_pending"):
+            continue
+        # The video is shown already; its job is kept until the previews are made
+        job = poll_job(scene["job_id"]) if scene.get("job_id") else None
+        if job and job.get("previews_pending"):
+            continue
+        if job and job.get("render_stats"):
+            scene["render_stats"] = job["render_stats"]
+        scene["previews_pending"] = False
+        persist_scene(scene)
+        if job:
+            forget_job(scene["job_id"])
+        finished = True
+
+    active_scenes = [scene for scene in scenes.with_status("generating") if scene.get("job_id")]
+    if not active_scenes:
+        if finished:
+            st.rerun()
+        return
+
+    st.markdown(f"""
+    <div class="status-box status-generating">
+    <strong>🔄 Generating {len(active_scenes)} Animation{'s' if len(active_scenes) > 1 else ''}...</strong><br>
+        Converting your prompts to Manim code and rendering the animations.
+    </div>
+    """, unsafe_allow_html=True)
+
+    drafts_changed = False
+    for scene in active_scenes:
+        job = poll_job(scene["job_id"]) or {"status": JOB_QUEUED}
+        scene["job_status"] = job["status"]
+        if job.get("code"):
+            scene["code"] = job["code"]
+        if job.get("draft_video_path"):
+            scene["draft_video_path"] = job["draft_video_path"]
+        if job.get("render_stats"):
+            scene["render_stats"] = job["render_stats"]
+        if job.get("preflight"):
+            scene["preflight"] = job["preflight"]
+
+        if job["status"] == JOB_DONE:
+            scenes.update(scene, video_path=job["video_path"], status="completed", error=None,
+                          previews_pending=bool(job.get("previews_pending")))
+        elif job["status"] in JOB_PROGRESS:
+            progress, label = JOB_PROGRESS[job["status"]]
+            if job.get("progress") is not None:
+                # Real render progress fills the span up to the next stage
+                progress += int(job["progress"] * (RENDER_PROGRESS_END[job["status"]] - progress))
+                label = f"{label} {int(job['progress'] * 100)}%"
+            elif job.get("progress_animation") is not None:
+                label = f"{label} (animation {job['progress_animation'] + 1})"
+            elif job["status"] == JOB_REPAIRING:
+                label = f"{label} (attempt {job.get('repair_attempt', 1)})"
+            col_progress, col_cancel = st.columns([0.85, 0.15])
+            with col_progress:
+                st.progress(progress, text=f"Scene {scene['id']}: {label}")
+            with col_cancel:
+                if st.button("✖️", key=f"cancel_{scene['id']}", help="Cancel Scene"):
+                    cancel_job(scene["job_id"])
+            if job["status"] == JOB_REPAIRING and job.get("last_error"):
+                st.caption(f"Render failed: {job['last_error'].splitlines()[-1][:120]}")
+            if job.get("partial_code"):
+                # Show the tail of the code as it streams in
+                st.code(job["partial_code"][-600:], language="python")
+            # The draft is shown by draft_previews(), outside this fragment, so polls don't send it again
+            draft = scene.get("draft_video_path") if job["status"] == JOB_RENDERING else None
+            if draft != scene.get("draft_shown"):
+                scene["draft_shown"] = draft
+                drafts_changed = True
+            continue
+        elif job["status"] == JOB_CANCELLED:
+            scenes.update(scene, status="error",
+                          error="Draft rejected" if scene.get("draft_rejected") else "Cancelled by user")
+        else:
+            scenes.update(scene, status="error", error=job.get("error") or "Unknown error occurred")
+
+        scene.pop("draft_shown", None)
+        persist_scene(scene)
+        if not scene.get("previews_pending"):
+            forget_job(scene["job_id"])
+        finished = True
+
+    if finished or drafts_changed:
+        st.rerun()
+
+def draft_previews():
+    """Show the draft of each scene whose requested quality is rendering, with a button to reject it"""
+    for scene in st.session_state.scenes.with_status("generating"):
+        draft = scene.get("draft_shown")
+        if not draft or not os.path.exists(draft):
+            continue
+        st.caption(f"⚡ Scene {scene['id']} draft")
+        st.video(video_source(draft))
+        if st.button("👎 Reject Draft", key=f"reject_{scene['id']}", help="Stop the full-quality render"):
+            scene["draft_rejected"] = True
+            cancel_job(scene["job_id"])
+
 def display_video():
     if st.session_state.final_video_path and os.path.exists(st.session_state.final_video_path):
-        st.video(st.session_state.final_video_path)
+        st.video(video_source(st.session_state.final_video_path))
         st.success("🎬 Final stitched video")
-    elif any(scene["status"] == "completed" and scene.get("video_path") for scene in st.session_state.generated_scenes):
+    elif st.session_state.scenes.count("completed"):
         # Show the most recent completed scene
-        latest_scene = next(
-             (scene for scene in reversed(st.session_state.generated_scenes)
-            if scene["status"] == "completed" and scene.get("video_path")),
-            None
-        )
-        if latest_scene and os.path.exists(latest_scene["video_path"]):
-            st.video(latest_scene["video_path"])
+        latest_scene = st.session_state.scenes.latest("completed")
+        if latest_scene.get("video_path") and os.path.exists(latest_scene["video_path"]):
+            st.video(video_source(latest_scene["video_path"]))
             st.info(f"🎬 Latest Scene: {latest_scene['prompt'][:50]}{'...' if len(latest_scene['prompt']) > 50 else ''}")
         else:
             st.info("🎬 Your generated videos will appear here.")
     else:   
         st.info("🎬 Your generated video will appear here.")
 
+def display_profile(profile):
+    """Show where a profiled render spent its time, slowest animations first"""
+    st.caption(
+        f"🔬 {'' if profile['complete'] else 'Stopped after '}{profile['total_seconds']:.1f}s: "
+        f"TeX {profile['tex_seconds']:.1f}s • text {profile['text_seconds']:.1f}s • "
+        f"frames {profile['frame_seconds']:.1f}s • encoding {profile['encode_seconds']:.1f}s • "
+        f"other {profile['other_seconds']:.1f}s"
+    )
+    st.dataframe(
+        [
+            {
+                "#": entry["index"],
+                "Animation": entry["label"],
+                "Seconds": entry["seconds"],
+                "Frames": entry["frames"],
+                "Cached": entry["cached"],
+            }
+            for entry in profile["animations"]
+        ],
+        hide_index=True,
+        use_container_width=True
+    )
+
+@st.fragment
 def scene_manager(show_code=False):
-    if not st.session_state.generated_scenes:
+    # A fragment: ticking a scene or opening a preview reruns only the scene list
+    scenes = st.session_state.scenes
+    if not scenes:
         return  # No scenes to manage
     st.subheader("🎞️ Generated Scenes")
     with st.expander("View Generated Scenes", expanded=False):
-        for idx, scene in enumerate(st.session_state.generated_scenes):
+        for scene in scenes:
             with st.container():
                 col_select, col_info, col_actions = st.columns([0.1, 0.6, 0.3])
                 with col_select:
@@ -73,9 +282,11 @@ def scene_manager(show_code=False):
                         if checked and scene["id"] not in st.session_state.selection_order:
                             # Add when selected
                             st.session_state.selection_order.append(scene["id"])
+                            persist_session()
                         elif not checked and scene["id"] in st.session_state.selection_order:
                             # Remove when deselected
                             st.session_state.selection_order.remove(scene["id"])
+                            persist_session()
 
                 with col_info:
                     if scene["status"] == "completed":
@@ -87,9 +298,42 @@ def scene_manager(show_code=False):
                     else:
                         status_icon = "⏳"
                     st.write(f"{status_icon} **Scene {scene['id']}** ({scene['type']})")
+                    if scene["status"] == "completed":
+                        thumbnail = preview_source(scene, "thumbnail") or preview_source(scene, "poster")
+                        if thumbnail:
+                            st.image(thumbnail, width=THUMBNAIL_WIDTH)
                     with st.expander("Show Details"):
                         st.write(f"_{scene['prompt'][:60]}{'...' if len(scene['prompt']) > 60 else ''}_")
                         st.caption(f"{scene['subject']} • {scene['duration']}s • {scene['timestamp']}")
+                        report = scene.get("preflight")
+                        if report:
+                            approx = "" if report["exact"] else "~"
+                            st.caption(f"⏱️ {approx}{report['video_seconds']:g}s of video • {report['animations']} animations")
+                            if report.get("downgraded"):
+                                st.caption(f"⬇️ Rendered at {report['quality']} to keep the queue moving")
+                        render_stats = scene.get("render_stats")
+                        if render_stats and render_stats.get("dry_run_seconds") is not None:
+                            timings = f"🧪 Dry run {render_stats['dry_run_seconds']:.1f}s"
+                            if render_stats.get("render_seconds") is not None:
+                                timings += f" • full render {render_stats['render_seconds']:.1f}s"
+                            st.caption(timings)
+                        if render_stats and render_stats.get("time_to_video") is not None:
+                            repairs = render_stats.get("repair_attempts", 0)
+                            st.caption(
+                                f"⏲️ {render_stats['time_to_video']:.1f}s to video"
+                                + (f" • {repairs} automatic fix{'es' if repairs > 1 else ''}" if repairs else "")
+                            )
+                        if render_stats and render_stats.get("cache_hit"):
+                            st.caption("♻️ Served from the render cache")
+                        elif render_stats:
+                            st.caption(
+                                f"♻️ {render_stats['partial_movies_reused']} animations reused • "
+                                f"{render_stats['partial_movies_rendered']} re-rendered • "
+                                f"{render_stats.get('tex_hits', 0)}/{render_stats.get('tex_hits', 0) + render_stats.get('tex_misses', 0)} formulas cached"
+                            )
+                        profile = render_stats.get("profile") if render_stats else None
+                        if profile:
+                            display_profile(profile)
                         if scene["status"] == "error" and scene.get("error"):
                             st.error(f"Error: {scene['error'][:100]}{'...' if len(scene['error']) > 100 else ''}")
 
@@ -105,23 +349,23 @@ def scene_manager(show_code=False):
                         if st.button("👁️", key=f"btn_{scene['id']}", help="Preview Scene"):
                             st.session_state[key_preview] = not st.session_state[key_preview]
                         
-                        # Show video only if state is True
+                        # Show video only if state is True: the small proxy clip, the full video on request
                         if st.session_state[key_preview]:
-                            if os.path.exists(scene["video_path"]):
-                                st.video(scene["video_path"])
+                            proxy = preview_source(scene, "proxy")
+                            if proxy and not st.checkbox("Full quality", key=f"full_{scene['id']}"):
+                                st.video(proxy)
+                            elif os.path.exists(scene["video_path"]):
+                                st.video(video_source(scene["video_path"]))
 
                     if st.button("🗑️", key=f"delete_{scene['id']}", help="Delete Scene"):
-                        # Delete video file if exists
-                        if scene.get("video_path") and os.path.exists(scene["video_path"]):
-                            try:
-                                os.remove(scene["video_path"])
-                            except Exception as e:
-                                st.error(f"Error deleting video: {e}")
-                            # Remove from session state
-                            st.session_state.generated_scenes.pop(idx)
-                            st.success("Scene deleted.")
-                            time.sleep(1)
-                            st.rerun()
+                        if scene["status"] == "generating" and scene.get("job_id"):
+                            cancel_job(scene["job_id"])
+                        # Remove from session state and the store; the video is released for garbage collection
+                        scenes.remove(scene["id"])
+                        delete_scene(scene["id"])
+                        st.success("Scene deleted.")
+                        time.sleep(1)
+                        st.rerun()
 
                 # Show code if requested
                 if show_code and scene.get("code"):
@@ -131,8 +375,7 @@ def scene_manager(show_code=False):
     # Video stitching section
     completed_selected = [
         sid for sid in st.session_state.selection_order
-        if any(s["id"] == sid and s["status"] == "completed"
-               for s in st.session_state.generated_scenes)
+        if scenes.get(sid) and scenes.get(sid)["status"] == "completed"
     ]
 
 
@@ -153,9 +396,7 @@ def scene_manager(show_code=False):
     with col_order:
         st.write("**Scene Order:**")
         for scene_id in completed_selected:
-            scene = next((s for s in st.session_state.generated_scenes if s["id"] == scene_id), None)
-            if scene:
-                st.write(f"• Scene {scene_id}: {scene['type']}")
+            st.write(f"• Scene {scene_id}: {scenes.get(scene_id)['type']}")
 
     # Stitch button
     if st.button("🔗 Stitch Selected Scenes", type="primary", use_container_width=True):
@@ -164,22 +405,31 @@ def scene_manager(show_code=False):
                 # Get video paths
                 video_paths = []
                 for scene_id in completed_selected:
-                    scene = next((s for s in st.session_state.generated_scenes if s["id"] == scene_id), None)
-                    if scene and scene.get("video_path") and os.path.exists(scene["video_path"]):
+                    scene = scenes.get(scene_id)
+                    if scene.get("video_path") and os.path.exists(scene["video_path"]):
                         video_paths.append(scene["video_path"])
 
                 if not len(video_paths) > 1:
                     st.error("Need at least 2 valid videos to stitch.")
                     return
-                output_path = f"generated_videos/final_video_{int(time.time())}.mp4"
-                success, error = video_stitcher(video_paths, output_path, transition_effect.lower())
+                output_path = os.path.join(OUTPUT_DIR, f"final_video_{int(time.time())}.mp4")
+                # A stitch in the same second must not write into the previous one's blob
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                success, message = video_stitcher(video_paths, output_path, transition_effect.lower())
 
                 if not success:
-                    st.error(f"❌ Stitching failed: {error}")
+                    st.error(f"❌ Stitching failed: {message}")
                     return
                 
+                # Keep one stitched video per session; the previous one can be collected
+                previous_path = st.session_state.final_video_path
+                publish(output_path, output_path, "final", session_id=st.session_state.session_id)
+                if previous_path and previous_path != output_path:
+                    release_artifact(previous_path)
                 st.session_state.final_video_path = output_path
-                st.success("✅ Videos stitched successfully!")
+                persist_session()
+                st.success(f"✅ Videos stitched successfully! {message}")
                 time.sleep(1)
                 st.rerun()
 
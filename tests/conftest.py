@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# Make the project root and this directory importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_openai_server import StubOpenAIServer
+
+
+@pytest.fixture
+def stub_llm_server():
+    """Start a local OpenAI-compatible server; set .response before calling it"""
+    with StubOpenAIServer() as server:
+        yield server
@@ -0,0 +1,157 @@
+"""A local OpenAI-compatible chat completions server for tests and benchmarks"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _usage(text):
+    # About four characters per token
+    return {"prompt_tokens": 0, "completion_tokens": len(text) // 4, "total_tokens": len(text) // 4}
+
+
+class StubOpenAIServer:
+    """
+    Serve canned chat completions, streamed (SSE) or not, on a local port.
+
+    Args:
+        response (str or callable): Completion text, or a function taking the
+            request body and returning the text.
+        chunk_size (int): Characters per streamed chunk.
+        delay (float): Seconds to sleep before each streamed chunk.
+
+    Append (status, retry_after) pairs to .failures to answer the next
+    requests with errors, e.g. (429, "1") for a rate limit.
+    """
+
+    def __init__(self, response="", chunk_size=16, delay=0.0):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.requests = []
+        self.failures = []
+        self.chunks_sent = 0
+        self.aborted = 0
+        self._done = threading.Event()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def wait_for_request(self, timeout=5):
+        """Block until the current request has finished or been aborted by the client"""
+        return self._done.wait(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _text_for(self, body):
+        return self.response(body) if callable(self.response) else self.response
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests.append(body)
+                server._done.clear()
+                if server.failures:
+                    self._fail(*server.failures.pop(0))
+                    server._done.set()
+                    return
+                try:
+                    if body.get("stream"):
+                        self._stream(body)
+                    else:
+                        self._complete(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    server.aborted += 1
+                finally:
+                    server._done.set()
+
+            def _fail(self, status, retry_after=None):
+                payload = json.dumps({"error": {"message": f"stub error {status}", "code": status}}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if retry_after is not None:
+                    self.send_header("Retry-After", retry_after)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _complete(self, body):
+                text = server._text_for(body)
+                payload = json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": _usage(text),
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_event(self, body, delta, finish_reason=None, usage=None):
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+                }
+                if usage:
+                    chunk["usage"] = usage
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def _stream(self, body):
+                text = server._text_for(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                self._send_event(body, {"role": "assistant", "content": ""})
+                for start in range(0, len(text), server.chunk_size):
+                    if server.delay:
+                        time.sleep(server.delay)
+                    self._send_event(body, {"content": text[start:start + server.chunk_size]})
+                    server.chunks_sent += 1
+                self._send_event(body, {}, finish_reason="stop")
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    # As OpenAI does: a last chunk with the usage and no choices
+                    self._send_event(body, None, usage=_usage(text))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,992 @@
+import importlib
+import json
+import os
+import pytest
+from openai import OpenAI
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+import urllib.request
+from backend.api import llm_client
+from config import logger
+from backend.services import artifact_store, asset_cache, llm_cache, llm_response, previews, render_cache, render_jobs
+from backend.services import manim_processor, scene_store
+from backend.services import stitch_cache, stitch_videos
+from backend.services.clean_code import IncrementalCodeChecker, code_cleaner
+from backend.services.parallel_render import find_sections, plan_sections
+from backend.services.preflight import preflight, plan_render
+from backend.services.render_profiler import load_profile, summarize_profile
+from backend.services import media_server, render_runner, workspace
+from backend.services.media_server import parse_range, start_media_server, media_url
+from backend.utils import evict_lru, get_fallback_code, trim_traceback
+from frontend.scene_registry import SceneRegistry
+
+SCENE_CODE = '''from manim import *
+
+class CircleScene(Scene):
+    def construct(self):
+        circle = Circle(color=BLUE)
+        self.play(Create(circle))
+        self.wait(1)
+'''
+
+PROSE = "Sure! Here is an explanation of how you could animate the Pythagorean theorem. " * 20
+
+
+def feed_all(checker, text, chunk_size=16):
+    for start in range(0, len(text), chunk_size):
+        ok, reason = checker.feed(text[start:start + chunk_size])
+        if not ok:
+            return ok, reason
+    return True, None
+
+
+def test_checker_accepts_streamed_scene():
+    checker = IncrementalCodeChecker()
+    assert feed_all(checker, SCENE_CODE) == (True, None)
+    assert checker.finish() == (True, None)
+
+
+def test_checker_accepts_fenced_scene():
+    checker = IncrementalCodeChecker()
+    assert feed_all(checker, f"```python\n{SCENE_CODE}```") == (True, None)
+    assert checker.finish() == (True, None)
+
+
+def test_checker_aborts_on_prose():
+    checker = IncrementalCodeChecker()
+    ok, reason = feed_all(checker, PROSE)
+    assert not ok
+    assert "not Python code" in reason
+    assert len(checker.buffer) < 200
+
+
+def test_checker_aborts_without_scene_class():
+    checker = IncrementalCodeChecker(scene_check_chars=300)
+    ok, reason = feed_all(checker, "import numpy as np\n\n" + "x = np.arange(10)\n" * 40)
+    assert not ok
+    assert "Scene subclass" in reason
+
+
+def test_checker_accepts_long_helpers_before_a_derived_scene():
+    helpers = "".join(f"def helper_{i}(x):\n    return x * {i}  # a helper the scene uses\n\n\n" for i in range(60))
+    code = SCENE_CODE.replace("class CircleScene(Scene):", helpers + "class BaseScene(Scene):\n    pass\n\n\nclass CircleScene(BaseScene):")
+    checker = IncrementalCodeChecker()
+    assert len(code) > 4000
+    assert feed_all(checker, code) == (True, None)
+    assert checker.finish() == (True, None)
+
+
+def test_checker_finish_requires_a_scene():
+    checker = IncrementalCodeChecker()
+    assert feed_all(checker, "from manim import *\n\nclass Helper(VGroup):\n    pass\n") == (True, None)
+    assert checker.finish() == (False, "No Scene subclass with a construct() method found.")
+
+
+def test_checker_aborts_on_early_syntax_error():
+    checker = IncrementalCodeChecker()
+    broken = SCENE_CODE.replace("circle = Circle(color=BLUE)", "circle = = Circle(color=BLUE)")
+    ok, reason = feed_all(checker, broken + "\n".join(f"        self.wait({i})" for i in range(20)) + "\n")
+    assert not ok
+    assert "Syntax Error" in reason
+
+
+@pytest.fixture
+def stub_client(stub_llm_server, monkeypatch):
+    monkeypatch.setattr(llm_response, "client", OpenAI(api_key="test", base_url=stub_llm_server.url))
+    monkeypatch.setattr(llm_response, "rate_limiter", None)
+    return stub_llm_server
+
+
+def ask(**kwargs):
+    return llm_response.get_llm_response(
+        prompt="Draw a circle",
+        subject="Mathematics",
+        animation_type="Visualization",
+        duration=5,
+        background_color="#000000",
+        text_color="#FFFFFF",
+        use_cache=False,
+        **kwargs
+    )
+
+
+def test_streaming_response_reports_tokens(stub_client, metrics):
+    stub_client.response = SCENE_CODE
+    buffers = []
+
+    assert ask(stream=True, on_token=buffers.append) == SCENE_CODE
+    assert len(buffers) > 1
+    assert buffers[-1] == SCENE_CODE
+    assert stub_client.requests[-1]["stream"] is True
+    # Tokens as reported by the provider's usage, not the number of chunks
+    assert metrics._counters[("fyp_llm_tokens_total", ())] == len(SCENE_CODE) // 4
+
+
+def test_streaming_aborts_prose_early(stub_client):
+    stub_client.response = PROSE
+    stub_client.delay = 0.005
+    total_chunks = -(-len(PROSE) // stub_client.chunk_size)
+
+    assert ask(stream=True) == get_fallback_code()
+    stub_client.wait_for_request()
+    assert stub_client.chunks_sent < total_chunks
+
+
+def test_non_streaming_response(stub_client):
+    stub_client.response = SCENE_CODE
+    assert ask(stream=False) == SCENE_CODE
+    assert not stub_client.requests[-1].get("stream")
+
+
+def test_repair_sends_failing_code_and_error(stub_client):
+    stub_client.response = SCENE_CODE
+    broken = SCENE_CODE.replace("Create(circle)", "Create(circle.foo())")
+    error = "AttributeError: 'Circle' object has no attribute 'foo'"
+
+    assert ask(stream=False, repair_context={"code": broken, "error": error}) == SCENE_CODE
+    messages = stub_client.requests[-1]["messages"]
+    assert [message["role"] for message in messages] == ["system", "user", "assistant", "user"]
+    assert messages[2]["content"] == broken
+    assert error in messages[3]["content"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_rate_limiter_spreads_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_client, "time", FakeClock())
+    limiter = llm_client.RateLimiter(rate=1.0, burst=2, path=str(tmp_path / "rate.json"))
+
+    assert [limiter.acquire() for _ in range(4)] == [0, 0, 1.0, 1.0]  # a burst, then one per second
+    limiter.pause(5)
+    assert limiter.acquire() == 6.0  # the pause, then the steady rate again
+
+
+def test_rate_limited_requests_are_retried(stub_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.01)
+    limiter = llm_client.RateLimiter(rate=100.0, burst=5, path=str(tmp_path / "rate.json"))
+    monkeypatch.setattr(llm_response, "rate_limiter", limiter)
+    # Retries are left to create_chat_completion, as in get_openai_client
+    monkeypatch.setattr(llm_response, "client", OpenAI(api_key="test", base_url=stub_client.url, max_retries=0))
+    stub_client.response = SCENE_CODE
+    stub_client.failures += [(429, "0.05"), (503, None)]
+
+    assert ask(stream=False) == SCENE_CODE
+    assert len(stub_client.requests) == 3
+    with open(limiter.path) as f:
+        assert json.load(f)["blocked_until"] > 0  # the 429 held back every process
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DIR", str(tmp_path / "llm"))
+    monkeypatch.setattr(llm_cache, "_memory", OrderedDict())
+    return llm_cache
+
+
+def test_identical_concurrent_requests_share_one_call(stub_client, cache):
+    stub_client.response = SCENE_CODE
+    stub_client.delay = 0.01
+    results = []
+
+    def ask_cached():
+        results.append(llm_response.get_llm_response(
+            prompt="Draw a square", subject="Mathematics", animation_type="Visualization", duration=5,
+            background_color="#000000", text_color="#FFFFFF", stream=True
+        ))
+
+    threads = [threading.Thread(target=ask_cached) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [SCENE_CODE] * 4
+    assert len(stub_client.requests) == 1
+
+
+def test_cache_falls_back_to_disk(cache):
+    cache.store_response("k", SCENE_CODE)
+    cache._memory.clear()  # as in a new process
+    assert cache.get_cached_response("k") == SCENE_CODE
+    assert "k" in cache._memory
+
+
+def test_cache_entries_expire(cache, monkeypatch):
+    cache.store_response("k", SCENE_CODE)
+    assert cache.get_cached_response("k", ttl=60) == SCENE_CODE
+    clock = FakeClock()
+    clock.now = time.time() + 61
+    monkeypatch.setattr(llm_cache, "time", clock)
+    assert cache.get_cached_response("k", ttl=60) is None
+    assert not os.path.exists(cache._disk_path("k"))
+
+
+def test_memory_tier_evicts_least_recently_used(cache, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_ENTRIES", 2)
+    for key in ("a", "b"):
+        cache.store_response(key, key)
+    cache.get_cached_response("a")
+    cache.store_response("c", "c")
+    assert list(cache._memory) == ["a", "c"]
+    assert cache.get_cached_response("b") == "b"  # still on disk
+
+
+def test_invalidated_responses_are_gone(cache):
+    for key in ("a", "b", "c"):
+        cache.store_response(key, key)
+    cache.invalidate_cached_response("a")
+    assert cache.get_cached_response("a") is None and cache.get_cached_response("b") == "b"
+    cache.invalidate_cached_response()
+    assert cache.get_cached_response("b") is None and cache.get_cached_response("c") is None
+
+
+def test_invalid_non_streamed_responses_are_not_cached(stub_client, cache):
+    stub_client.response = PROSE
+    ask_cached = lambda: llm_response.get_llm_response(
+        prompt="Explain circles", subject="Mathematics", animation_type="Visualization", duration=5,
+        background_color="#000000", text_color="#FFFFFF", stream=False
+    )
+    assert ask_cached() == PROSE
+    assert ask_cached() == PROSE
+    assert len(stub_client.requests) == 2
+
+
+def test_invalidation_reaches_other_processes(cache):
+    cache.store_response("k", SCENE_CODE)
+    os.remove(cache._disk_path("k"))  # as invalidate_cached_response() in another process
+    assert cache.get_cached_response("k") is None
+
+
+JOB_SCENE = {"prompt": "Draw a circle", "subject": "Mathematics", "type": "Visualization", "duration": 5,
+             "background_color": "#000000", "text_color": "#FFFFFF"}
+
+
+def test_regenerated_scene_skips_the_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(render_jobs, "get_llm_response", lambda **kwargs: calls.append(kwargs) or SCENE_CODE)
+    monkeypatch.setattr(render_jobs, "_update_job", lambda *args, **kwargs: None)
+
+    render_jobs._generate("j1", JOB_SCENE)
+    render_jobs._generate("j1", JOB_SCENE, use_cache=False)
+    assert [call["use_cache"] for call in calls] == [True, False]
+
+
+def test_only_the_regenerating_job_skips_the_cache(store, monkeypatch):
+    calls = []
+    monkeypatch.setattr(render_jobs, "_generate", lambda job_id, scene, **kwargs: calls.append(kwargs) or ("x = 1", None))
+    monkeypatch.setattr(render_jobs, "_attempt", lambda job_id, scene, code, stats: ("scene_a.mp4", None))
+    for job_id, regenerate in (("j1", True), ("j2", False)):
+        store.update_job(job_id, status=render_jobs.JOB_QUEUED, scene={"id": "a"}, regenerate=regenerate,
+                         submitted_at=time.time())
+        render_jobs._run_job_stages(job_id, {"id": "a"})
+    assert [call["use_cache"] for call in calls] == [False, True]
+
+
+def test_llm_errors_fail_the_job_instead_of_rendering_fallback(stub_client, monkeypatch):
+    monkeypatch.setattr(render_jobs, "_update_job", lambda *args, **kwargs: None)
+    stub_client.response = PROSE
+
+    code, error = render_jobs._generate("j1", JOB_SCENE, use_cache=False)
+    assert code is None and "Stopped LLM generation early" in error
+
+    stub_client.failures.append((400, None))
+    code, error = render_jobs._generate("j1", JOB_SCENE, use_cache=False)
+    assert code is None and "Error getting LLM response" in error
+
+
+def test_trim_traceback_keeps_scene_frames():
+    output = """Manim Community v0.18.1
+╭──────────── Traceback (most recent call last) ────────────╮
+│ /site-packages/manim/cli/render/commands.py:115 in render  │
+│ ❱ 115 │   │   │   scene.render()                          │
+│                                                           │
+│ /tmp/work/scene_1.py:7 in construct                       │
+│    6 │   │   circle = Circle()                            │
+│ ❱  7 │   │   circle.foo()                                 │
+╰───────────────────────────────────────────────────────────╯
+AttributeError: 'Circle' object has no attribute 'foo'
+"""
+    trimmed = trim_traceback(output)
+    assert "commands.py" not in trimmed
+    assert trimmed.splitlines() == [
+        "/tmp/work/scene_1.py:7 in construct",
+        "❱  7 │   │   circle.foo()",
+        "AttributeError: 'Circle' object has no attribute 'foo'",
+    ]
+
+
+@pytest.fixture
+def renders(tmp_path, monkeypatch):
+    monkeypatch.setattr(render_cache, "RENDER_CACHE_DIR", str(tmp_path / "renders"))
+    monkeypatch.setattr(render_cache, "_stats", dict.fromkeys(render_cache._stats, 0))
+    return render_cache
+
+
+def test_render_cache_key_ignores_formatting_only(renders):
+    key = renders.render_cache_key(SCENE_CODE, "720p")
+    reformatted = SCENE_CODE.replace("\n", "  \r\n") + "\n\n"
+    assert renders.render_cache_key(reformatted, "720p") == key
+    assert renders.render_cache_key(SCENE_CODE, "480p") != key
+    assert renders.render_cache_key(SCENE_CODE.replace("BLUE", "RED"), "720p") != key
+
+
+def test_render_cache_hits_after_a_store(renders, tmp_path):
+    key = renders.render_cache_key(SCENE_CODE, "720p")
+    assert renders.get_cached_render(key, str(tmp_path / "scene.mp4")) is None
+    assert not renders.is_render_cached(SCENE_CODE, "720p")
+
+    (tmp_path / "render.mp4").write_bytes(b"video")
+    renders.store_render(key, str(tmp_path / "render.mp4"))
+    assert renders.is_render_cached(SCENE_CODE, "720p")
+    assert renders.get_cached_render(key, str(tmp_path / "scene.mp4")) == str(tmp_path / "scene.mp4")
+    assert (tmp_path / "scene.mp4").read_bytes() == b"video"
+    stats = renders.get_render_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["stores"], stats["hit_rate"]) == (1, 1, 1, 0.5)
+
+
+def test_render_cache_keeps_the_profile_with_the_video(renders, tmp_path):
+    key = renders.render_cache_key(SCENE_CODE, "720p")
+    (tmp_path / "render.mp4").write_bytes(b"video")
+    renders.store_render(key, str(tmp_path / "render.mp4"), {"total_seconds": 1.5, "animations": []})
+    assert renders.get_cached_profile(key) == {"total_seconds": 1.5, "animations": []}
+
+    renders.evict_renders(max_bytes=0)
+    assert renders.get_cached_profile(key) is None
+    assert not list((tmp_path / "renders").rglob("*.*"))
+
+
+def test_render_cache_hits_return_the_profile(renders, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(manim_processor, "OUTPUT_DIR", str(tmp_path / "videos"))
+    monkeypatch.setattr(artifact_store, "ARTIFACT_BLOB_DIR", str(tmp_path / "blobs"))
+    key = renders.render_cache_key(SCENE_CODE, "720p")
+    (tmp_path / "render.mp4").write_bytes(b"video")
+    renders.store_render(key, str(tmp_path / "render.mp4"), {"total_seconds": 1.5, "animations": []})
+
+    stats = {}
+    video_path, error = manim_processor.execute_manim_code(SCENE_CODE, "s1", stats=stats, profile=True)
+    assert error is None and video_path == str(tmp_path / "videos" / "scene_s1.mp4")
+    assert stats["cache_hit"] and stats["profile"] == {"total_seconds": 1.5, "animations": []}
+
+
+def test_progress_lines_are_parsed():
+    assert render_runner.parse_progress("Animation 3: Write(Text):  45%|####      | 27/60") == (3, 0.45)
+    assert render_runner.parse_progress("Animation 0: Create(Circle): 100%|##########| 15/15") == (0, 1.0)
+    assert render_runner.parse_progress("File ready at 'media/videos/scene.mp4'") is None
+
+
+@pytest.mark.skipif(render_runner.resource is None, reason="needs resource.prlimit")
+def test_renders_run_with_rlimits(tmp_path, monkeypatch):
+    resource = render_runner.resource
+    monkeypatch.setattr(render_runner, "RENDER_CPU_SECONDS", 30)
+    monkeypatch.setattr(render_runner, "RENDER_MAX_MEMORY_MB", 0)  # 0 leaves a limit unset
+    monkeypatch.setattr(render_runner, "RENDER_MAX_FILE_MB", 2)
+    assert render_runner.render_limits() == [(resource.RLIMIT_CPU, 30), (resource.RLIMIT_FSIZE, 2 * 1024 ** 2)]
+
+    # Polled until the limits set after the spawn are in place
+    script = (
+        "import resource, time\n"
+        "while resource.getrlimit(resource.RLIMIT_CPU)[1] != 30: time.sleep(0.01)\n"
+        "print(resource.getrlimit(resource.RLIMIT_CPU), resource.getrlimit(resource.RLIMIT_FSIZE))\n"
+        "print('Animation 1: Create(Circle):  50%|#####     | 5/10')\n"
+    )
+    progress = []
+    result = render_runner.run_manim([sys.executable, "-c", script], cwd=str(tmp_path), timeout=30,
+                                     on_progress=lambda *update: progress.append(update))
+    assert result.returncode == 0
+    assert result.output == f"(30, 30) ({2 * 1024 ** 2}, {2 * 1024 ** 2})"
+    assert progress == [(1, 0.5)]
+
+
+def test_warm_workers_report_progress_per_percent():
+    from backend.services.render_workers import _ProgressReporter
+    class Bar(list):
+        total = 3
+
+    progress = []
+    bar = _ProgressReporter(Bar([0.0, 0.25, 0.5]), 2, lambda *update: progress.append(update))
+    assert list(bar) == [0.0, 0.25, 0.5] and bar.total == 3
+    assert progress == [(2, 0.33), (2, 0.66), (2, 1.0)]
+
+
+def test_preflight_estimates_scene_cost():
+    code = SCENE_CODE + """        for i in range(3):
+            self.play(FadeIn(Dot()), run_time=0.5)
+"""
+    report, error = preflight(code)
+    assert error is None
+    assert report == {"scene": "CircleScene", "animations": 5, "video_seconds": 3.5, "exact": True}
+
+
+@pytest.mark.parametrize("line", [
+    "import os",
+    "data = open('/etc/passwd').read()",
+    "while True: pass",
+    "x = ().__class__.__bases__",
+    "points = np.load('points.npy')",
+    "from numpy import fromfile",
+])
+def test_preflight_rejects_unsafe_code(line):
+    report, error = preflight(SCENE_CODE + "\n" + line + "\n")
+    assert report is None
+    assert error
+
+
+def test_preflight_requires_a_scene():
+    assert preflight("from manim import *\nx = 1\n")[1] == "No Scene subclass with a construct() method found."
+
+
+def test_code_without_a_scene_is_left_for_the_repair_loop():
+    # Not swapped for the fallback scene: preflight's error is sent back to the LLM
+    assert code_cleaner("```python\nx = 1\n```") == "from manim import *\n\nx = 1"
+
+
+def test_preflight_picks_the_scene_after_its_helpers():
+    code = """from manim import *
+
+class Titled(Scene):
+    def title(self, text):
+        self.play(Write(Text(text)))
+
+    def construct(self):
+        self.title("Base")
+
+class Main(Titled):
+    def construct(self):
+        self.title("Main")
+        self.wait(2)
+"""
+    report, error = preflight(code)
+    assert error is None
+    assert report == {"scene": "Main", "animations": 2, "video_seconds": 3.0, "exact": True}
+    assert find_sections(code) is None  # the inherited helper animates
+
+
+def test_plan_render_downgrades_long_scenes():
+    report = {"scene": "S", "animations": 50, "video_seconds": 120.0, "exact": True}
+    plan, error = plan_render(report, "1080p")
+    assert error is None
+    assert plan["quality"] == "720p" and plan["downgraded"]
+    assert plan_render(dict(report, video_seconds=1000.0), "720p")[0] is None
+
+
+def test_profile_of_killed_render_keeps_finished_animations(tmp_path):
+    path = tmp_path / "profile.jsonl"
+    path.write_text(
+        '{"type": "animation", "index": 0, "label": "Create(Circle)", "frames": 30, "cached": false, '
+        '"tex_seconds": 0.0, "encode_seconds": 0.5, "seconds": 2.0}\n'
+        '{"type": "animation", "index": 1, "label": "Write(MathTex)", "frames": 60, "cached": false, '
+        '"tex_seconds": 3.0, "encode_seconds": 1.0, "seconds": 9.0}\n'
+        '{"type": "animation", "index": 2, "lab'
+    )
+    report = load_profile(str(path))
+    assert not report["complete"]
+    assert [entry["index"] for entry in report["animations"]] == [1, 0]
+    assert report["frame_seconds"] == 6.5
+    assert summarize_profile(report, limit=1).startswith("Animation 1 (Write(MathTex)): 9.0s, 60 frames")
+    assert load_profile(str(tmp_path / "missing.jsonl")) is None
+
+
+SECTIONED_CODE = '''from manim import *
+
+class Sections(Scene):
+    def construct(self):
+        dot = Dot()
+        self.play(Create(dot))
+        self.wait()
+        self.next_section()
+        self.play(dot.animate.shift(RIGHT))
+        self.next_section()
+        self.play(FadeOut(dot))
+        self.wait()
+        self.wait()
+'''
+
+
+def test_find_sections_counts_animations():
+    assert find_sections(SECTIONED_CODE) == [2, 1, 3]
+    looped = SECTIONED_CODE.replace("        self.play(FadeOut(dot))", "        for _ in range(2):\n            self.wait()")
+    assert find_sections(looped) is None  # the count depends on the loop
+
+
+def test_plan_sections_splits_evenly():
+    assert plan_sections(SECTIONED_CODE, 1) is None
+    assert plan_sections(SECTIONED_CODE, 2) == [(0, 2), (3, 5)]
+    assert plan_sections(SECTIONED_CODE, 8) == [(0, 1), (2, 2), (3, 5)]
+
+
+@pytest.mark.parametrize("cpus", [1, 2, 8, 64])
+def test_plan_sections_splits_with_the_default_settings(cpus, monkeypatch):
+    from config import settings
+    monkeypatch.delenv("RENDER_MAX_WORKERS", raising=False)
+    monkeypatch.delenv("RENDER_SECTION_WORKERS", raising=False)
+    monkeypatch.setattr(os, "cpu_count", lambda: cpus)
+    try:
+        importlib.reload(settings)
+        assert plan_sections(SECTIONED_CODE, settings.RENDER_SECTION_WORKERS)
+        assert settings.RENDER_MAX_WORKERS * settings.RENDER_SECTION_WORKERS <= max(cpus, 2)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(settings)
+
+
+def test_transition_segments_copy_between_keyframes():
+    clips = [
+        {"path": "a.mp4", "duration": 4.0, "keyframes": [0.0, 1.0, 2.0, 3.0]},
+        {"path": "short.mp4", "duration": 1.0, "keyframes": [0.0]},  # no keyframe to cut at
+        {"path": "c.mp4", "duration": 4.0, "keyframes": [0.0, 2.0]},
+    ]
+    assert stitch_videos.plan_transition_segments(clips, 0.5) == [
+        ("copy", "a.mp4", 0.0, 3.0),
+        ("xfade", [("a.mp4", 3.0, 4.0), ("short.mp4", 0.0, 1.0), ("c.mp4", 0.0, 2.0)]),
+        ("copy", "c.mp4", 2.0, 4.0),
+    ]
+
+
+class FakeFFmpeg:
+    """Stands in for the ffmpeg and ffprobe calls of stitch_videos, recording what they were asked to do"""
+
+    def __init__(self, monkeypatch, keyframes, duration=4.0, b_frame_delay=0.0625):
+        self.windows, self.entries = [], []
+        # With B-frames a keyframe is decoded a little before it is shown
+        monkeypatch.setattr(stitch_videos, "probe_keyframes", lambda path: (
+            duration, [(pts, pts - b_frame_delay) for pts in keyframes]
+        ))
+        monkeypatch.setattr(stitch_videos, "probe_streams", lambda path: [{"codec_type": "video", "width": 854}])
+        monkeypatch.setattr(stitch_videos, "_encode_pieces", self.encode)
+        monkeypatch.setattr(stitch_videos, "_concat_copy", self.concat)
+
+    def encode(self, pieces, effect, transition_duration, output_path, encode_args, normalize=None):
+        self.windows.append((pieces, effect, transition_duration, normalize))
+        return subprocess.CompletedProcess([], 0, "", "")
+
+    def concat(self, entries, output_path):
+        self.entries = entries
+        return subprocess.CompletedProcess([], 0, "", "")
+
+
+def test_transitions_reencode_only_the_windows(monkeypatch):
+    ffmpeg = FakeFFmpeg(monkeypatch, keyframes=[0.0, 1.0, 2.0, 3.0])
+
+    success, message = stitch_videos._stitch_with_transitions(["a.mp4", "b.mp4"], "out.mp4", "fade", 0.5)
+    assert success and "1 re-encoded transition window" in message
+    assert ffmpeg.windows == [([("a.mp4", 3.0, 4.0), ("b.mp4", 0.0, 1.0)], "fade", 0.5, None)]
+    # Copied parts stop at the keyframe's decode timestamp; the window sits in between
+    assert ffmpeg.entries[0] == ("a.mp4", 0.0, 2.9375, 3.0)
+    assert ffmpeg.entries[1].endswith("window_0.mp4")
+    assert ffmpeg.entries[2] == ("b.mp4", 1.0, None, 3.0)
+
+
+def test_transitions_never_overlap_more_than_half_a_clip(monkeypatch):
+    ffmpeg = FakeFFmpeg(monkeypatch, keyframes=[0.0], duration=0.6)
+
+    success, _ = stitch_videos._stitch_with_transitions(["a.mp4", "b.mp4"], "out.mp4", "fade", 1.0)
+    assert success
+    assert ffmpeg.windows == [([("a.mp4", 0.0, 0.6), ("b.mp4", 0.0, 0.6)], "fade", 0.3, None)]
+
+
+def test_concat_copy_writes_in_and_out_points(tmp_path, monkeypatch):
+    lists = []
+    def run(cmd, **kwargs):
+        with open(cmd[cmd.index("-i") + 1]) as f:
+            lists.append(f.read())
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+    monkeypatch.setattr(stitch_videos.subprocess, "run", run)
+
+    clip = str(tmp_path / "it's.mp4")
+    stitch_videos._concat_copy([(clip, 1.0, 2.9375, 2.0), str(tmp_path / "window.mp4")], "out.mp4")
+    assert lists == [
+        f"file '{tmp_path}/it'\\''s.mp4'\ninpoint 1.000000\noutpoint 2.937500\nduration 2.000000\n"
+        f"file '{tmp_path}/window.mp4'\n"
+    ]
+
+
+def test_stitch_copies_matching_inputs_and_reencodes_the_rest(monkeypatch):
+    streams = {"a.mp4": [{"codec_name": "h264", "width": 854}], "b.mp4": [{"codec_name": "h264", "width": 854}],
+               "c.mp4": [{"codec_name": "h264", "width": 1920}], "d.mp4": None}
+    monkeypatch.setattr(stitch_videos, "probe_streams", streams.get)
+    calls = []
+    def run(name, returncode):
+        def call(paths, output_path):
+            calls.append((name, list(paths)))
+            return subprocess.CompletedProcess([], returncode, "", "")
+        return call
+    monkeypatch.setattr(stitch_videos, "_concat_copy", run("copy", 0))
+    monkeypatch.setattr(stitch_videos, "_concat_reencode", run("reencode", 0))
+
+    assert stitch_videos.can_stream_copy(["a.mp4", "b.mp4"]) == (True, None)
+    assert stitch_videos.can_stream_copy(["a.mp4", "c.mp4"]) == (False, "inputs have different codec parameters")
+    assert stitch_videos.can_stream_copy(["a.mp4", "d.mp4"]) == (False, "could not probe every input")
+
+    assert stitch_videos.video_stitcher(["a.mp4", "b.mp4"], "out.mp4", "none", use_cache=False) == (
+        True, "Stitched with stream copy (no re-encode).")
+    assert stitch_videos.video_stitcher(["a.mp4", "c.mp4"], "out.mp4", "none", use_cache=False) == (
+        True, "Stitched with re-encode (inputs have different codec parameters).")
+    assert calls == [("copy", ["a.mp4", "b.mp4"]), ("reencode", ["a.mp4", "c.mp4"])]
+
+    # A copy ffmpeg rejects falls back to re-encoding
+    calls.clear()
+    monkeypatch.setattr(stitch_videos, "_concat_copy", run("copy", 1))
+    assert stitch_videos.video_stitcher(["a.mp4", "b.mp4"], "out.mp4", "none", use_cache=False) == (
+        True, "Stitched with re-encode (stream copy failed).")
+    assert [name for name, _ in calls] == ["copy", "reencode"]
+
+
+def test_stitches_extend_their_cached_prefix(tmp_path, monkeypatch):
+    monkeypatch.setattr(stitch_cache, "STITCH_CACHE_DIR", str(tmp_path / "stitches"))
+    stitched = []
+    def stitch(paths, output_path, transition_effect, transition_duration):
+        stitched.append([os.path.basename(path) if path.endswith(("a.mp4", "b.mp4", "c.mp4")) else "cached"
+                         for path in paths])
+        with open(output_path, "wb") as out:
+            for path in paths:
+                with open(path, "rb") as f:
+                    out.write(f.read())
+        return True, "Stitched."
+    monkeypatch.setattr(stitch_videos, "_stitch", stitch)
+    clips = []
+    for name in ("a", "b", "c"):
+        (tmp_path / f"{name}.mp4").write_bytes(name.encode())
+        clips.append(str(tmp_path / f"{name}.mp4"))
+
+    assert stitch_videos.video_stitcher(clips[:2], str(tmp_path / "ab.mp4"), "fade", 0.5)[0]
+    success, message = stitch_videos.video_stitcher(clips, str(tmp_path / "abc.mp4"), "fade", 0.5)
+    assert success and message.startswith("Appended 1 scene(s) to a cached stitch of 2.")
+    assert stitch_videos.video_stitcher(clips, str(tmp_path / "again.mp4"), "fade", 0.5) == (
+        True, "Reused a previously stitched video."
+    )
+    # A different transition is a different stitch
+    stitch_videos.video_stitcher(clips[:2], str(tmp_path / "slide.mp4"), "slide", 0.5)
+    assert stitched == [["a.mp4", "b.mp4"], ["cached", "c.mp4"], ["a.mp4", "b.mp4"]]
+    assert (tmp_path / "again.mp4").read_bytes() == b"abc"
+
+
+def test_evict_lru_deletes_the_oldest_files_first(tmp_path):
+    (tmp_path / "nested").mkdir()
+    for age, name in enumerate(["new.mp4", "nested/middle.mp4", "old.mp4", "notes.txt"]):
+        path = tmp_path / name
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    # Files of other types are neither counted nor deleted
+    assert evict_lru(str(tmp_path), 25, ".mp4") == 1
+    assert sorted(p.name for p in tmp_path.rglob("*") if p.is_file()) == ["middle.mp4", "new.mp4", "notes.txt"]
+    assert evict_lru(str(tmp_path), 25, ".mp4") == 0
+    assert evict_lru(str(tmp_path), 0) == 3
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+@pytest.fixture
+def workspaces(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "WORKSPACE_DIR", str(tmp_path / "workspaces"))
+    return workspace
+
+
+def test_workspace_is_reused_and_keeps_partial_movies(workspaces):
+    path, lock = workspaces.open_workspace("s1")
+    partial = os.path.join(path, "videos", "scene", "480p15", "partial_movie_files", "Scene", "0001.mp4")
+    final = os.path.join(path, "videos", "scene", "480p15", "Scene.mp4")
+    for file in (partial, final):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file, "wb") as f:
+            f.write(b"video")
+    assert workspaces.find_rendered_video(path) == final
+    workspaces.close_workspace(path, lock)
+
+    again, lock = workspaces.open_workspace("s1")
+    assert again == path
+    workspaces.clear_rendered_videos(again)
+    assert os.path.exists(partial) and not os.path.exists(final)
+    assert workspaces.find_rendered_video(again) is None
+    workspaces.close_workspace(again, lock)
+
+
+def test_pruning_skips_workspaces_in_use(workspaces):
+    busy, busy_lock = workspaces.open_workspace("busy")
+    os.utime(busy, (1, 1))  # the oldest, but locked by a render
+    for age, scene_id in enumerate(["new", "old"]):
+        path, lock = workspaces.open_workspace(scene_id)
+        workspaces.close_workspace(path, lock)
+        os.utime(path, (1000 - age, 1000 - age))
+
+    workspaces.prune_workspaces(max_count=2, max_bytes=10 ** 9)
+    assert sorted(os.listdir(workspaces.WORKSPACE_DIR)) == ["scene_busy", "scene_new"]
+    workspaces.close_workspace(busy, busy_lock)
+
+
+@pytest.mark.skipif(not (shutil.which("ffmpeg") and shutil.which("ffprobe")), reason="needs ffmpeg and ffprobe")
+def test_stitched_video_has_the_expected_length_and_decodes(tmp_path):
+    clips = []
+    for index, pattern in enumerate(("testsrc", "smptebars", "testsrc2")):
+        path = str(tmp_path / f"clip_{index}.mp4")
+        subprocess.run([
+            "ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"{pattern}=size=320x240:rate=15:duration=2",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", "15", path
+        ], check=True)
+        clips.append(path)
+    output = str(tmp_path / "stitched.mp4")
+
+    success, message = stitch_videos.video_stitcher(clips, output, "fade", 0.5, use_cache=False)
+    assert success, message
+    assert "re-encoded transition window" in message
+    duration, keyframes = stitch_videos.probe_keyframes(output)
+    assert duration == pytest.approx(3 * 2 - 2 * 0.5, abs=0.15)
+    decoded = subprocess.run(["ffmpeg", "-v", "error", "-i", output, "-f", "null", "-"],
+                             capture_output=True, text=True)
+    assert decoded.returncode == 0 and decoded.stderr == ""
+
+
+def test_asset_cache_counts_hits_and_publishes_new_svgs(tmp_path, monkeypatch):
+    shared = tmp_path / "assets"
+    monkeypatch.setattr(asset_cache, "ASSET_CACHE_DIR", str(shared))
+    (shared / "Tex").mkdir(parents=True)
+    (shared / "Tex" / "cached.svg").write_text("<svg/>")
+
+    assets = asset_cache.open_asset_dirs(str(tmp_path / "work"))
+    tex_dir, text_dir = tmp_path / "work" / "Tex", tmp_path / "work" / "texts"
+    assert os.listdir(tex_dir) == ["cached.svg"]
+    # What manim leaves behind: a .tex file per formula used, SVGs for new ones
+    for name in ("cached.tex", "new.tex", "new.svg"):
+        (tex_dir / name).write_text("x")
+    (text_dir / "glyphs.svg").write_text("<svg/>")
+
+    stats = asset_cache.publish_assets(assets)
+    assert stats == {"tex_hits": 1, "tex_misses": 1, "text_rendered": 1}
+    assert sorted(os.listdir(shared / "Tex")) == ["cached.svg", "new.svg"]
+    assert os.listdir(shared / "texts") == ["glyphs.svg"]
+    assert os.listdir(tex_dir) == [] and os.listdir(text_dir) == []
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger, "METRICS_DIR", str(tmp_path / "metrics"))
+    monkeypatch.setattr(logger, "_metrics_path", str(tmp_path / "metrics" / f"{os.getpid()}-test.json"))
+    monkeypatch.setattr(logger, "_counters", {})
+    monkeypatch.setattr(logger, "_histograms", {})
+    return logger
+
+
+def test_span_times_stages_and_marks_errors(metrics):
+    with metrics.span("render", quality="480p", scene_id="a") as record:
+        record["tokens"] = 3
+    with pytest.raises(ValueError):
+        with metrics.span("render", quality="480p"):
+            raise ValueError("boom")
+
+    durations = {dict(labels)["status"]: values for (name, labels), values in metrics._histograms.items()
+                 if name == "fyp_stage_duration_seconds"}
+    assert set(durations) == {"ok", "error"}
+    assert durations["ok"][-1] == 1 and durations["error"][-1] == 1
+    assert record["status"] == "ok" and record["duration_s"] >= 0
+
+
+def test_export_metrics_merges_processes(metrics, tmp_path):
+    metrics.increment("fyp_jobs_total", 2, status="done")
+    metrics.observe("fyp_wait_seconds", 0.3)
+    dead_pid = 2 ** 22 + 1  # above pid_max, so never a live process
+    (tmp_path / "metrics").mkdir()
+    (tmp_path / "metrics" / f"{dead_pid}-dead.json").write_text(json.dumps({
+        "counters": [["fyp_jobs_total", [["status", "done"]], 3]], "histograms": []
+    }))
+
+    text = metrics.export_metrics(path=None)
+    assert "# TYPE fyp_jobs_total counter\nfyp_jobs_total{status=\"done\"} 5\n" in text
+    assert "# TYPE fyp_wait_seconds histogram" in text
+    assert 'fyp_wait_seconds_bucket{le="0.25"} 0' in text
+    assert 'fyp_wait_seconds_bucket{le="0.5"} 1' in text
+    assert 'fyp_wait_seconds_bucket{le="+Inf"} 1' in text
+    assert "fyp_wait_seconds_sum 0.3\nfyp_wait_seconds_count 1\n" in text
+
+    # The exited process's file is folded into the retired totals
+    assert not (tmp_path / "metrics" / f"{dead_pid}-dead.json").exists()
+    assert metrics.export_metrics(path=None) == text
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(scene_store, "STORE_PATH", str(tmp_path / "store.sqlite3"))
+    monkeypatch.setattr(scene_store, "_local", threading.local())
+    monkeypatch.setattr(scene_store, "_schema_ready", False)
+    return scene_store
+
+
+def test_store_restores_session(store):
+    for scene_id, status in (("b", "completed"), ("a", "generating")):
+        store.save_scene("s1", {"id": scene_id, "status": status, "job_id": None})
+    store.save_scene("s1", {"id": "b", "status": "error", "job_id": None})
+    store.save_session("s1", ["prompt"], ["b"], None)
+
+    saved = store.load_session("s1")
+    assert [(scene["id"], scene["status"]) for scene in saved["scenes"]] == [("b", "error"), ("a", "generating")]
+    assert saved["generation_history"] == ["prompt"] and saved["selection_order"] == ["b"]
+    store.delete_session("s1")
+    assert store.load_session("s1")["scenes"] == []
+
+
+def test_interrupted_jobs_resume_with_their_code(store, monkeypatch):
+    started = []
+    monkeypatch.setattr(render_jobs, "_start_job", lambda job_id, scene: started.append(job_id))
+    dead_pid = 2 ** 22 + 1  # above pid_max, so never a live process
+    store.update_job("j1", status=render_jobs.JOB_RENDERING, scene={"id": "a"}, owner_pid=dead_pid, code="x = 1")
+    store.update_job("j2", status=render_jobs.JOB_DONE, scene={"id": "b"}, owner_pid=dead_pid)
+
+    assert render_jobs.resume_interrupted_jobs() == ["j1"]
+    assert started == ["j1"]
+    job = store.get_job("j1")
+    assert job["status"] == render_jobs.JOB_QUEUED and job["code"] == "x = 1" and job["resumed"] == 1
+
+
+def test_resumed_jobs_with_code_skip_generation(store, monkeypatch):
+    monkeypatch.setattr(render_jobs, "_attempt", lambda job_id, scene, code, stats: ("scene_a.mp4", None))
+    monkeypatch.setattr(render_jobs, "_generate", lambda *args, **kwargs: pytest.fail("generated again"))
+    statuses = []
+    update_job = render_jobs._update_job
+    def recording_update(job_id, **fields):
+        statuses.append(fields.get("status"))
+        return update_job(job_id, **fields)
+    monkeypatch.setattr(render_jobs, "_update_job", recording_update)
+    store.update_job("j1", status=render_jobs.JOB_QUEUED, scene={"id": "a"}, code="x = 1", submitted_at=time.time())
+
+    render_jobs._run_job_stages("j1", {"id": "a"})
+    assert render_jobs.JOB_GENERATING not in statuses and store.get_job("j1")["status"] == render_jobs.JOB_DONE
+
+
+def test_previews_are_made_after_the_job_is_done(store, monkeypatch):
+    monkeypatch.setattr(render_jobs, "PREVIEWS", True)
+    monkeypatch.setattr(render_jobs, "_attempt", lambda job_id, scene, code, stats: ("scene_a.mp4", None))
+    seen = []
+    def fake_previews(video_path):
+        job = store.get_job("j1")
+        seen.append((job["status"], job["previews_pending"], job["video_path"]))
+        return {"poster": "scene_a.poster.jpg"}
+    monkeypatch.setattr(render_jobs, "make_previews", fake_previews)
+    store.update_job("j1", status=render_jobs.JOB_QUEUED, scene={"id": "a"}, code="x = 1", submitted_at=time.time())
+
+    render_jobs._run_job_stages("j1", {"id": "a"})
+    assert seen == [(render_jobs.JOB_DONE, True, "scene_a.mp4")]  # the video was out first
+    job = store.get_job("j1")
+    assert job["previews_pending"] is False and job["render_stats"]["previews"] == {"poster": "scene_a.poster.jpg"}
+
+
+@pytest.fixture
+def artifacts(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_store, "ARTIFACT_BLOB_DIR", str(tmp_path / ".blobs"))
+    return artifact_store
+
+
+def test_identical_videos_share_one_blob(artifacts, tmp_path):
+    for name in ("render_a.mp4", "render_b.mp4"):
+        (tmp_path / name).write_bytes(b"same video")
+    a = artifacts.publish(str(tmp_path / "render_a.mp4"), str(tmp_path / "scene_a.mp4"), "video", scene_id="a", move=True)
+    b = artifacts.publish(str(tmp_path / "render_b.mp4"), str(tmp_path / "scene_b.mp4"), "video", scene_id="b", move=True)
+
+    assert os.path.samefile(a, b) and not os.path.exists(tmp_path / "render_a.mp4")
+    assert len(list((tmp_path / ".blobs").rglob("*.mp4"))) == 1
+    assert artifacts.scene_store.get_artifacts("a")[0]["digest"] == artifacts.scene_store.get_artifacts("b")[0]["digest"]
+
+    # Adopting a published file again, as a render cache hit does, keeps its owner
+    artifacts.publish(a, a, "video")
+    assert [artifact["path"] for artifact in artifacts.scene_store.get_artifacts("a")] == [a]
+
+
+def test_garbage_collection_frees_only_released_videos(artifacts, tmp_path):
+    for name in ("kept", "deleted", "orphan"):
+        (tmp_path / f"{name}.mp4").write_bytes(name.encode() * 100)
+        artifacts.publish(str(tmp_path / f"{name}.mp4"), str(tmp_path / f"{name}.mp4"), "video", scene_id=name)
+    artifacts.scene_store.delete_scene("deleted")
+    artifacts.scene_store.release_artifact(str(tmp_path / "orphan.mp4"))
+
+    assert artifacts.collect_garbage(max_bytes=10 ** 6, grace=-1) == 0  # under the quota
+    assert artifacts.collect_garbage(max_bytes=0, grace=-1) == 1300
+    assert os.path.exists(tmp_path / "kept.mp4")
+    assert not os.path.exists(tmp_path / "deleted.mp4") and not os.path.exists(tmp_path / "orphan.mp4")
+    assert len(list((tmp_path / ".blobs").rglob("*.mp4"))) == 1
+
+
+def test_discarded_videos_keep_shared_blobs(artifacts, tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / f"render_{name}.mp4").write_bytes(b"same video")
+        artifacts.publish(str(tmp_path / f"render_{name}.mp4"), str(tmp_path / f"{name}.mp4"), "video", move=True)
+    digest = artifacts.find_digest(str(tmp_path / "a.mp4"))
+    with open(artifacts.sidecar_path(digest, ".poster.jpg"), "wb") as f:
+        f.write(b"poster")
+
+    artifacts.discard(str(tmp_path / "a.mp4"))
+    assert not os.path.exists(tmp_path / "a.mp4") and os.path.exists(tmp_path / "b.mp4")
+    artifacts.discard(str(tmp_path / "b.mp4"))
+    assert list((tmp_path / ".blobs").rglob("*.*")) == []
+
+
+def test_previews_are_made_once_per_video(artifacts, tmp_path, monkeypatch):
+    encoded = []
+
+    def fake_encode(args, output_path):
+        encoded.append(output_path)
+        if not output_path.endswith(".thumb.webp"):  # as if ffmpeg lacked libwebp
+            open(output_path, "wb").close()
+
+    monkeypatch.setattr(previews, "_encode", fake_encode)
+    monkeypatch.setattr(previews, "_probe_duration", lambda path: 6.0)
+    (tmp_path / "scene.mp4").write_bytes(b"video")
+    video = artifacts.publish(str(tmp_path / "scene.mp4"), str(tmp_path / "scene.mp4"), "video", scene_id="a")
+
+    made = previews.make_previews(video)
+    assert sorted(made) == ["poster", "proxy"] and len(encoded) == 3
+    assert previews.make_previews(video) == made and len(encoded) == 4  # only the failed one is retried
+
+
+def test_scene_registry_tracks_status_changes():
+    scenes = SceneRegistry([{"id": "a", "status": "completed"}, {"id": "b", "status": "generating"}])
+    version = scenes.version
+    scenes.update(scenes.get("b"), status="completed", video_path="b.mp4")
+    assert scenes.version > version
+    assert scenes.count("generating") == 0 and scenes.count("completed") == 2
+    assert scenes.latest("completed")["video_path"] == "b.mp4"
+    assert scenes.remove("a")["id"] == "a" and "a" not in scenes
+    assert [scene["id"] for scene in scenes] == ["b"] and scenes.count("completed") == 1
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=900-", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=500-5000", (500, 999)),
+    ("bytes=0-1,5-9", None),
+    ("bytes=1000-", "unsatisfiable"),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+def test_media_server_serves_ranges(tmp_path, monkeypatch):
+    (tmp_path / "scene.mp4").write_bytes(bytes(range(256)) * 4)
+    monkeypatch.setattr(media_server, "_server", None)
+    assert media_url(str(tmp_path / "scene.mp4"), root=str(tmp_path)) is None  # not running
+    server = start_media_server(port=0, host="127.0.0.1", root=str(tmp_path))
+    url = f"http://127.0.0.1:{server.server_address[1]}/media/scene.mp4"
+    try:
+        assert media_url(str(tmp_path / "scene.mp4"), root=str(tmp_path), page_host="127.0.0.1:8501").startswith(url)
+        # Only reachable from this machine
+        assert media_url(str(tmp_path / "scene.mp4"), root=str(tmp_path), page_host="example.com") is None
+        request = urllib.request.Request(url, headers={"Range": "bytes=10-19"})
+        with urllib.request.urlopen(request) as response:
+            assert response.status == 206
+            assert response.headers["Content-Range"] == "bytes 10-19/1024"
+            assert response.read() == bytes(range(10, 20))
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url.replace("scene.mp4", "../test_backend.py"))
+        assert error.value.code == 404
+    finally:
+        media_server.stop_media_server()